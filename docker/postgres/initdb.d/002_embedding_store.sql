@@ -0,0 +1,10 @@
+-- Content-addressed embedding store: one vector per (embedding space, sha256(chunk text)).
+-- Lets embed_job skip re-embedding text it has already seen under the same model.
+CREATE TABLE IF NOT EXISTS embedding_store (
+  model TEXT NOT NULL,
+  content_hash TEXT NOT NULL,
+  dim INT NOT NULL,
+  vector BYTEA NOT NULL,          -- packed float32
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (model, content_hash)
+);
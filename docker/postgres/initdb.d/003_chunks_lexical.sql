@@ -0,0 +1,5 @@
+-- Lexical index over chunk text for hybrid (BM25-style + vector) retrieval.
+-- The text search configuration must match config.LEXICAL_TS_CONFIG.
+ALTER TABLE chunks
+  ADD COLUMN IF NOT EXISTS tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', text)) STORED;
+CREATE INDEX IF NOT EXISTS idx_chunks_tsv ON chunks USING GIN (tsv);
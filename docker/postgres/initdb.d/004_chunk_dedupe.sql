@@ -0,0 +1,26 @@
+-- Chunk-level near-duplicate index (pivot.dedupe).
+-- 64-bit SimHash per stored chunk, split into four 16-bit bands: two chunks within Hamming
+-- distance 3 share at least one band, so candidates are found with plain btree lookups.
+CREATE TABLE IF NOT EXISTS chunk_simhash (
+  chunk_id UUID PRIMARY KEY REFERENCES chunks(id) ON DELETE CASCADE,
+  project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+  simhash BIGINT NOT NULL,
+  b0 INT NOT NULL,
+  b1 INT NOT NULL,
+  b2 INT NOT NULL,
+  b3 INT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chunk_simhash_b0 ON chunk_simhash(project_id, b0);
+CREATE INDEX IF NOT EXISTS idx_chunk_simhash_b1 ON chunk_simhash(project_id, b1);
+CREATE INDEX IF NOT EXISTS idx_chunk_simhash_b2 ON chunk_simhash(project_id, b2);
+CREATE INDEX IF NOT EXISTS idx_chunk_simhash_b3 ON chunk_simhash(project_id, b3);
+
+-- Chunk positions that were not stored because a near-identical chunk already existed
+CREATE TABLE IF NOT EXISTS chunk_aliases (
+  document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+  idx INT NOT NULL,
+  canonical_chunk_id UUID NOT NULL REFERENCES chunks(id) ON DELETE CASCADE,
+  distance SMALLINT NOT NULL,
+  PRIMARY KEY (document_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_chunk_aliases_canonical ON chunk_aliases(canonical_chunk_id);
@@ -0,0 +1,4 @@
+-- Incremental re-ingest (ingest mode "update"): documents are found by (project, source_url) and
+-- their chunks diffed by sha256 of the chunk text, the same hash as embedding_store.content_hash.
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+CREATE INDEX IF NOT EXISTS idx_documents_project_source ON documents(project_id, source_url);
@@ -0,0 +1,13 @@
+-- Aliased chunks keep their own text, so that deleting the canonical chunk (a stale chunk on
+-- document update) stores them as chunks again instead of losing the passage (db._release_aliases).
+ALTER TABLE chunk_aliases
+  ADD COLUMN IF NOT EXISTS text TEXT,
+  ADD COLUMN IF NOT EXISTS token_count INT,
+  ADD COLUMN IF NOT EXISTS start_offset INT,
+  ADD COLUMN IF NOT EXISTS end_offset INT,
+  ADD COLUMN IF NOT EXISTS metadata JSONB DEFAULT '{}';
+
+-- No cascade: a canonical chunk deleted without releasing its aliases is an error, not data loss
+ALTER TABLE chunk_aliases DROP CONSTRAINT IF EXISTS chunk_aliases_canonical_chunk_id_fkey;
+ALTER TABLE chunk_aliases
+  ADD CONSTRAINT chunk_aliases_canonical_chunk_id_fkey FOREIGN KEY (canonical_chunk_id) REFERENCES chunks(id);
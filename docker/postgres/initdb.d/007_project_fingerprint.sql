@@ -0,0 +1,4 @@
+-- Document fingerprints are unique per project: the same content ingested into another project is
+-- a document of that project, not a duplicate of the first one.
+ALTER TABLE documents DROP CONSTRAINT IF EXISTS documents_fingerprint_key;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_project_fingerprint ON documents(project_id, fingerprint);
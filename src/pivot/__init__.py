@@ -4,28 +4,48 @@ __all__ = [
 ]
 
 # Provide a lazy stub for `pivot.db` to avoid importing psycopg2 at package import time in test envs.
+import importlib
 import types
 import sys
 
 def __getattr__(name: str):
     if name == 'db':
+        if 'pivot.db' in sys.modules:
+            return sys.modules['pivot.db']
+        # Use the real module whenever its driver is installed
+        try:
+            return importlib.import_module('pivot.db')
+        except ImportError:
+            pass
         # Create a lightweight stub module with the minimal API used in tests.
         mod = types.ModuleType('pivot.db')
 
+        def get_project_id(name):
+            return name
+
         def get_documents_source_url(doc_ids):
             return {}
 
         def get_chunk_snippet(chunk_id):
             return None
 
+        def get_chunk_snippets(chunk_ids, max_chars=5000):
+            return {}
+
+        def lexical_search(project_id, query, limit=25):
+            return []
+
         def get_chunk_meta(chunk_ids):
             return []
 
         def get_chunk_texts(chunk_ids):
             return []
 
+        mod.get_project_id = get_project_id
         mod.get_documents_source_url = get_documents_source_url
         mod.get_chunk_snippet = get_chunk_snippet
+        mod.get_chunk_snippets = get_chunk_snippets
+        mod.lexical_search = lexical_search
         mod.get_chunk_meta = get_chunk_meta
         mod.get_chunk_texts = get_chunk_texts
 
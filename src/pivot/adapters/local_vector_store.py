@@ -0,0 +1,478 @@
+"""In-process vector store: one memory-mapped shard per project (VECTOR_BACKEND=local).
+
+Shard layout under LOCAL_VECTOR_DIR/<project>/:
+
+    shard.json    {"dim": ..., "dtype": "float32" | "float16"}
+    vectors.bin   row-major unit vectors, appended on upsert and memory-mapped for reads
+    rows.jsonl    append-only log of ["a", row, chunk_id, doc_id, idx] and ["d", chunk_id] records
+    hnsw.bin      hnswlib graph over row numbers, written by persist()
+    lock          flock()ed by writers
+
+Cold start maps vectors.bin and replays rows.jsonl; the saved graph is loaded and only rows added
+after the last persist() are inserted. Without hnswlib searches are an exact scan of the mapping.
+
+Several processes may share a shard (the API reads while Celery workers write): appends happen
+under the file lock with row numbers taken from the size of vectors.bin, and every read or write
+first replays the log records other processes appended since (or reloads after a compaction).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except Exception:  # pragma: no cover - non-POSIX: a single writer process only
+    fcntl = None  # type: ignore
+
+try:
+    import numpy as np
+except Exception:
+    np = None  # type: ignore
+
+try:
+    import hnswlib  # type: ignore
+    _HAS_HNSWLIB = True
+except Exception:
+    hnswlib = None  # type: ignore
+    _HAS_HNSWLIB = False
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[str, str, int, List[float]]
+
+_DTYPES = {"float32": ("f", 4), "float16": ("e", 2)}
+
+
+def _unit(vec: List[float]) -> List[float]:
+    norm = sum(x * x for x in vec) ** 0.5
+    return [float(x) / norm for x in vec] if norm > 0 else [float(x) for x in vec]
+
+
+class Shard:
+    """Vectors of one project. All methods are thread-safe."""
+
+    def __init__(self, path: str, *, dtype: str = "float32", use_hnsw: bool = True):
+        self.path = path
+        self.dim: Optional[int] = None
+        self.dtype = dtype
+        self.use_hnsw = use_hnsw and _HAS_HNSWLIB
+        self.count = 0  # rows replayed from the log, live or dead
+        self.rows: Dict[str, int] = {}  # chunk_id -> live row
+        self.meta: Dict[int, Tuple[str, str, int]] = {}  # row -> (chunk_id, doc_id, idx)
+        self.dead: set[int] = set()
+        self._log_pos = 0  # bytes of rows.jsonl replayed
+        self._log_id: Optional[Tuple[int, int]] = None  # (st_dev, st_ino), changes on compaction
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._mm: Optional[mmap.mmap] = None
+        self._view = None
+        self._mapped = 0
+        self._index = None
+        self._indexed = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def _row_bytes(self) -> int:
+        return (self.dim or 0) * _DTYPES[self.dtype][1]
+
+    # -- loading -------------------------------------------------------------------------------
+    def _load(self) -> None:
+        if not self._read_header():
+            return
+        self._tail()
+        if self.use_hnsw:
+            self._load_index()
+
+    def _read_header(self) -> bool:
+        try:
+            with open(self._file("shard.json")) as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            return False
+        self.dim, self.dtype = int(header["dim"]), header["dtype"]
+        return True
+
+    def _rows_on_disk(self) -> int:
+        try:
+            return os.path.getsize(self._file("vectors.bin")) // self._row_bytes
+        except FileNotFoundError:
+            return 0
+
+    def _tail(self) -> None:
+        """Replay the log records appended since the last call (by this or another process)."""
+        try:
+            f = open(self._file("rows.jsonl"), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            self._log_id = (st.st_dev, st.st_ino)
+            f.seek(self._log_pos)
+            data = f.read()
+        on_disk = self._rows_on_disk()
+        pos = self._log_pos
+        known = self.count
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # torn or still being written
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping unreadable record in %s", self._file("rows.jsonl"))
+                pos += len(line)
+                continue
+            if rec[0] == "a":
+                if rec[1] >= on_disk:
+                    break  # vector write did not complete
+                self._apply_add(rec[1], rec[2], rec[3], int(rec[4]))
+                known = max(known, rec[1] + 1)
+            elif rec[0] == "d":
+                self._apply_delete(rec[1])
+            pos += len(line)
+        self._log_pos = pos
+        # Rows without a record were left by an interrupted writer
+        self.dead.update(r for r in range(self.count, known) if r not in self.meta)
+        self.count = known
+
+    def _refresh(self) -> None:
+        """Catch up with the files: reload after another process compacted, else replay new records."""
+        if self.dim is None and not self._read_header():
+            return
+        try:
+            st = os.stat(self._file("rows.jsonl"))
+        except FileNotFoundError:
+            return
+        if self._log_id is not None and ((st.st_dev, st.st_ino) != self._log_id or st.st_size < self._log_pos):
+            self._reset()
+            self._load()
+        elif st.st_size > self._log_pos:
+            self._tail()
+            if self._index is not None:
+                self._sync_index()
+        if self.use_hnsw and self._index is None and self.count:
+            self._load_index()
+
+    def _reset(self) -> None:
+        self._unmap()
+        self.rows, self.meta, self.dead, self.count = {}, {}, set(), 0
+        self._log_pos, self._log_id = 0, None
+        self._index, self._indexed = None, 0
+
+    def _apply_add(self, row: int, chunk_id: str, doc_id: str, idx: int) -> None:
+        old = self.rows.get(chunk_id)
+        if old is not None:
+            self._mark_dead(old)
+        self.rows[chunk_id] = row
+        self.meta[row] = (chunk_id, doc_id, idx)
+
+    def _apply_delete(self, chunk_id: str) -> Optional[int]:
+        row = self.rows.pop(chunk_id, None)
+        if row is not None:
+            self._mark_dead(row)
+        return row
+
+    def _mark_dead(self, row: int) -> None:
+        self.dead.add(row)
+        if self._index is not None and row < self._indexed:
+            self._index.mark_deleted(row)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Exclusive access across processes, with this process caught up on the log."""
+        with self._lock, open(self._file("lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _init(self, dim: int) -> None:
+        self.dim = dim
+        with open(self._file("shard.json"), "w") as f:
+            json.dump({"dim": dim, "dtype": self.dtype}, f)
+
+    # -- memory map ----------------------------------------------------------------------------
+    def _matrix(self):
+        """(count x dim) view of vectors.bin: a numpy memmap, or the raw mmap without numpy."""
+        if self._mapped < self.count:
+            self._unmap()
+            if np is not None:
+                self._view = np.memmap(self._file("vectors.bin"), dtype=self.dtype, mode="r", shape=(self.count, self.dim))
+            else:
+                with open(self._file("vectors.bin"), "rb") as f:
+                    self._view = self._mm = mmap.mmap(f.fileno(), self.count * self._row_bytes, access=mmap.ACCESS_READ)
+            self._mapped = self.count
+        return self._view
+
+    def _unmap(self) -> None:
+        self._view = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._mapped = 0
+
+    def vector(self, row: int) -> List[float]:
+        view = self._matrix()
+        if np is not None:
+            return [float(x) for x in view[row]]
+        return list(struct.unpack_from(f"={self.dim}{_DTYPES[self.dtype][0]}", view, row * self._row_bytes))
+
+    # -- hnsw ------------------------------------------------------------------------------------
+    def _new_index(self, capacity: int):
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=max(capacity, 1024), ef_construction=200, M=config.LOCAL_VECTOR_HNSW_M)
+        return index
+
+    def _load_index(self) -> None:
+        if self.dim is None:
+            return
+        path = self._file("hnsw.bin")
+        if os.path.exists(path):
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            try:
+                index.load_index(path, max_elements=max(self.count, 1024))
+                self._index, self._indexed = index, index.get_current_count()
+            except Exception as e:
+                logger.warning("Rebuilding unreadable HNSW index %s: %s", path, e)
+        if self._index is None or self._indexed > self.count:
+            self._index, self._indexed = self._new_index(self.count), 0
+        self._sync_index()
+        for row in self.dead:
+            if row < self._indexed:
+                try:
+                    self._index.mark_deleted(row)
+                except RuntimeError:
+                    pass  # already marked in the saved graph
+
+    def _sync_index(self) -> None:
+        """Insert rows appended since the index was last brought up to date."""
+        if self._index is None or self._indexed >= self.count:
+            return
+        if self._index.get_max_elements() < self.count:
+            self._index.resize_index(max(self.count, 2 * self._index.get_max_elements()))
+        view = self._matrix()
+        rows = list(range(self._indexed, self.count))
+        if np is not None:
+            data = np.asarray(view[self._indexed : self.count], dtype=np.float32)
+        else:
+            data = [self.vector(r) for r in rows]
+        self._index.add_items(data, rows)
+        for row in rows:
+            if row in self.dead:
+                self._index.mark_deleted(row)
+        self._indexed = self.count
+
+    # -- writes ----------------------------------------------------------------------------------
+    def add(self, rows: Iterable[Row]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self._writing():
+            if self.dim is None:
+                self._init(len(rows[0][3]))
+            code = _DTYPES[self.dtype][0]
+            # Row numbers come from the file, which other processes append to as well
+            size = os.path.getsize(self._file("vectors.bin")) if os.path.exists(self._file("vectors.bin")) else 0
+            if size % self._row_bytes:
+                with open(self._file("vectors.bin"), "ab") as f:
+                    f.truncate(size - size % self._row_bytes)  # torn vector of an interrupted writer
+            start = size // self._row_bytes
+            payload = bytearray()
+            log = []
+            for i, (chunk_id, doc_id, idx, vec) in enumerate(rows):
+                if len(vec) != self.dim:
+                    raise ValueError(f"Vector has dim={len(vec)}, shard {self.path} has dim={self.dim}")
+                payload += struct.pack(f"={self.dim}{code}", *_unit(vec))
+                log.append(json.dumps(["a", start + i, chunk_id, doc_id, int(idx)]))
+            # Vectors before the log: a row is only replayed once its vector is on disk
+            with open(self._file("vectors.bin"), "ab") as f:
+                f.write(payload)
+            with open(self._file("rows.jsonl"), "a") as f:
+                f.write("\n".join(log) + "\n")
+            self._tail()
+            if self.use_hnsw:
+                if self._index is None:
+                    self._index, self._indexed = self._new_index(self.count), 0
+                self._sync_index()
+            self._dirty = True
+        return len(rows)
+
+    def delete(self, chunk_ids: Iterable[str]) -> int:
+        chunk_ids = list(chunk_ids)
+        with self._writing():
+            removed = [cid for cid in chunk_ids if cid in self.rows]
+            if not removed:
+                return 0
+            with open(self._file("rows.jsonl"), "a") as f:
+                f.write("\n".join(json.dumps(["d", cid]) for cid in removed) + "\n")
+            self._tail()
+            self._dirty = True
+        return len(removed)
+
+    def persist(self) -> None:
+        """Compact when most rows are dead, fsync the data files and save the HNSW graph.
+
+        A no-op unless this process wrote since the last call.
+        """
+        if not self._dirty:
+            return
+        with self._writing():
+            if self.dim is None:
+                return
+            if len(self.dead) > max(1024, len(self.rows)):
+                self._compact()
+            for name in ("vectors.bin", "rows.jsonl"):
+                with open(self._file(name), "ab") as f:
+                    os.fsync(f.fileno())
+            if self._index is not None:
+                self._index.save_index(self._file("hnsw.bin.tmp"))
+                os.replace(self._file("hnsw.bin.tmp"), self._file("hnsw.bin"))
+            self._dirty = False
+
+    def _compact(self) -> None:
+        live = sorted(self.rows.values())
+        view = self._matrix()
+        with open(self._file("vectors.bin.tmp"), "wb") as f:
+            for row in live:
+                if np is not None:
+                    f.write(np.asarray(view[row]).tobytes())
+                else:
+                    f.write(view[row * self._row_bytes : (row + 1) * self._row_bytes])
+        with open(self._file("rows.jsonl.tmp"), "w") as f:
+            for new, row in enumerate(live):
+                chunk_id, doc_id, idx = self.meta[row]
+                f.write(json.dumps(["a", new, chunk_id, doc_id, idx]) + "\n")
+        self._unmap()
+        os.replace(self._file("vectors.bin.tmp"), self._file("vectors.bin"))
+        os.replace(self._file("rows.jsonl.tmp"), self._file("rows.jsonl"))
+        if os.path.exists(self._file("hnsw.bin")):
+            os.remove(self._file("hnsw.bin"))
+        self._reset()
+        self._load()
+
+    # -- reads -----------------------------------------------------------------------------------
+    def search(self, query_vector: List[float], top_k: int = 25) -> List[Tuple[str, float, str, int]]:
+        with self._lock:
+            self._refresh()
+            live = len(self.rows)
+            if not live or top_k <= 0:
+                return []
+            if len(query_vector) != self.dim:
+                raise ValueError(f"Query has dim={len(query_vector)}, shard {self.path} has dim={self.dim}")
+            q = _unit(query_vector)
+            k = min(top_k, live)
+            if self._index is not None:
+                self._index.set_ef(max(config.LOCAL_VECTOR_EF, k))
+                labels, distances = self._index.knn_query([q], k=k)
+                # hnswlib "ip" distance is 1 - dot
+                scored = [(int(r), 1.0 - float(d)) for r, d in zip(labels[0], distances[0])]
+            else:
+                scored = self._scan(q, k)
+            return [(self.meta[r][0], s, self.meta[r][1], self.meta[r][2]) for r, s in scored]
+
+    def _scan(self, q: List[float], k: int) -> List[Tuple[int, float]]:
+        view = self._matrix()
+        if np is not None:
+            qv = np.asarray(q, dtype=np.float32)
+            scores = np.empty(self.count, dtype=np.float32)
+            step = 65536  # bounds the float32 copy of float16 rows
+            for start in range(0, self.count, step):
+                scores[start : start + step] = np.asarray(view[start : start + step], dtype=np.float32) @ qv
+            if self.dead:
+                scores[np.fromiter(self.dead, dtype=np.int64)] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(r), float(scores[r])) for r in top]
+        scored = [(row, sum(a * b for a, b in zip(self.vector(row), q))) for row in self.rows.values()]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored[:k]
+
+    def get_vectors(self, chunk_ids: Iterable[str]) -> Dict[str, List[float]]:
+        with self._lock:
+            self._refresh()
+            return {cid: self.vector(self.rows[cid]) for cid in chunk_ids if cid in self.rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._unmap()
+
+
+class LocalVectorStore:
+    """Project-sharded store with the upsert/search/get_vectors/delete surface of milvus_adapter."""
+
+    def __init__(self, root: str, *, dtype: str = "float32", use_hnsw: bool = True):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported LOCAL_VECTOR_DTYPE: {dtype}")
+        self.root = root
+        self.dtype = dtype
+        self.use_hnsw = use_hnsw
+        self._shards: Dict[str, Shard] = {}
+        self._lock = threading.Lock()
+
+    def shard(self, project_id: str) -> Shard:
+        shard = self._shards.get(project_id)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(project_id)
+                if shard is None:
+                    path = os.path.join(self.root, re.sub(r"[^0-9A-Za-z_.-]", "_", project_id))
+                    shard = self._shards[project_id] = Shard(path, dtype=self.dtype, use_hnsw=self.use_hnsw)
+        return shard
+
+    def upsert(self, project_id: str, rows: Iterable[Row]) -> int:
+        return self.shard(project_id).add(rows)
+
+    def delete(self, project_id: str, chunk_ids: Iterable[str]) -> int:
+        return self.shard(project_id).delete(chunk_ids)
+
+    def search(self, project_id: str, query_vector: List[float], top_k: int = 25) -> List[Tuple[str, float, str, int]]:
+        return self.shard(project_id).search(query_vector, top_k)
+
+    def get_vectors(self, chunk_ids: List[str]) -> Dict[str, List[float]]:
+        """Vectors from the shards opened by this process (the ones searched or written)."""
+        found: Dict[str, List[float]] = {}
+        for shard in list(self._shards.values()):
+            found.update(shard.get_vectors(cid for cid in chunk_ids if cid not in found))
+        return found
+
+    def persist(self) -> None:
+        for shard in list(self._shards.values()):
+            shard.persist()
+
+    def close(self) -> None:
+        for shard in list(self._shards.values()):
+            shard.close()
+
+
+_store: Optional[LocalVectorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> LocalVectorStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LocalVectorStore(
+                    config.LOCAL_VECTOR_DIR,
+                    dtype=config.LOCAL_VECTOR_DTYPE,
+                    use_hnsw=config.LOCAL_VECTOR_HNSW,
+                )
+    return _store
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import atexit
+import json
 import logging
+import re
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+try:
+    import numpy as np
+except Exception:
+    np = None  # type: ignore
+
 try:
     from pymilvus import (
         connections,
@@ -28,8 +38,163 @@ except Exception:
 from .. import config
 
 _CONN_ALIAS = "default"
-_COLLECTION_NAME = "chunks"
-_INDEX_NAME = "hnsw_cosine"
+_COLLECTION_NAME = config.MILVUS_COLLECTION
+_INDEX_NAME = f"{config.MILVUS_INDEX_TYPE}_{config.MILVUS_METRIC}".lower()
+
+Row = Tuple[str, str, int, List[float]]
+
+
+class UpsertBuffer:
+    """Accumulate upsert rows per project and write them in large batches.
+
+    A project's rows are flushed once `max_rows` are pending or the oldest pending row is
+    `max_age_s` old (checked on every add and by a background timer), and on `flush()`/exit.
+    Rows of a failed write are queued again ahead of rows added since.
+    """
+
+    def __init__(self, write: Callable[[str, List[Row]], int], *, max_rows: int, max_age_s: float):
+        self._write = write
+        self.max_rows = max(1, max_rows)
+        self.max_age_s = max_age_s
+        self._rows: Dict[str, List[Row]] = {}
+        self._since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Thread] = None
+
+    def add(self, project_id: str, rows: Iterable[Row]) -> int:
+        rows = list(rows)
+        with self._lock:
+            pending = self._rows.setdefault(project_id, [])
+            self._since.setdefault(project_id, time.monotonic())
+            pending.extend(rows)
+            due = len(pending) >= self.max_rows or self._age(project_id) >= self.max_age_s
+            if not due and self._timer is None:
+                self._timer = threading.Thread(target=self._tick, name="pivot-milvus-flush", daemon=True)
+                self._timer.start()
+        if due:
+            self.flush(project_id)
+        return len(rows)
+
+    def _age(self, project_id: str) -> float:
+        return time.monotonic() - self._since.get(project_id, time.monotonic())
+
+    def flush(self, project_id: Optional[str] = None) -> int:
+        with self._lock:
+            projects = [project_id] if project_id is not None else list(self._rows)
+            batches = [(p, self._rows.pop(p, []), self._since.pop(p, None)) for p in projects]
+        written = 0
+        for i, (p, rows, _since) in enumerate(batches):
+            if not rows:
+                continue
+            try:
+                written += self._write(p, rows)
+            except Exception:
+                self._requeue(batches[i:])
+                raise
+        return written
+
+    def _requeue(self, batches: List[Tuple[str, List[Row], Optional[float]]]) -> None:
+        with self._lock:
+            for p, rows, since in batches:
+                if rows:
+                    self._rows[p] = rows + self._rows.get(p, [])
+                    self._since[p] = min(t for t in (since, self._since.get(p), time.monotonic()) if t is not None)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(r) for r in self._rows.values())
+
+    def _tick(self) -> None:
+        while True:
+            time.sleep(max(0.05, self.max_age_s / 2))
+            with self._lock:
+                if not self._rows:
+                    self._timer = None
+                    return
+                due = [p for p in self._rows if self._age(p) >= self.max_age_s]
+            for p in due:
+                try:
+                    self.flush(p)
+                except Exception as e:
+                    logger.warning("Timed flush of buffered upserts for project %s failed: %s", p, e)
+
+
+PARTITION_MODES = ("none", "partition_key", "partition")
+
+
+def partition_name(project_id: str) -> str:
+    """Per-project partition name (partition layout); Milvus allows letters, digits and underscores."""
+    return "p_" + re.sub(r"[^0-9A-Za-z_]", "_", project_id)
+
+
+INDEX_TYPES = ("HNSW", "HNSW_SQ", "IVF_SQ8", "IVF_PQ")
+
+
+def index_params(index_type: str = config.MILVUS_INDEX_TYPE, metric: str = config.MILVUS_METRIC) -> dict:
+    """create_index() parameters for a configured encoding."""
+    if index_type in ("HNSW", "HNSW_SQ"):
+        params = {"M": config.MILVUS_HNSW_M, "efConstruction": config.MILVUS_HNSW_EF_CONSTRUCTION}
+        if index_type == "HNSW_SQ":
+            params["sq_type"] = "SQ8"
+    elif index_type == "IVF_SQ8":
+        params = {"nlist": config.MILVUS_IVF_NLIST}
+    elif index_type == "IVF_PQ":
+        params = {"nlist": config.MILVUS_IVF_NLIST, "m": config.MILVUS_PQ_M, "nbits": config.MILVUS_PQ_NBITS}
+    else:
+        raise ValueError(f"Unsupported MILVUS_INDEX_TYPE: {index_type}")
+    return {"index_type": index_type, "metric_type": metric, "params": params}
+
+
+def search_params(limit: int, index_type: str = config.MILVUS_INDEX_TYPE, metric: str = config.MILVUS_METRIC) -> dict:
+    if index_type.startswith("HNSW"):
+        return {"metric_type": metric, "params": {"ef": max(config.MILVUS_SEARCH_EF, limit)}}
+    return {"metric_type": metric, "params": {"nprobe": config.MILVUS_IVF_NPROBE}}
+
+
+def _unit(vec) -> List[float]:
+    norm = sum(float(x) * float(x) for x in vec) ** 0.5
+    return [float(x) / norm for x in vec] if norm > 0 else [float(x) for x in vec]
+
+
+def encode_vectors(vectors: List[List[float]]):
+    """Vectors as sent to Milvus: unit length for the IP metric, float32/float16 arrays instead of float64 lists."""
+    if config.MILVUS_METRIC == "IP":
+        vectors = [_unit(v) for v in vectors]
+    if np is None:
+        if config.MILVUS_VECTOR_TYPE == "float16":
+            raise RuntimeError("MILVUS_VECTOR_TYPE=float16 requires numpy")
+        return [[float(x) for x in v] for v in vectors]
+    dtype = np.float16 if config.MILVUS_VECTOR_TYPE == "float16" else np.float32
+    return [np.asarray(v, dtype=dtype) for v in vectors]
+
+
+def decode_vector(value) -> List[float]:
+    """Stored embedding as returned by query(): float16 fields come back as raw bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        if np is None:
+            import struct
+
+            return list(struct.unpack(f"={len(value) // 2}e", value))
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32).tolist()
+    return [float(x) for x in value]
+
+
+def rescore(
+    query_vector: List[float],
+    hits: list[tuple[str, float, str, int]],
+    vectors: Dict[str, List[float]],
+    top_k: int,
+) -> list[tuple[str, float, str, int]]:
+    """Replace approximate scores with exact cosine against `vectors`; hits without a vector keep theirs."""
+    q = _unit(query_vector)
+    exact = []
+    for chunk_id, score, doc_id, idx in hits:
+        vec = vectors.get(chunk_id)
+        if vec is not None:
+            score = sum(a * b for a, b in zip(q, _unit(vec)))
+        exact.append((chunk_id, float(score), doc_id, idx))
+    exact.sort(key=lambda h: h[1], reverse=True)
+    return exact[:top_k]
 
 
 if _HAS_PYMILVUS:
@@ -38,33 +203,158 @@ if _HAS_PYMILVUS:
             connections.connect(alias=_CONN_ALIAS, host=config.MILVUS_HOST, port=str(config.MILVUS_PORT))
 
 
+    def _create_collection(name: str, vector_dim: int, partition_mode: str):
+        """Create the chunks collection for a layout.
+
+        none: one flat collection, searches filter on project_id.
+        partition_key: project_id is the partition key, hashed into MILVUS_NUM_PARTITIONS partitions.
+        partition: one named partition per project (created on first upsert).
+        """
+        fields = [
+            FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
+            FieldSchema(
+                name="project_id",
+                dtype=DataType.VARCHAR,
+                max_length=64,
+                is_partition_key=(partition_mode == "partition_key"),
+            ),
+            FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="idx", dtype=DataType.INT64),
+            FieldSchema(name="embedding", dtype=_vector_dtype(), dim=vector_dim),
+        ]
+        schema = CollectionSchema(fields=fields, description="PIVOT chunks embeddings")
+        kwargs = {"num_partitions": config.MILVUS_NUM_PARTITIONS} if partition_mode == "partition_key" else {}
+        coll = Collection(name=name, schema=schema, **kwargs)
+        coll.create_index(field_name="embedding", index_name=_INDEX_NAME, index_params=index_params())
+        return coll
+
+
+    def _vector_dtype():
+        return DataType.FLOAT16_VECTOR if config.MILVUS_VECTOR_TYPE == "float16" else DataType.FLOAT_VECTOR
+
+
+    class CollectionManager:
+        """Process-wide cache of the collection handle, its load state, schema check and partitions.
+
+        Replaces the has_collection / Collection() / load() round trips previously made on every call.
+        """
+
+        def __init__(self, name: str = _COLLECTION_NAME, partition_mode: str = "none"):
+            if partition_mode not in PARTITION_MODES:
+                raise ValueError(f"Unsupported MILVUS_PARTITION_MODE: {partition_mode}")
+            self.name = name
+            self.partition_mode = partition_mode
+            self._coll = None
+            self._loaded = False
+            self._partitions: set[str] = set()
+            self._lock = threading.Lock()
+
+        def get(self, vector_dim: Optional[int] = None, *, create: bool = True):
+            """Return the collection handle, creating it when `create` and `vector_dim` allow; else None."""
+            if self._coll is not None:
+                return self._coll
+            with self._lock:
+                if self._coll is None:
+                    _connect()
+                    if utility.has_collection(self.name):
+                        coll = Collection(name=self.name)
+                        self._check_schema(coll, vector_dim)
+                    elif create and vector_dim:
+                        coll = _create_collection(self.name, vector_dim, self.partition_mode)
+                    else:
+                        return None
+                    self._coll = coll
+            return self._coll
+
+        def get_loaded(self, vector_dim: Optional[int] = None):
+            """Return the collection loaded into query nodes (load() is issued once per process)."""
+            coll = self.get(vector_dim, create=False)
+            if coll is not None and not self._loaded:
+                with self._lock:
+                    if not self._loaded:
+                        coll.load()
+                        self._loaded = True
+            return coll
+
+        def ensure_partition(self, coll, project_id: str) -> str:
+            name = partition_name(project_id)
+            if name not in self._partitions:
+                with self._lock:
+                    if not coll.has_partition(name):
+                        # Partitions created on a loaded collection are loaded automatically
+                        coll.create_partition(name)
+                    self._partitions.add(name)
+            return name
+
+        def has_partition(self, coll, project_id: str) -> bool:
+            name = partition_name(project_id)
+            if name in self._partitions:
+                return True
+            if coll.has_partition(name):
+                self._partitions.add(name)
+                return True
+            return False
+
+        def invalidate(self) -> None:
+            with self._lock:
+                self._coll = None
+                self._loaded = False
+                self._partitions.clear()
+
+        def _check_schema(self, coll, vector_dim: Optional[int]) -> None:
+            fields = {f.name: f for f in coll.schema.fields}
+            missing = {"chunk_id", "project_id", "doc_id", "idx", "embedding"} - set(fields)
+            if missing:
+                raise RuntimeError(f"Milvus collection {self.name!r} is missing fields: {sorted(missing)}")
+            dim = (fields["embedding"].params or {}).get("dim")
+            if vector_dim and dim and int(dim) != int(vector_dim):
+                raise RuntimeError(f"Milvus collection {self.name!r} has dim={dim}, embeddings have dim={vector_dim}")
+            if fields["embedding"].dtype != _vector_dtype():
+                raise RuntimeError(
+                    f"Milvus collection {self.name!r} stores {fields['embedding'].dtype.name}, "
+                    f"MILVUS_VECTOR_TYPE={config.MILVUS_VECTOR_TYPE}; migrate it with `python -m pivot.adapters.milvus_migrate`"
+                )
+            is_key = bool(getattr(fields["project_id"], "is_partition_key", False))
+            if is_key != (self.partition_mode == "partition_key"):
+                raise RuntimeError(
+                    f"Milvus collection {self.name!r} layout does not match MILVUS_PARTITION_MODE={self.partition_mode}; "
+                    "migrate it with `python -m pivot.adapters.milvus_migrate`"
+                )
+
+
+    _manager = CollectionManager(config.MILVUS_COLLECTION, config.MILVUS_PARTITION_MODE)
+
+
     def ensure_collection(vector_dim: int):
-        _connect()
-        if not utility.has_collection(_COLLECTION_NAME):
-            fields = [
-                FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
-                FieldSchema(name="project_id", dtype=DataType.VARCHAR, max_length=64),
-                FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=64),
-                FieldSchema(name="idx", dtype=DataType.INT64),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=vector_dim),
+        return _manager.get(vector_dim)
+
+
+    def warmup(vector_dim: Optional[int] = None) -> bool:
+        """Connect, validate the schema and load the collection once (e.g. at API startup)."""
+        return _manager.get_loaded(vector_dim) is not None
+
+
+    def _write_rows(project_id: str, rows: List[Row], manager: Optional["CollectionManager"] = None) -> int:
+        manager = manager or _manager
+        coll = manager.get(len(rows[0][3]))
+        kwargs = {}
+        if manager.partition_mode == "partition":
+            kwargs["partition_name"] = manager.ensure_partition(coll, project_id)
+        for start in range(0, len(rows), config.MILVUS_UPSERT_BATCH):
+            batch = rows[start : start + config.MILVUS_UPSERT_BATCH]
+            entities = [
+                [r[0] for r in batch],  # chunk_id
+                [project_id] * len(batch),
+                [r[1] for r in batch],  # doc_id
+                [int(r[2]) for r in batch],  # idx
+                encode_vectors([r[3] for r in batch]),  # embedding
             ]
-            schema = CollectionSchema(fields=fields, description="PIVOT chunks embeddings")
-            coll = Collection(name=_COLLECTION_NAME, schema=schema)
-            # Create index
-            coll.create_index(
-                field_name="embedding",
-                index_name=_INDEX_NAME,
-                index_params={
-                    "index_type": "HNSW",
-                    "metric_type": "COSINE",
-                    "params": {"M": 48, "efConstruction": 200},
-                },
-            )
-            coll.load()
-            return coll
-        else:
-            coll = Collection(name=_COLLECTION_NAME)
-            return coll
+            coll.upsert(data=entities, **kwargs)
+        return len(rows)
+
+
+    _buffer = UpsertBuffer(_write_rows, max_rows=config.MILVUS_FLUSH_MAX_ROWS, max_age_s=config.MILVUS_FLUSH_MAX_AGE_S)
+    atexit.register(lambda: _buffer.flush())
 
 
     def upsert_embeddings(
@@ -72,24 +362,46 @@ if _HAS_PYMILVUS:
         rows: Iterable[Tuple[str, str, int, List[float]]],
         *,
         vector_dim: Optional[int] = None,
+        buffered: bool = False,
     ) -> int:
-        """rows: iterable of (chunk_id, doc_id, idx, embedding)"""
+        """rows: iterable of (chunk_id, doc_id, idx, embedding).
+
+        With `buffered=True` rows are queued and written on the size/age thresholds (see `flush`).
+        """
         rows = list(rows)
         if not rows:
             return 0
-        if vector_dim is None:
-            vector_dim = len(rows[0][3])
-        coll = ensure_collection(vector_dim)
-        entities = [
-            [r[0] for r in rows],  # chunk_id
-            [project_id] * len(rows),
-            [r[1] for r in rows],  # doc_id
-            [int(r[2]) for r in rows],  # idx
-            [r[3] for r in rows],  # embedding
-        ]
-        coll.upsert(data=entities)
-        coll.load()
-        return len(rows)
+        if buffered:
+            return _buffer.add(project_id, rows)
+        _manager.get(vector_dim or len(rows[0][3]))
+        return _write_rows(project_id, rows)
+
+
+    def flush(project_id: Optional[str] = None) -> int:
+        """Write the buffered upserts of `project_id` (all projects when None) now. Returns the number
+        of rows written."""
+        return _buffer.flush(project_id)
+
+
+    def delete(project_id: str, chunk_ids: Iterable[str]) -> int:
+        """Remove the rows of `chunk_ids` (e.g. stale chunks of a re-ingested document)."""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return 0
+        # A buffered upsert written after the delete would bring the row back
+        _buffer.flush(project_id)
+        coll = _manager.get(create=False)
+        if coll is None:
+            return 0
+        kwargs = {}
+        if _manager.partition_mode == "partition":
+            if not _manager.has_partition(coll, project_id):
+                return 0
+            kwargs["partition_name"] = partition_name(project_id)
+        for start in range(0, len(chunk_ids), config.MILVUS_UPSERT_BATCH):
+            batch = chunk_ids[start : start + config.MILVUS_UPSERT_BATCH]
+            coll.delete(expr=f"chunk_id in {json.dumps(batch)}", **kwargs)
+        return len(chunk_ids)
 
 
     def search(
@@ -97,27 +409,68 @@ if _HAS_PYMILVUS:
         query_vector: List[float],
         top_k: int = 25,
     ) -> list[tuple[str, float, str, int]]:
-        """Return list of (chunk_id, score, doc_id, idx). Higher score is better (cosine)."""
-        _connect()
-        coll = Collection(name=_COLLECTION_NAME)
-        if not utility.has_collection(_COLLECTION_NAME):
+        """Return list of (chunk_id, score, doc_id, idx). Higher score is better (cosine).
+
+        Only the project's own data is traversed when the collection is partitioned
+        (per-project partition, or partition-key pruning on project_id). With MILVUS_RESCORE_FACTOR
+        the compressed index returns more candidates, re-ranked by exact cosine on the stored vectors.
+        """
+        return search_many(project_id, [query_vector], top_k)[0]
+
+
+    def search_many(
+        project_id: str,
+        query_vectors: List[List[float]],
+        top_k: int = 25,
+    ) -> list[list[tuple[str, float, str, int]]]:
+        """`search` for several query vectors in one request; one hit list per vector."""
+        if not query_vectors:
             return []
-        coll.load()
-        res = coll.search(
-            data=[query_vector],
-            anns_field="embedding",
-            param={"metric_type": "COSINE", "params": {"ef": 128}},
-            limit=top_k,
-            expr=f"project_id == '{project_id}'",
-            output_fields=["doc_id", "idx"],
+        coll = _manager.get_loaded()
+        if coll is None:
+            return [[] for _ in query_vectors]
+        route: dict = {"expr": f"project_id == '{project_id}'"}
+        if _manager.partition_mode == "partition":
+            if not _manager.has_partition(coll, project_id):
+                return [[] for _ in query_vectors]
+            route = {"partition_names": [partition_name(project_id)]}
+        limit = top_k * config.MILVUS_RESCORE_FACTOR if config.MILVUS_RESCORE_FACTOR > 1 else top_k
+        try:
+            res = coll.search(
+                data=encode_vectors(query_vectors),
+                anns_field="embedding",
+                param=search_params(limit),
+                limit=limit,
+                output_fields=["doc_id", "idx"],
+                **route,
+            )
+        except Exception:
+            # e.g. collection dropped or released elsewhere: re-resolve on the next call
+            _manager.invalidate()
+            raise
+        # With COSINE (and IP over unit vectors) Milvus reports the similarity itself (higher is better)
+        out = [
+            [(hit.id, float(hit.distance), hit.entity.get("doc_id"), int(hit.entity.get("idx"))) for hit in hits]
+            for hits in res
+        ]
+        if limit > top_k:
+            vectors = get_vectors(list({h[0] for hits in out for h in hits}))
+            out = [rescore(q, hits, vectors, top_k) for q, hits in zip(query_vectors, out)]
+        return out
+
+
+    def get_vectors(chunk_ids: List[str]) -> Dict[str, List[float]]:
+        """Return {chunk_id: stored embedding} for the ids present in the collection."""
+        if not chunk_ids:
+            return {}
+        coll = _manager.get_loaded()
+        if coll is None:
+            return {}
+        rows = coll.query(
+            expr=f"chunk_id in {json.dumps(list(chunk_ids))}",
+            output_fields=["chunk_id", "embedding"],
         )
-        hits = []
-        for hit in res[0]:
-            hits.append((hit.id, float(hit.distance), hit.entity.get("doc_id"), int(hit.entity.get("idx"))))
-        # For cosine, Milvus returns distance (1 - cosine) if metric is IP cos? With COSINE, smaller is better.
-        # Convert to descending score: score = 1 - distance
-        hits = [(cid, 1.0 - dist, doc, idx) for (cid, dist, doc, idx) in hits]
-        return hits
+        return {r["chunk_id"]: decode_vector(r["embedding"]) for r in rows}
 
 else:
     # Stubs for environments without pymilvus. The test environment will monkeypatch `search` when needed.
@@ -130,11 +483,94 @@ else:
         return None
 
 
-    def upsert_embeddings(project_id: str, rows: Iterable[Tuple[str, str, int, List[float]]], *, vector_dim: Optional[int] = None) -> int:
+    def warmup(vector_dim: Optional[int] = None) -> bool:
+        return False
+
+
+    def upsert_embeddings(
+        project_id: str,
+        rows: Iterable[Tuple[str, str, int, List[float]]],
+        *,
+        vector_dim: Optional[int] = None,
+        buffered: bool = False,
+    ) -> int:
         logger.info("pymilvus not available; upsert_embeddings is a no-op in tests")
         return len(list(rows))
 
 
+    def flush(project_id: Optional[str] = None) -> int:
+        return 0
+
+
+    def delete(project_id: str, chunk_ids: Iterable[str]) -> int:
+        logger.info("pymilvus not available; delete is a no-op in tests")
+        return len(list(chunk_ids))
+
+
     def search(project_id: str, query_vector: List[float], top_k: int = 25) -> list[tuple[str, float, str, int]]:
         logger.info("pymilvus not available; search returns empty list in tests (caller may monkeypatch)")
         return []
+
+
+    def search_many(
+        project_id: str,
+        query_vectors: List[List[float]],
+        top_k: int = 25,
+    ) -> list[list[tuple[str, float, str, int]]]:
+        # Resolved at call time so a monkeypatched `search` is honoured
+        return [search(project_id, v, top_k) for v in query_vectors]
+
+
+    def get_vectors(chunk_ids: List[str]) -> Dict[str, List[float]]:
+        return {}
+
+
+if config.VECTOR_BACKEND == "local":
+    # Same surface, served by the in-process store (no Milvus cluster needed)
+    from . import local_vector_store
+
+    def ensure_collection(vector_dim: int):
+        return local_vector_store.get_store()
+
+
+    def warmup(vector_dim: Optional[int] = None) -> bool:
+        return local_vector_store.get_store() is not None
+
+
+    def upsert_embeddings(
+        project_id: str,
+        rows: Iterable[Tuple[str, str, int, List[float]]],
+        *,
+        vector_dim: Optional[int] = None,
+        buffered: bool = False,
+    ) -> int:
+        return local_vector_store.get_store().upsert(project_id, rows)
+
+
+    def flush(project_id: Optional[str] = None) -> int:
+        local_vector_store.get_store().persist()
+        return 0
+
+
+    def delete(project_id: str, chunk_ids: Iterable[str]) -> int:
+        return local_vector_store.get_store().delete(project_id, chunk_ids)
+
+
+    def search(project_id: str, query_vector: List[float], top_k: int = 25) -> list[tuple[str, float, str, int]]:
+        return local_vector_store.get_store().search(project_id, query_vector, top_k)
+
+
+    def search_many(
+        project_id: str,
+        query_vectors: List[List[float]],
+        top_k: int = 25,
+    ) -> list[list[tuple[str, float, str, int]]]:
+        store = local_vector_store.get_store()
+        return [store.search(project_id, v, top_k) for v in query_vectors]
+
+
+    def get_vectors(chunk_ids: List[str]) -> Dict[str, List[float]]:
+        return local_vector_store.get_store().get_vectors(chunk_ids)
+
+
+    atexit.register(lambda: local_vector_store.get_store().persist())
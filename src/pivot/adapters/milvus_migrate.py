@@ -0,0 +1,83 @@
+"""Copy the chunks collection into a new project layout (MILVUS_PARTITION_MODE) and vector
+encoding (MILVUS_VECTOR_TYPE / MILVUS_INDEX_TYPE / MILVUS_METRIC, read from the environment).
+
+    python -m pivot.adapters.milvus_migrate --source chunks --target chunks_v2 --mode partition --rename
+
+Rows are streamed with a query iterator and written grouped by project, so per-project partitions
+are created as they are encountered. With --rename the source is kept as `<source>_flat_backup` and
+the target takes over the source name; otherwise point MILVUS_COLLECTION at the target.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from .. import config
+from . import milvus_adapter
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(source: str, target: str, mode: str, *, batch_size: int = 1000, rename: bool = False) -> int:
+    """Copy every row of `source` into `target` (created with layout `mode`). Returns rows copied."""
+    if not milvus_adapter._HAS_PYMILVUS:
+        raise RuntimeError("pymilvus is not installed")
+    from pymilvus import Collection, utility
+
+    milvus_adapter._connect()
+    if not utility.has_collection(source):
+        raise RuntimeError(f"Milvus collection {source!r} does not exist")
+    src = Collection(name=source)
+    src.load()
+    dim = int(next(f for f in src.schema.fields if f.name == "embedding").params["dim"])
+    dest = milvus_adapter.CollectionManager(target, mode)
+    dest.get(dim)
+
+    copied = 0
+    it = src.query_iterator(
+        batch_size=batch_size,
+        expr='chunk_id != ""',
+        output_fields=["chunk_id", "project_id", "doc_id", "idx", "embedding"],
+    )
+    try:
+        while True:
+            batch = it.next()
+            if not batch:
+                break
+            by_project: Dict[str, List[milvus_adapter.Row]] = defaultdict(list)
+            for r in batch:
+                vec = milvus_adapter.decode_vector(r["embedding"])
+                by_project[r["project_id"]].append((r["chunk_id"], r["doc_id"], int(r["idx"]), vec))
+            for project_id, rows in by_project.items():
+                copied += milvus_adapter._write_rows(project_id, rows, dest)
+            logger.info("Copied %d rows from %s to %s", copied, source, target)
+    finally:
+        it.close()
+
+    dest.get().flush()
+    if rename:
+        backup = f"{source}_flat_backup"
+        src.release()
+        utility.rename_collection(source, backup)
+        utility.rename_collection(target, source)
+        logger.info("Renamed %s -> %s and %s -> %s", source, backup, target, source)
+    return copied
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pivot.adapters.milvus_migrate")
+    parser.add_argument("--source", default=config.MILVUS_COLLECTION)
+    parser.add_argument("--target", required=True)
+    parser.add_argument("--mode", choices=list(milvus_adapter.PARTITION_MODES), default=config.MILVUS_PARTITION_MODE)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rename", action="store_true", help="swap the target in under the source name")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    print(migrate(args.source, args.target, args.mode, batch_size=args.batch_size, rename=args.rename))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
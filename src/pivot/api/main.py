@@ -1,18 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import json
+import logging
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 # FastAPI and Pydantic are optional at import-time for test environments
 try:
-    from fastapi import FastAPI, HTTPException, UploadFile, File
-    from fastapi.responses import StreamingResponse
+    from fastapi import FastAPI, HTTPException, UploadFile, File, Request
+    from fastapi.responses import Response, StreamingResponse
 except Exception:  # pragma: no cover - defensive
     FastAPI = None  # type: ignore
     class HTTPException(Exception):
         pass
     UploadFile = None
     File = None
+    Request = None
+    Response = None
     StreamingResponse = None
 
 try:
@@ -28,23 +36,43 @@ except Exception:  # pragma: no cover - defensive
         return default
 
 # Note: do NOT import ingest_job or db at module import time; import lazily in functions
-from ..embedding import embed_query
+from .. import config
+from .. import metrics
+from ..cache import TTLCache
+from .. import embedding
+from ..embedding import embed_query_with_status
 from ..adapters import milvus_adapter
 from ..services import reranker_service
+from ..services.fusion import reciprocal_rank_fusion
 from .. import llm_runtime
+from .. import prometheus
+from .. import response_cache
 from .. import session_manager
+from .. import tracing
+from ..tracing import stage
 
 
+logger = logging.getLogger(__name__)
+
 # Create FastAPI app if available; otherwise keep app as None for tests
 app = FastAPI(title="PIVOT API", version="0.1.0") if FastAPI is not None else None
 
 
+INGEST_MODES = ("create", "update")
+
+
 class IngestReq(BaseModel):
     project: str = Field(default="default")
     source_type: str
     source_ref: str
     tags: Optional[List[str]] = None
     metadata: Optional[Dict[str, Any]] = None
+    # "update": re-ingest the stored document of the same source_url, re-embedding only changed chunks
+    mode: str = Field(default="create")
+
+
+class IngestBatchReq(BaseModel):
+    items: List[IngestReq]
 
 
 class QueryReq(BaseModel):
@@ -53,21 +81,65 @@ class QueryReq(BaseModel):
     top_k: int = 25
 
 
+class QueryBatchReq(BaseModel):
+    project: str = Field(default="default")
+    queries: List[str]
+    top_k: int = 25
+    generate: bool = False
+
+
 if app is not None:
+    @app.on_event("startup")
+    async def _warm_vector_store():
+        # Connect, check the schema and load the collection once, before the first query
+        try:
+            await asyncio.to_thread(milvus_adapter.warmup)
+        except Exception as e:
+            logger.warning("Vector store warmup failed: %s", e)
+
+
     @app.get("/health")
     def health():
         return {"ok": True}
 
 
+    @app.get("/stats")
+    def stats():
+        from .. import db
+
+        pool_stats = getattr(db, "pool_stats", None)
+        return {
+            "db": pool_stats() if pool_stats else None,
+            "caches": {
+                "snippets": _snippet_cache.stats(),
+                "project_ids": _project_ids.stats(),
+                "responses": response_cache.stats(),
+                "query_embeddings": embedding.query_cache_stats(),
+                "rerank_scores": reranker_service.cache_stats(),
+            },
+            "metrics": metrics.snapshot(),
+        }
+
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        # Includes the metrics published by worker processes (see pivot.prometheus)
+        return Response(prometheus.render_all(), media_type=prometheus.CONTENT_TYPE)
+
+
     @app.post("/ingest")
     def ingest(req: IngestReq):
         if not req.source_ref:
             raise HTTPException(400, "source_ref required")
+        if req.mode not in INGEST_MODES:
+            raise HTTPException(400, f"mode must be one of {INGEST_MODES}")
         payload = req.dict()
         # Import Celery task lazily to avoid heavy imports during module import
         try:
             from ..workers.tasks import ingest_job
-            async_result = ingest_job.apply_async(args=[payload], queue="ingest")
+            # The task's spans join this request's trace through the message headers
+            with tracing.span("ingest.enqueue", source_type=req.source_type, mode=req.mode):
+                async_result = ingest_job.apply_async(args=[payload], queue="ingest")
             return {"task_id": async_result.id}
         except Exception:
             # In environments without Celery, return a test task id
@@ -77,67 +149,490 @@ else:
     def ingest(req: IngestReq):
         if not getattr(req, 'source_ref', None):
             raise HTTPException(400, "source_ref required")
+        if getattr(req, 'mode', "create") not in INGEST_MODES:
+            raise HTTPException(400, f"mode must be one of {INGEST_MODES}")
         payload = req.dict() if hasattr(req, 'dict') else req.__dict__
         # In test environment, we won't actually enqueue a Celery job.
         return {"task_id": "test"}
 
 
-# Query handler usable both as FastAPI endpoint and as direct function call in tests
-def query(req: QueryReq):
-    # Import db lazily to avoid importing psycopg2 at module import time in test envs
+def ingest_batch(req: IngestBatchReq) -> Dict[str, Any]:
+    """Enqueue many sources as ingest_batch_job tasks of up to INGEST_BATCH_MAX_DOCS documents each."""
+    items = list(req.items)
+    if any(not item.source_ref for item in items):
+        raise HTTPException(400, "source_ref required")
+    if any(item.mode not in INGEST_MODES for item in items):
+        raise HTTPException(400, f"mode must be one of {INGEST_MODES}")
+    payloads = [item.dict() for item in items]
+    size = max(1, config.INGEST_BATCH_MAX_DOCS)
+    batches = [payloads[i : i + size] for i in range(0, len(payloads), size)]
+    try:
+        from ..workers.tasks import ingest_batch_job
+
+        with tracing.span("ingest.enqueue", documents=len(payloads), tasks=len(batches)):
+            task_ids = [ingest_batch_job.apply_async(args=[batch], queue="ingest").id for batch in batches]
+    except Exception:
+        # In environments without Celery, return test task ids
+        task_ids = ["test"] * len(batches)
+    return {"task_ids": task_ids, "documents": len(payloads)}
+
+
+if app is not None:
+    @app.post("/ingest/batch")
+    def ingest_batch_endpoint(req: IngestBatchReq):
+        return ingest_batch(req)
+
+
+# Hot chunks are served from memory; only cache misses go to Postgres
+_snippet_cache = TTLCache(
+    maxsize=config.SNIPPET_CACHE_SIZE,
+    ttl=config.SNIPPET_CACHE_TTL_S,
+    name="snippets",
+)
+
+# Milvus rows carry the project id while requests name the project
+_project_ids = TTLCache(maxsize=1024, ttl=config.SNIPPET_CACHE_TTL_S, name="project_ids")
+
+
+def _hit_ratio(stats_fn) -> Optional[float]:
+    st = stats_fn()
+    lookups = st["hits"] + st["misses"]
+    return st["hits"] / lookups if lookups else None
+
+
+# Exported on /metrics; /stats keeps the raw counts
+for _name, _stats_fn in (
+    ("snippets", _snippet_cache.stats),
+    ("project_ids", _project_ids.stats),
+    ("responses", response_cache.stats),
+    ("query_embeddings", lambda: embedding.query_cache_stats()["local"]),
+    ("rerank_scores", reranker_service.cache_stats),
+):
+    metrics.gauge(
+        "cache_hit_ratio",
+        lambda f=_stats_fn: _hit_ratio(f),
+        description="Hits / lookups of each in-process cache",
+        labels={"cache": _name},
+    )
+
+
+def resolve_project_id(name: str) -> Optional[str]:
+    """Project name -> id (None for unknown projects, which are not cached)."""
     from .. import db
 
-    t0 = time.time()
-    qvec = embed_query(req.query)
-    emb_ms = int((time.time() - t0) * 1000)
-    hits = milvus_adapter.search(req.project, qvec, top_k=req.top_k)
-    doc_ids = list({doc for (_cid, _score, doc, _idx) in hits})
-    doc_url_map = db.get_documents_source_url(doc_ids)
+    pid = _project_ids.get(name)
+    if pid is None:
+        pid = db.get_project_id(name)
+        if pid is not None:
+            _project_ids.set(name, pid)
+    return pid
+
+
+async def resolve_project_id_async(name: str) -> Optional[str]:
+    from .. import db_async
+
+    pid = _project_ids.get(name)
+    if pid is None:
+        pid = await db_async.get_project_id(name)
+        if pid is not None:
+            _project_ids.set(name, pid)
+    return pid
+
+
+# Bounded executors: model forward passes on the CPU pool, blocking clients (Milvus, LLM) on the I/O pool
+_cpu_executor = ThreadPoolExecutor(max_workers=config.QUERY_CPU_WORKERS, thread_name_prefix="pivot-cpu")
+_io_executor = ThreadPoolExecutor(max_workers=config.QUERY_IO_WORKERS, thread_name_prefix="pivot-io")
+
+
+async def _run_in(executor: ThreadPoolExecutor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+def _cached_snippets(hits: List[tuple]) -> tuple[Dict[str, Any], List[str]]:
+    """Return (cached rows by chunk_id, chunk_ids still to fetch)."""
+    chunk_ids = [h[0] for h in hits]
+    found = _snippet_cache.get_many(chunk_ids)
+    missing = [cid for cid in dict.fromkeys(chunk_ids) if cid not in found]
+    return found, missing
+
+
+def _build_results(hits: List[tuple], found: Dict[str, Any]) -> List[Dict[str, Any]]:
     results = []
-    for cid, score, doc_id, idx in hits:
-        snippet = db.get_chunk_snippet(cid) or ""
-        results.append(
-            {
-                "chunk_id": cid,
-                "score": round(float(score), 6),
-                "snippet": snippet[:5000],
-                "doc_id": doc_id,
-                "idx": idx,
-                "source_url": doc_url_map.get(doc_id),
-            }
-        )
+    for cid, score, doc_id, idx, *fused in hits:
+        row = found.get(cid) or {}
+        result = {
+            "chunk_id": cid,
+            # Vector similarity; None for hits found only by the lexical search
+            "score": round(float(score), 6) if score is not None else None,
+            "snippet": row.get("snippet") or "",
+            "doc_id": doc_id,
+            "idx": idx,
+            "source_url": row.get("source_url"),
+        }
+        if fused:
+            result["fused_score"] = round(float(fused[0]), 6)
+        results.append(result)
+    return results
+
+
+def hydrate_hits(hits: List[tuple]) -> List[Dict[str, Any]]:
+    """Turn (chunk_id, score, doc_id, idx[, fused_score]) hits into result dicts with snippet and source_url.
+
+    Cached chunks skip the database; the rest are fetched with a single joined query.
+    """
+    return hydrate_hit_lists([hits])[0]
+
+
+def hydrate_hit_lists(hit_lists: List[List[tuple]]) -> List[List[Dict[str, Any]]]:
+    """hydrate_hits for several hit lists with one fetch for their union (result dicts are not shared)."""
+    from .. import db
+
+    found, missing = _cached_snippets([h for hits in hit_lists for h in hits])
+    if missing:
+        fetched = db.get_chunk_snippets(missing, max_chars=config.SNIPPET_MAX_CHARS)
+        _snippet_cache.set_many(fetched)
+        found.update(fetched)
+    return [_build_results(hits, found) for hits in hit_lists]
+
+
+async def hydrate_hits_async(hits: List[tuple]) -> List[Dict[str, Any]]:
+    """Async variant of hydrate_hits using the async Postgres driver."""
+    from .. import db_async
+
+    found, missing = _cached_snippets(hits)
+    if missing:
+        fetched = await db_async.get_chunk_snippets(missing, max_chars=config.SNIPPET_MAX_CHARS)
+        _snippet_cache.set_many(fetched)
+        found.update(fetched)
+    return _build_results(hits, found)
+
+
+def _lexical_hits(project_id: str, query_text: str) -> List[tuple]:
+    from .. import db
+
+    try:
+        return db.lexical_search(project_id, query_text, limit=config.LEXICAL_TOP_K)
+    except Exception as e:
+        logger.warning("Lexical search failed, using vector hits only: %s", e)
+        return []
 
-    # Rerank top results
-    reranked = reranker_service.rerank(req.query, results)
 
-    # Assemble prompt from top N contexts (e.g., 5)
-    top_ctx = reranked[:5]
+def _fuse(dense: List[tuple], lexical: List[tuple], top_k: int) -> List[tuple]:
+    if not lexical:
+        return dense
+    return reciprocal_rank_fusion(
+        [dense, lexical],
+        [config.FUSION_VECTOR_WEIGHT, config.FUSION_LEXICAL_WEIGHT],
+        k=config.FUSION_RRF_K,
+        limit=top_k,
+    )
+
+
+def search_hits(project_id: str, query_text: str, qvec: List[float], top_k: int) -> List[tuple]:
+    """Vector search, plus full-text search run alongside it and merged by RRF when HYBRID_SEARCH is on."""
+    if not config.HYBRID_SEARCH:
+        return milvus_adapter.search(project_id, qvec, top_k=top_k)
+    lexical = _io_executor.submit(_lexical_hits, project_id, query_text)
+    dense = milvus_adapter.search(project_id, qvec, top_k=top_k)
+    return _fuse(dense, lexical.result(), top_k)
+
+
+def search_hits_many(project_id: str, queries: List[str], qvecs: List[List[float]], top_k: int) -> List[List[tuple]]:
+    """search_hits for a batch: one multi-vector search; lexical searches run concurrently on the I/O pool."""
+    if not config.HYBRID_SEARCH:
+        return milvus_adapter.search_many(project_id, qvecs, top_k=top_k)
+    lexical = [_io_executor.submit(_lexical_hits, project_id, q) for q in queries]
+    dense = milvus_adapter.search_many(project_id, qvecs, top_k=top_k)
+    return [_fuse(d, f.result(), top_k) for d, f in zip(dense, lexical)]
+
+
+async def search_hits_async(project_id: str, query_text: str, qvec: List[float], top_k: int) -> List[tuple]:
+    """Async twin of search_hits."""
+    dense_call = _run_in(_io_executor, milvus_adapter.search, project_id, qvec, top_k=top_k)
+    if not config.HYBRID_SEARCH:
+        return await dense_call
+    from .. import db_async
+
+    async def lexical_call() -> List[tuple]:
+        try:
+            return await db_async.lexical_search(project_id, query_text, config.LEXICAL_TOP_K)
+        except Exception as e:
+            logger.warning("Lexical search failed, using vector hits only: %s", e)
+            return []
+
+    dense, lexical = await asyncio.gather(dense_call, lexical_call())
+    return _fuse(dense, lexical, top_k)
+
+
+def build_prompt(question: str, reranked: List[Dict[str, Any]], n_ctx: int = 5) -> str:
+    """Assemble the LLM prompt from the top `n_ctx` reranked contexts."""
     context_text = "\n\n".join([
         f"Source: {c.get('source_url') or c.get('doc_id')}\nSnippet:\n{c.get('snippet','')}"
-        for c in top_ctx
+        for c in reranked[:n_ctx]
     ])
-
-    prompt = (
+    return (
         "You are an assistant that answers questions using the provided context.\n\n"
         "Context:\n"
         f"{context_text}\n\n"
-        f"Question: {req.query}\n\n"
+        f"Question: {question}\n\n"
         "Answer concisely and cite sources inline."
     )
 
+
+# Query handler usable both as FastAPI endpoint and as direct function call in tests
+def query(req: QueryReq):
+    t0 = time.time()
+    with stage("query", "embed"):
+        qvec, emb_cache = embed_query_with_status(req.query)
+    emb_ms = int((time.time() - t0) * 1000)
+    project_id = resolve_project_id(req.project)
+    emb_info = {"embedding_time_ms": emb_ms, "embedding_cache": emb_cache}
+
+    # A near-identical recent question in this project skips search, rerank and generation
+    generation = response_cache.generation(project_id) if project_id else None
+    cached = response_cache.lookup(project_id, req.top_k, req.query, qvec, generation) if project_id else None
+    if cached is not None:
+        return {**cached, **emb_info, "cached": True, "total_ms": int((time.time() - t0) * 1000)}
+
+    with stage("query", "search"):
+        hits = search_hits(project_id, req.query, qvec, req.top_k) if project_id else []
+    with stage("query", "hydrate"):
+        results = hydrate_hits(hits)
+
+    # Rerank top results
+    with stage("query", "rerank"):
+        reranked = reranker_service.rerank(req.query, results, query_vector=qvec)
+
     # Call LLM runtime to generate an answer.
-    answer = llm_runtime.generate(prompt)
+    with stage("query", "prompt"):
+        prompt = build_prompt(req.query, reranked)
+    with stage("query", "generate"):
+        answer = llm_runtime.generate(prompt)
+
+    resp = {"results": reranked, "answer": answer}
+    if project_id:
+        response_cache.store(project_id, req.top_k, req.query, qvec, resp, generation)
+    return {**resp, **emb_info, "cached": False, "total_ms": int((time.time() - t0) * 1000)}
+
+
+async def _embed_async(req: QueryReq) -> tuple[List[float], Optional[str], Dict[str, Any]]:
+    """Query embedding and project id. Returns (query vector, project id, embedding timing info)."""
+    t0 = time.time()
+    # With micro-batching the forward pass runs on the batcher thread, so the call itself only waits
+    embed_executor = _io_executor if embedding.microbatching_enabled() else _cpu_executor
+    # The project lookup overlaps the query embedding
+    with stage("query", "embed"):
+        (qvec, emb_cache), project_id = await asyncio.gather(
+            _run_in(embed_executor, embed_query_with_status, req.query),
+            resolve_project_id_async(req.project),
+        )
+    return qvec, project_id, {"embedding_time_ms": int((time.time() - t0) * 1000), "embedding_cache": emb_cache}
+
+
+async def _rank_async(req: QueryReq, qvec: List[float], project_id: Optional[str]) -> List[Dict[str, Any]]:
+    """Search, hydrate and rerank."""
+    hits = []
+    if project_id:
+        with stage("query", "search"):
+            hits = await search_hits_async(project_id, req.query, qvec, req.top_k)
+    with stage("query", "hydrate"):
+        results = await hydrate_hits_async(hits)
+    with stage("query", "rerank"):
+        return await _run_in(_cpu_executor, reranker_service.rerank, req.query, results, query_vector=qvec)
+
 
+async def _retrieve_async(req: QueryReq) -> tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Embed, search, hydrate and rerank. Returns (reranked results, embedding timing info)."""
+    qvec, project_id, emb_info = await _embed_async(req)
+    return await _rank_async(req, qvec, project_id), emb_info
+
+
+async def query_async(req: QueryReq) -> Dict[str, Any]:
+    """Non-blocking /query pipeline: same steps as `query`, but the event loop never waits on a model or client."""
+    t0 = time.time()
+    qvec, project_id, emb_info = await _embed_async(req)
+    generation = None
+    if project_id:
+        generation = await _run_in(_io_executor, response_cache.generation, project_id)
+        cached = await _run_in(_io_executor, response_cache.lookup, project_id, req.top_k, req.query, qvec, generation)
+        if cached is not None:
+            return {**cached, **emb_info, "cached": True, "total_ms": int((time.time() - t0) * 1000)}
+    reranked = await _rank_async(req, qvec, project_id)
+    with stage("query", "prompt"):
+        prompt = build_prompt(req.query, reranked)
+    with stage("query", "generate"):
+        answer = await _run_in(_io_executor, llm_runtime.generate, prompt)
+    resp = {"results": reranked, "answer": answer}
+    if project_id:
+        response_cache.store(project_id, req.top_k, req.query, qvec, resp, generation)
+    return {**resp, **emb_info, "cached": False, "total_ms": int((time.time() - t0) * 1000)}
+
+
+def query_batch(req: QueryBatchReq) -> Dict[str, Any]:
+    """Retrieve (and optionally answer) many questions at once.
+
+    One embedding call for all cache misses, one multi-vector search, one hydration query for the
+    union of hits and shared cross-encoder batches; answers only when `generate` is set. Stages are
+    timed per batch into query_batch_stage_ms, apart from the per-query query_stage_ms.
+    """
+    t0 = time.time()
+    queries = list(req.queries)
+    if len(queries) > config.QUERY_BATCH_MAX:
+        raise HTTPException(413, f"at most {config.QUERY_BATCH_MAX} queries per batch")
+    if not queries:
+        return {"results": [], "embedding_time_ms": 0, "total_ms": 0}
+    with stage("query_batch", "embed", batch=len(queries)):
+        qvecs, emb_cache = embedding.embed_queries_with_status(queries)
+    emb_ms = int((time.time() - t0) * 1000)
+    project_id = resolve_project_id(req.project)
+    with stage("query_batch", "search", batch=len(queries)):
+        hit_lists = search_hits_many(project_id, queries, qvecs, req.top_k) if project_id else [[] for _ in queries]
+    with stage("query_batch", "hydrate", batch=len(queries)):
+        results = hydrate_hit_lists(hit_lists)
+    with stage("query_batch", "rerank", batch=len(queries)):
+        reranked = reranker_service.rerank_many(queries, results, query_vectors=qvecs)
+    answers: List[Optional[str]] = [None] * len(queries)
+    if req.generate:
+        with stage("query_batch", "prompt", batch=len(queries)):
+            prompts = [build_prompt(q, r) for q, r in zip(queries, reranked)]
+        with stage("query_batch", "generate", batch=len(queries)):
+            answers = list(_io_executor.map(llm_runtime.generate, prompts))
     return {
-        "results": reranked,
-        "answer": answer,
+        "results": [
+            {"query": q, "results": r, "answer": a, "embedding_cache": c}
+            for q, r, a, c in zip(queries, reranked, answers, emb_cache)
+        ],
         "embedding_time_ms": emb_ms,
         "total_ms": int((time.time() - t0) * 1000),
     }
 
-# If app exists, expose query as POST endpoint
+
+_RETRIEVAL_MS = metrics.histogram("query_retrieval_ms", description="Embed + search + hydrate + rerank")
+_TTFT_MS = metrics.histogram("query_ttft_ms", description="Request start to first streamed answer token")
+# The runtimes stream text pieces, not token ids, so the rate is in pieces (one per `token` event)
+_CHUNKS_PER_S = metrics.histogram(
+    "llm_stream_chunks_per_s",
+    buckets=(1, 2, 5, 10, 20, 40, 80, 160, 320),
+    description="Streamed runtime chunks per second",
+)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def query_stream_events(req: QueryReq) -> AsyncIterator[str]:
+    """Yield the /query/stream SSE events: `results`, then one `token` per runtime chunk, then `done`.
+
+    `done` carries the timing trailer (retrieval_ms, ttft_ms, chunks, chunks_per_s, total_ms).
+    Closing the stream stops pulling from the runtime.
+    """
+    t0 = time.perf_counter()
+    reranked, emb_info = await _retrieve_async(req)
+    retrieval_ms = (time.perf_counter() - t0) * 1000.0
+    _RETRIEVAL_MS.observe(retrieval_ms)
+    yield _sse("results", {"results": reranked, **emb_info, "retrieval_ms": int(retrieval_ms)})
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def _produce():
+        try:
+            for piece in llm_runtime.generate_stream(build_prompt(req.query, reranked)):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, ("token", piece))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", str(e)))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, ("end", None))
+
+    t_gen = time.perf_counter()
+    t_first: Optional[float] = None
+    n_chunks = 0
+    loop.run_in_executor(_io_executor, _produce)
+    try:
+        while True:
+            kind, piece = await queue.get()
+            if kind == "end":
+                break
+            if kind == "error":
+                yield _sse("error", {"detail": piece})
+                break
+            if not piece:
+                continue
+            if t_first is None:
+                t_first = time.perf_counter()
+                _TTFT_MS.observe((t_first - t0) * 1000.0)
+            n_chunks += 1
+            yield _sse("token", {"text": piece})
+    finally:
+        stop.set()
+
+    t_end = time.perf_counter()
+    # Spans cannot stay open across the yields of this generator; only the histogram is recorded
+    tracing.observe("query", "generate", (t_end - t_gen) * 1000.0)
+    chunks_per_s = n_chunks / (t_end - t_gen) if n_chunks and t_end > t_gen else 0.0
+    if n_chunks:
+        _CHUNKS_PER_S.observe(chunks_per_s)
+    yield _sse(
+        "done",
+        {
+            "retrieval_ms": int(retrieval_ms),
+            "ttft_ms": int((t_first - t0) * 1000) if t_first is not None else None,
+            "chunks": n_chunks,
+            "chunks_per_s": round(chunks_per_s, 2),
+            "total_ms": int((t_end - t0) * 1000),
+        },
+    )
+
+
+async def _cancel_on_disconnect(request, coro):
+    """Await `coro`, cancelling it as soon as the client goes away.
+
+    Work already running in an executor thread finishes, but no further pipeline stage starts.
+    """
+    work = asyncio.ensure_future(coro)
+
+    async def _watch():
+        while not await request.is_disconnected():
+            await asyncio.sleep(config.QUERY_DISCONNECT_POLL_S)
+
+    watcher = asyncio.ensure_future(_watch())
+    try:
+        done, _pending = await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if work in done:
+        return work.result()
+    work.cancel()
+    raise HTTPException(499, "client disconnected")
+
+
+# If app exists, expose the async pipeline as the POST /query endpoint
 if app is not None:
-    app.post('/query')(query)
+    @app.post('/query')
+    async def query_endpoint(req: QueryReq, request: Request):
+        return await _cancel_on_disconnect(request, query_async(req))
+
+    @app.post('/query/batch')
+    async def query_batch_endpoint(req: QueryBatchReq):
+        # Own thread: query_batch itself fans out to the bounded executors
+        return await asyncio.to_thread(query_batch, req)
+
+    @app.post('/query/stream')
+    async def query_stream_endpoint(req: QueryReq):
+        # StreamingResponse cancels the generator when the client disconnects
+        return StreamingResponse(
+            query_stream_events(req),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
 # --- Session management endpoints ---
 if app is not None:
@@ -0,0 +1,2 @@
+"""Offline performance benchmarks: `python -m pivot.bench` for the per-stage suite (see
+pivot.bench.suite), `python -m pivot.bench.normalize_bench` for normalizer throughput."""
@@ -0,0 +1,81 @@
+"""Throughput of normalize_text: each available HTML engine against the BeautifulSoup reference,
+and the fused cleaning pass against the original sequence of regex passes.
+
+    python -m pivot.bench.normalize_bench --docs 50 --kb 200
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+from .. import normalize
+
+_WORDS = (
+    "retrieval index vector chunk token document project query rerank latency cache ingest "
+    "embedding milvus postgres worker stream batch the of and to in is for with on"
+).split()
+
+
+def synthetic_html(kb: int, seed: int = 0) -> str:
+    """About `kb` KiB of HTML with paragraphs, inline markup, scripts, styles, entities and quotes."""
+    rng = random.Random(seed)
+    parts = ["<html><head><title>Bench</title><style>p { color: red; }</style></head><body>"]
+    size = 0
+    while size < kb * 1024:
+        words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(20, 80)))
+        block = rng.choice(
+            [
+                f"<p>{words} <b>{rng.choice(_WORDS)}</b> &amp; {words}</p>\r\n",
+                f"<div><script>var x = '{words}';</script><span>{words}</span> \u2600</div>\n",
+                f"<blockquote>&gt; &gt; &gt; &gt; {words}</blockquote>\n",
+                f"<ul><li>{words}</li><li>{words}</li></ul>\n",
+            ]
+        )
+        parts.append(block)
+        size += len(block)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _rate(fn: Callable[[str], object], docs: List[str], repeat: int) -> Dict[str, float]:
+    total = sum(len(d) for d in docs) * repeat
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for d in docs:
+            fn(d)
+    elapsed = time.perf_counter() - t0
+    return {"seconds": round(elapsed, 4), "mb_per_s": round(total / elapsed / 1e6, 2)}
+
+
+def run(docs: int = 20, kb: int = 100, repeat: int = 1) -> Dict[str, Dict[str, float]]:
+    html = [synthetic_html(kb, seed=i) for i in range(docs)]
+    text = [normalize.html_to_text(h, "stdlib") for h in html]
+    out: Dict[str, Dict[str, float]] = {}
+    engines = [("stdlib", True), ("lxml", normalize._HAS_LXML), ("selectolax", normalize._HAS_SELECTOLAX), ("bs4", normalize._HAS_BS4)]
+    for name, available in engines:
+        if available:
+            out[f"html_to_text[{name}]"] = _rate(lambda d, n=name: normalize.html_to_text(d, n), html, repeat)
+    out["clean_text"] = _rate(normalize.clean_text, text, repeat)
+    out["clean_text[reference]"] = _rate(normalize._clean_text_reference, text, repeat)
+    if normalize._HAS_LANGDETECT:
+        cleaned = [normalize.clean_text(t) for t in text]
+        out["detect_language[sampled]"] = _rate(normalize.detect_language, cleaned, repeat)
+        out["detect_language[full]"] = _rate(lambda t: normalize.detect(t), cleaned, repeat)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pivot.bench.normalize_bench")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--kb", type=int, default=100, help="approximate size of each HTML document")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.docs, args.kb, args.repeat), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+"""In-process stand-ins for the external services, so the benchmarks run offline.
+
+- MemoryDB: the pivot.db functions the ingest and query paths call, over dicts.
+- null_conn: a connection for the real pivot.db whose COPY/execute consume their input and store
+  nothing, so db.insert_chunks is timed with its own row rendering but without a server.
+- vector_store_functions: milvus_adapter's surface served by a LocalVectorStore in a temp dir.
+- EchoLLM: llm_runtime.generate / generate_stream with a fixed, configurable latency.
+- WordTokenizer: offsets-only tokenizer used when the HF tokenizer cannot be loaded.
+"""
+from __future__ import annotations
+
+import re
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_MISSING = object()
+_TERM_RE = re.compile(r"\w+")
+
+
+@contextmanager
+def patched(obj: Any, **attrs: Any) -> Iterator[None]:
+    """Set attributes on `obj` for the duration of the block, restoring (or removing) them after."""
+    saved = {name: obj.__dict__.get(name, _MISSING) for name in attrs}
+    for name, value in attrs.items():
+        setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is _MISSING:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, value)
+
+
+class MemoryDB:
+    """Postgres stand-in: documents and chunks in dicts, lexical search over an inverted index."""
+
+    def __init__(self):
+        self.chunks: Dict[str, Tuple[str, int, str, int, int, int, dict]] = {}
+        self.source_urls: Dict[str, Optional[str]] = {}
+        self._postings: Dict[str, set] = defaultdict(set)
+
+    def functions(self) -> Dict[str, Any]:
+        """Attributes to patch onto the pivot.db module."""
+        names = (
+            "get_project_id", "copy_chunks", "insert_chunks", "get_chunk_texts", "get_chunk_meta",
+            "get_chunk_snippet", "get_chunk_snippets", "get_documents_source_url", "lexical_search",
+            "get_stored_embeddings", "put_stored_embeddings",
+        )
+        return {name: getattr(self, name) for name in names}
+
+    def get_project_id(self, name: str) -> Optional[str]:
+        return name
+
+    def copy_chunks(self, rows: Iterable[tuple]) -> List[str]:
+        ids = []
+        for row in rows:
+            cid = str(uuid.uuid4())
+            self.chunks[cid] = tuple(row)
+            self.source_urls.setdefault(row[0], f"bench://{row[0]}")
+            for term in set(_TERM_RE.findall(row[2].lower())):
+                self._postings[term].add(cid)
+            ids.append(cid)
+        return ids
+
+    def insert_chunks(self, document_id: str, chunks: Iterable[tuple]) -> List[str]:
+        return self.copy_chunks((document_id, *c) for c in chunks)
+
+    def get_chunk_texts(self, chunk_ids: List[str]) -> List[Tuple[str, str]]:
+        return [(cid, self.chunks[cid][2]) for cid in chunk_ids if cid in self.chunks]
+
+    def get_chunk_meta(self, chunk_ids: List[str]) -> List[Tuple[str, str, int]]:
+        return [(cid, self.chunks[cid][0], self.chunks[cid][1]) for cid in chunk_ids if cid in self.chunks]
+
+    def get_chunk_snippet(self, chunk_id: str) -> Optional[str]:
+        row = self.chunks.get(chunk_id)
+        return row[2] if row else None
+
+    def get_chunk_snippets(self, chunk_ids: List[str], max_chars: int = 5000) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for cid in chunk_ids:
+            row = self.chunks.get(cid)
+            if row is not None:
+                out[cid] = {"snippet": row[2][:max_chars], "doc_id": row[0], "idx": row[1], "source_url": self.source_urls.get(row[0])}
+        return out
+
+    def get_documents_source_url(self, doc_ids: List[str]) -> Dict[str, Optional[str]]:
+        return {d: self.source_urls.get(d) for d in doc_ids}
+
+    def lexical_search(self, project_id: str, query: str, limit: int = 25) -> List[Tuple[str, float, str, int]]:
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(_TERM_RE.findall(query.lower())):
+            for cid in self._postings.get(term, ()):
+                scores[cid] += 1.0
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [(cid, score, self.chunks[cid][0], self.chunks[cid][1]) for cid, score in best]
+
+    def get_stored_embeddings(self, model: str, content_hashes: List[str]) -> Dict[str, bytes]:
+        return {}
+
+    def put_stored_embeddings(self, model: str, items: Iterable[tuple]) -> int:
+        return 0
+
+
+class _NullCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql: str, file, size: int = 8192) -> None:
+        while file.read(size):
+            pass
+
+    def execute(self, *args, **kwargs) -> None:
+        pass
+
+    def fetchall(self) -> list:
+        return []
+
+    def fetchone(self):
+        return None
+
+
+class _NullConnection:
+    def cursor(self) -> _NullCursor:
+        return _NullCursor()
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+
+@contextmanager
+def null_conn() -> Iterator[_NullConnection]:
+    yield _NullConnection()
+
+
+def vector_store_functions(store) -> Dict[str, Any]:
+    """milvus_adapter functions backed by `store` (a local_vector_store.LocalVectorStore)."""
+
+    def upsert_embeddings(project_id, rows, *, vector_dim=None, buffered=False):
+        return store.upsert(project_id, rows)
+
+    def search(project_id, query_vector, top_k=25):
+        return store.search(project_id, query_vector, top_k)
+
+    def search_many(project_id, query_vectors, top_k=25):
+        return [store.search(project_id, v, top_k) for v in query_vectors]
+
+    def delete(project_id, chunk_ids):
+        return store.delete(project_id, chunk_ids)
+
+    def flush():
+        store.persist()
+        return 0
+
+    return {
+        "upsert_embeddings": upsert_embeddings,
+        "search": search,
+        "search_many": search_many,
+        "get_vectors": store.get_vectors,
+        "delete": delete,
+        "flush": flush,
+    }
+
+
+class EchoLLM:
+    """Answers with the start of the prompt after `latency_ms`."""
+
+    def __init__(self, latency_ms: float = 0.0, tokens: int = 32):
+        self.latency_ms = latency_ms
+        self.tokens = tokens
+
+    def generate(self, prompt: str, model: Optional[str] = None, max_tokens: int = 512) -> str:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return " ".join(prompt.split()[: min(self.tokens, max_tokens)])
+
+    def generate_stream(self, prompt: str, model: Optional[str] = None, max_tokens: int = 512) -> Iterator[str]:
+        words = prompt.split()[: min(self.tokens, max_tokens)]
+        for w in words:
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000.0 / max(1, len(words)))
+            yield w + " "
+
+
+class WordTokenizer:
+    """Offsets-only stand-in for a HF fast tokenizer (one token per word or punctuation mark)."""
+
+    _pattern = re.compile(r"\w+|[^\w\s]")
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, **_kw):
+        if isinstance(text, list):
+            encs = [self(t, return_offsets_mapping=return_offsets_mapping) for t in text]
+            return {k: [e[k] for e in encs] for k in (encs[0] if encs else {"input_ids": []})}
+        spans = [m.span() for m in self._pattern.finditer(text)]
+        out: Dict[str, Any] = {"input_ids": [hash(text[a:b]) % 50000 for a, b in spans]}
+        if return_offsets_mapping:
+            out["offset_mapping"] = spans
+        return out
@@ -0,0 +1,276 @@
+"""Per-stage benchmarks of the ingest and query paths on a synthetic corpus.
+
+    python -m pivot.bench --docs 200 --kb 20 --queries 200 --out bench.json
+    python -m pivot.bench --baseline bench.json --tolerance 0.25   # exit 1 on a regression
+
+Stages: normalize_text, chunk_text, embed_texts, db.insert_chunks, milvus_adapter.search,
+Reranker.rerank and api.main.query. Postgres, Milvus and the LLM are replaced by the stand-ins in
+pivot.bench.stand_ins; the tokenizer, embedder and cross-encoder are the real ones when they can be
+loaded (else the word tokenizer, hash embeddings and the fallback scorer, as recorded in
+`environment`). Latencies are per call; peak memory is measured in a separate tracemalloc pass so
+tracing does not inflate the timings.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .. import config
+from .normalize_bench import _WORDS, synthetic_html
+from .stand_ins import EchoLLM, MemoryDB, WordTokenizer, null_conn, patched, vector_store_functions
+
+
+@dataclass
+class StageResult:
+    calls: int
+    items: int
+    seconds: float
+    items_per_s: float
+    mb_per_s: Optional[float]
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    peak_kib: Optional[float]
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(
+    fn: Callable[[Any], Any],
+    inputs: Sequence[Any],
+    *,
+    items: Callable[[Any], int] = lambda _x: 1,
+    nbytes: Optional[Callable[[Any], int]] = None,
+    memory: bool = True,
+) -> StageResult:
+    """Call `fn` once per input; then, with `memory`, once more over all inputs under tracemalloc."""
+    latencies = []
+    t_start = time.perf_counter()
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    seconds = time.perf_counter() - t_start
+    peak_kib = None
+    if memory:
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            for x in inputs:
+                fn(x)
+            peak_kib = (tracemalloc.get_traced_memory()[1] - base) / 1024.0
+        finally:
+            tracemalloc.stop()
+    latencies.sort()
+    n_items = sum(items(x) for x in inputs)
+    total_bytes = sum(nbytes(x) for x in inputs) if nbytes else None
+    return StageResult(
+        calls=len(inputs),
+        items=n_items,
+        seconds=round(seconds, 6),
+        items_per_s=round(n_items / seconds, 2) if seconds > 0 else 0.0,
+        mb_per_s=round(total_bytes / seconds / 1e6, 3) if total_bytes is not None and seconds > 0 else None,
+        p50_ms=round(percentile(latencies, 50), 4),
+        p95_ms=round(percentile(latencies, 95), 4),
+        p99_ms=round(percentile(latencies, 99), 4),
+        peak_kib=round(peak_kib, 1) if peak_kib is not None else None,
+    )
+
+
+def _tokenizer():
+    from ..chunker import token_chunker
+
+    try:
+        return token_chunker.get_tokenizer(), "hf"
+    except Exception:
+        return WordTokenizer(), "stand-in"
+
+
+def run(
+    *,
+    docs: int = 50,
+    kb: int = 20,
+    queries: int = 50,
+    top_k: int = 10,
+    seed: int = 0,
+    llm_ms: float = 0.0,
+    memory: bool = True,
+) -> Dict[str, Any]:
+    from .. import db as pivot_db
+    from .. import embedding, llm_runtime, normalize, response_cache
+    from ..adapters import local_vector_store, milvus_adapter
+    from ..api import main as api_main
+    from ..chunker import token_chunker
+    from ..services import reranker_service
+
+    rng = random.Random(seed)
+    html = [synthetic_html(kb, seed=seed + i) for i in range(docs)]
+    questions = [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 12))) for _ in range(queries)]
+    tok, tokenizer_kind = _tokenizer()
+    store_db = MemoryDB()
+    stages: Dict[str, StageResult] = {}
+
+    with ExitStack() as stack:
+        tmp = stack.enter_context(tempfile.TemporaryDirectory(prefix="pivot-bench-"))
+        store = local_vector_store.LocalVectorStore(tmp, dtype=config.LOCAL_VECTOR_DTYPE, use_hnsw=config.LOCAL_VECTOR_HNSW)
+        stack.callback(store.close)
+        real_db = hasattr(pivot_db, "_CopyReader")
+        db_functions = store_db.functions()
+        if real_db:
+            # The real insert_chunks renders COPY rows; only the server is replaced
+            del db_functions["copy_chunks"], db_functions["insert_chunks"]
+            db_functions["get_conn"] = null_conn
+        stack.enter_context(patched(pivot_db, **db_functions))
+        stack.enter_context(patched(milvus_adapter, **vector_store_functions(store)))
+        llm = EchoLLM(llm_ms)
+        stack.enter_context(patched(llm_runtime, generate=llm.generate, generate_stream=llm.generate_stream))
+        stack.enter_context(patched(token_chunker, get_tokenizer=lambda: tok))
+        stack.enter_context(patched(response_cache, enabled=lambda: False))
+        api_main._snippet_cache.clear()
+        api_main._project_ids.clear()
+
+        # -- ingest ------------------------------------------------------------------------------
+        stages["normalize_text"] = measure(
+            lambda h: normalize.normalize_text(h, is_html=True), html, nbytes=len, memory=memory
+        )
+        texts = [normalize.normalize_text(h, is_html=True)[0] for h in html]
+        stages["chunk_text"] = measure(token_chunker.chunk_text, texts, nbytes=len, memory=memory)
+        per_doc = [token_chunker.chunk_text(t) for t in texts]
+        chunk_texts = [c[1] for chunks in per_doc for c in chunks]
+        batches = [chunk_texts[i : i + 64] for i in range(0, len(chunk_texts), 64)]
+        embed_name = "embed_texts[hash]" if embedding.model_id() == "hash-128" else "embed_texts"
+        stages[embed_name] = measure(embedding.embed_texts, batches, items=len, nbytes=lambda b: sum(map(len, b)), memory=memory)
+
+        doc_ids = [f"doc-{i}" for i in range(docs)]
+        if real_db:
+            insert = lambda pair: pivot_db.insert_chunks(pair[0], pair[1])
+        else:
+            insert = lambda pair: MemoryDB().insert_chunks(pair[0], pair[1])
+        stages["db.insert_chunks"] = measure(insert, list(zip(doc_ids, per_doc)), items=lambda p: len(p[1]), memory=memory)
+
+        rows = []
+        for doc_id, chunks in zip(doc_ids, per_doc):
+            ids = store_db.insert_chunks(doc_id, chunks)
+            rows.extend((cid, doc_id, c[0]) for cid, c in zip(ids, chunks))
+        vectors = [v for batch in batches for v in embedding.embed_texts(batch)]
+        milvus_adapter.upsert_embeddings("bench", [(cid, d, idx, v) for (cid, d, idx), v in zip(rows, vectors)])
+
+        # -- query -------------------------------------------------------------------------------
+        qvecs = embedding.embed_texts(questions)
+        stages["milvus_adapter.search"] = measure(
+            lambda qv: milvus_adapter.search("bench", qv, top_k), qvecs, memory=memory
+        )
+        candidates = [
+            api_main.hydrate_hits(milvus_adapter.search("bench", qv, top_k)) for qv in qvecs
+        ]
+        reranker = reranker_service._default_reranker
+        stages["Reranker.rerank"] = measure(
+            lambda i: reranker.rerank(questions[i], [dict(c) for c in candidates[i]], query_vector=qvecs[i]),
+            list(range(queries)),
+            items=lambda i: len(candidates[i]),
+            memory=memory,
+        )
+        stages["api.main.query"] = measure(
+            lambda q: api_main.query(api_main.QueryReq(project="bench", query=q, top_k=top_k)),
+            questions,
+            memory=memory,
+        )
+        api_main._snippet_cache.clear()
+        api_main._project_ids.clear()
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "tokenizer": tokenizer_kind,
+            "embedder": embedding.model_id(),
+            "reranker": "cross-encoder" if reranker._cross is not None else "fallback",
+            "db": "pivot.db, null connection" if real_db else "stand-in",
+            "vector_store": f"local ({'hnsw' if config.LOCAL_VECTOR_HNSW and local_vector_store._HAS_HNSWLIB else 'exact'})",
+            "llm_ms": llm_ms,
+        },
+        "params": {"docs": docs, "kb": kb, "queries": queries, "top_k": top_k, "seed": seed, "chunks": len(chunk_texts)},
+        "stages": {name: asdict(r) for name, r in stages.items()},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25) -> List[str]:
+    """Regressions of `current` against `baseline` beyond `tolerance` (0.25 = 25%): slower p50 or
+    p95, lower throughput, or higher peak memory, for stages present in both."""
+    found = []
+    limit = 1.0 + tolerance
+    for name, cur in current.get("stages", {}).items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms", "peak_kib"):
+            if cur.get(key) is not None and base.get(key) and cur[key] > base[key] * limit:
+                found.append(f"{name}: {key} {cur[key]} > baseline {base[key]}")
+        if base.get("items_per_s") and cur["items_per_s"] * limit < base["items_per_s"]:
+            found.append(f"{name}: items_per_s {cur['items_per_s']} < baseline {base['items_per_s']}")
+    return found
+
+
+def _table(result: Dict[str, Any]) -> str:
+    lines = [f"{'stage':<24}{'items/s':>12}{'MB/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>11}"]
+    for name, r in result["stages"].items():
+        mb = f"{r['mb_per_s']:.2f}" if r["mb_per_s"] is not None else "-"
+        peak = f"{r['peak_kib']:.0f}" if r["peak_kib"] is not None else "-"
+        lines.append(
+            f"{name:<24}{r['items_per_s']:>12.1f}{mb:>9}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}{peak:>11}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pivot.bench")
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--kb", type=int, default=20, help="approximate size of each HTML document")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="latency of the stand-in LLM")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", help="write the results as JSON (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    result = run(
+        docs=args.docs,
+        kb=args.kb,
+        queries=args.queries,
+        top_k=args.top_k,
+        seed=args.seed,
+        llm_ms=args.llm_ms,
+        memory=not args.no_memory,
+    )
+    print(json.dumps(result["environment"]))
+    print(_table(result))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"] or baseline.get("environment") != result["environment"]:
+            print("warning: baseline was recorded with different parameters or environment")
+        regressions = compare(result, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
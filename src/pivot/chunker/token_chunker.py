@@ -1,15 +1,25 @@
 from __future__ import annotations
 
+import logging
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from functools import lru_cache
-from typing import Iterable, List, Tuple
-
-from transformers import AutoTokenizer
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 
 from .. import config
 
+logger = logging.getLogger(__name__)
+
+Chunk = Tuple[int, str, int, int, int, dict]
+
 
 @lru_cache(maxsize=1)
 def get_tokenizer():
+    from transformers import AutoTokenizer
+
     return AutoTokenizer.from_pretrained(config.EMBED_MODEL)
 
 
@@ -35,12 +45,16 @@ def chunk_text(
         return_attention_mask=False,
         return_token_type_ids=False,
     )
-    ids = enc["input_ids"]
-    offsets = enc["offset_mapping"]
+    return _windows(text, enc["offset_mapping"], max_tokens, step)
+
+
+def _windows(text: str, offsets, max_tokens: int, step: int) -> List[Chunk]:
+    """Token windows of `max_tokens` every `step` tokens, mapped to character spans of `text`."""
     chunks = []
     idx = 0
-    for start in range(0, len(ids), step):
-        end_tok = min(start + max_tokens, len(ids))
+    n = len(offsets)
+    for start in range(0, n, step):
+        end_tok = min(start + max_tokens, n)
         if start >= end_tok:
             break
         # Character offsets
@@ -52,6 +66,244 @@ def chunk_text(
         token_count = end_tok - start
         chunks.append((idx, piece, token_count, start_char, end_char, {}))
         idx += 1
-        if end_tok == len(ids):
+        if end_tok == n:
             break
     return chunks
+
+
+def _chunk_batch(texts: List[str], max_tokens: int | None, overlap: int | None) -> List[List[Chunk]]:
+    tok = get_tokenizer()
+    max_tokens = max_tokens or config.CHUNK_MAX_TOKENS
+    overlap = overlap or config.CHUNK_OVERLAP_TOKENS
+    step = max(1, max_tokens - overlap)
+    out: List[List[Chunk]] = [[] for _ in texts]
+    nonempty = [i for i, t in enumerate(texts) if t]
+    if nonempty:
+        # One call: the fast tokenizer encodes the batch in parallel in native code
+        enc = tok(
+            [texts[i] for i in nonempty],
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        for i, offsets in zip(nonempty, enc["offset_mapping"]):
+            out[i] = _windows(texts[i], offsets, max_tokens, step)
+    return out
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_pid: Optional[int] = None
+# pid of a process whose pool could not run; it chunks in-process from then on
+_pool_failed_pid: Optional[int] = None
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        # spawn: children load their own tokenizer instead of inheriting one mid-use across fork
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=get_tokenizer,
+        )
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def chunk_texts(
+    texts: Iterable[str],
+    max_tokens: int | None = None,
+    overlap: int | None = None,
+    *,
+    workers: int | None = None,
+) -> List[List[Chunk]]:
+    """chunk_text for many documents at once; returns one chunk list per text, in order.
+
+    The texts are tokenized with a single batched call. With `workers` > 1 (default CHUNK_WORKERS)
+    contiguous groups of texts are chunked in a process pool, each process keeping its tokenizer.
+    """
+    global _pool, _pool_failed_pid
+    texts = list(texts)
+    workers = config.CHUNK_WORKERS if workers is None else workers
+    if workers > 1 and len(texts) > 1 and _pool_failed_pid != os.getpid():
+        size = -(-len(texts) // workers)
+        groups = [texts[i : i + size] for i in range(0, len(texts), size)]
+        try:
+            pool = _get_pool(workers)
+            done = pool.map(_chunk_batch, groups, [max_tokens] * len(groups), [overlap] * len(groups))
+            return [chunks for group in done for chunks in group]
+        except (AssertionError, OSError, BrokenProcessPool) as e:
+            # e.g. inside a daemonic (prefork) worker, which may not start child processes
+            logger.warning("Chunking process pool unavailable (%s); chunking in-process from now on", e)
+            _pool_failed_pid = os.getpid()
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.shutdown(wait=False, cancel_futures=True)
+                _pool = None
+    return _chunk_batch(texts, max_tokens, overlap)
+
+
+def _token_ids(tok, text: str) -> List[int]:
+    return list(tok(text, add_special_tokens=False)["input_ids"])
+
+
+# _cut_before_space per tokenizer instance; its probe costs six tokenizer calls
+_cut_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _cut_before_space(tok) -> bool:
+    """Where a window may start so that tokenizing windows matches tokenizing the whole text.
+
+    True: at the first whitespace char of a run (byte-level BPE keeps the space on the next word).
+    False: at the first char after the run (e.g. Metaspace tokenizers that prefix the first word).
+    WordPiece drops whitespace and is exact either way.
+    """
+    try:
+        return _cut_cache[tok]
+    except (KeyError, TypeError):
+        pass
+    probe = "pivot chunks stream"
+    whole = _token_ids(tok, probe)
+    before = _token_ids(tok, "pivot") + _token_ids(tok, " chunks") + _token_ids(tok, " stream") == whole or (
+        _token_ids(tok, "pivot ") + _token_ids(tok, "chunks ") + _token_ids(tok, "stream") != whole
+    )
+    try:
+        _cut_cache[tok] = before
+    except TypeError:  # not weak-referenceable: probe again next time
+        pass
+    return before
+
+
+class _OffsetStream:
+    """Absolute token offsets of a text that is tokenized one whitespace-aligned window at a time.
+
+    Only the tokens and characters from the oldest still-needed token onwards are kept.
+    """
+
+    def __init__(self, tok, pieces: Iterator[str], window_chars: int):
+        self.tok = tok
+        self.pieces = pieces
+        self.window = max(1, window_chars)
+        self.before_space = _cut_before_space(tok)
+        self.text = ""  # characters from text_base on
+        self.text_base = 0
+        self.fed = 0  # absolute char offset tokenized up to
+        self.offsets: List[Tuple[int, int]] = []  # offsets[i] belongs to token base + i
+        self.base = 0
+        self.done = False
+
+    @property
+    def count(self) -> int:
+        return self.base + len(self.offsets)
+
+    def offset(self, token: int) -> Tuple[int, int]:
+        return self.offsets[token - self.base]
+
+    def slice(self, start_char: int, end_char: int) -> str:
+        return self.text[start_char - self.text_base : end_char - self.text_base]
+
+    def ensure(self, n: int) -> None:
+        while self.count < n and not self.done:
+            self._tokenize_next()
+
+    def drop_before(self, token: int) -> None:
+        token = min(token, self.count)
+        del self.offsets[: max(0, token - self.base)]
+        self.base = max(self.base, token)
+        keep = self.offsets[0][0] if self.offsets else self.fed
+        if keep > self.text_base:
+            self.text = self.text[keep - self.text_base :]
+            self.text_base = keep
+
+    def _fill(self, limit: int) -> bool:
+        """Buffer more than `limit` untokenized chars; True when the input ran out first."""
+        while self.text_base + len(self.text) - self.fed <= limit:
+            piece = next(self.pieces, None)
+            if piece is None:
+                return True
+            self.text += piece
+        return False
+
+    def _cut(self, lo: int, hi: int) -> Optional[int]:
+        text = self.text
+        for i in range(hi, lo, -1):
+            if self.before_space:
+                if text[i].isspace() and not text[i - 1].isspace():
+                    return i
+            elif not text[i].isspace() and text[i - 1].isspace():
+                return i
+        return None
+
+    def _tokenize_next(self) -> None:
+        limit = self.window
+        while True:
+            exhausted = self._fill(limit)
+            rel = self.fed - self.text_base
+            end = len(self.text) if exhausted else self._cut(rel, rel + limit)
+            if end is not None:
+                break
+            limit *= 2  # no whitespace boundary in reach: widen the window
+        window = self.text[rel:end]
+        if window:
+            enc = self.tok(
+                window,
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )
+            shift = self.fed
+            self.offsets.extend((int(a) + shift, int(b) + shift) for a, b in enc["offset_mapping"])
+        self.fed = self.text_base + end
+        self.done = exhausted
+
+
+def iter_chunks(
+    source: Union[str, Iterable[str]],
+    max_tokens: int | None = None,
+    overlap: int | None = None,
+    *,
+    window_chars: int | None = None,
+    tokenizer=None,
+) -> Iterator[Chunk]:
+    """Generator form of chunk_text that never holds the token offsets of the whole text.
+
+    `source` is the text or an iterable of consecutive pieces of it (e.g. file reads). It is
+    tokenized in windows of about `window_chars` characters cut at whitespace, and chunks are yielded
+    as soon as their tokens are known; the tuples equal chunk_text's for the same text.
+
+    The tokenizer output and the buffered text are bounded by the chunk and window size. A `str`
+    source is held whole by the caller anyway; only pieces keep the input itself bounded.
+    """
+    tok = tokenizer or get_tokenizer()
+    max_tokens = max_tokens or config.CHUNK_MAX_TOKENS
+    overlap = overlap or config.CHUNK_OVERLAP_TOKENS
+    step = max(1, max_tokens - overlap)
+    window_chars = window_chars or config.CHUNK_STREAM_WINDOW_CHARS
+    if isinstance(source, str):
+        text = source
+        pieces = (text[i : i + window_chars] for i in range(0, len(text), window_chars))
+    else:
+        pieces = iter(source)
+    stream = _OffsetStream(tok, pieces, window_chars)
+
+    idx = 0
+    start = 0
+    while True:
+        # One token past the window tells whether this window ends the document
+        stream.ensure(start + max_tokens + 1)
+        n = stream.count
+        if start >= n:
+            break
+        end_tok = min(start + max_tokens, n)
+        first, last = stream.offset(start), stream.offset(end_tok - 1)
+        start_char = int(first[0]) if first else 0
+        end_char = int(last[1]) if last else start_char
+        piece = stream.slice(start_char, end_char)
+        if piece.strip():
+            yield (idx, piece, end_tok - start, start_char, end_char, {})
+            idx += 1
+            if end_tok == n:
+                break
+        start += step
+        stream.drop_before(start)
@@ -1,24 +1,194 @@
 from __future__ import annotations
 
 import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
 import uuid
 from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any, Iterable, Optional
 
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 
 from . import config
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_POOL_WAIT_MS = metrics.histogram("db_pool_wait_ms", description="Time spent waiting for a pooled connection")
+_POOL_CHECKOUT_MS = metrics.histogram("db_pool_checkout_ms", description="Time a pooled connection is held")
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool that blocks (up to `timeout`) instead of failing when exhausted.
+
+    Up to `maxconn` connections are kept open once created (psycopg2's own pools close every
+    connection returned beyond `minconn`). Connections idle for longer than `ping_interval` seconds
+    are health-checked on checkout.
+    """
+
+    def __init__(self, dsn: str, minconn: int, maxconn: int, *, timeout: float, ping_interval: float):
+        self.pid = os.getpid()
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # (connection, monotonic time it was returned); most recently used last
+        self._idle: list[tuple[Any, float]] = [(psycopg2.connect(dsn), time.monotonic()) for _ in range(minconn)]
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(f"no database connection available within {self.timeout}s")
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    conn = psycopg2.connect(self.dsn)
+                elif item[0].closed or not self._healthy(*item):
+                    self._close(item[0])
+                else:
+                    conn = item[0]
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn) -> None:
+        try:
+            close = bool(conn.closed)
+            if not close and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+            if close:
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _healthy(self, conn, last_used: float) -> bool:
+        if time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.info("Discarding stale pooled connection: %s", e)
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _last in idle:
+            self._close(conn)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pid": self.pid,
+            "minconn": self.minconn,
+            "maxconn": self.maxconn,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+        }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+# Pools inherited across fork() must never be closed or garbage-collected in the child:
+# closing would send a terminate message on sockets still owned by the parent.
+_inherited_pools: list[ConnectionPool] = []
+
+
+def _forget_pool_after_fork() -> None:
+    global _pool
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+
+def get_pool() -> ConnectionPool:
+    """Return this process's connection pool, creating it lazily (and again after a fork)."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid != os.getpid():
+            _forget_pool_after_fork()
+        if _pool is None:
+            _pool = ConnectionPool(
+                config.DATABASE_URL,
+                config.DB_POOL_MIN,
+                config.DB_POOL_MAX,
+                timeout=config.DB_POOL_TIMEOUT_S,
+                ping_interval=config.DB_POOL_PING_INTERVAL_S,
+            )
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def pool_stats() -> dict[str, Any]:
+    snap = metrics.snapshot()["histograms"]
+    return {
+        "pool": _pool.stats() if _pool is not None else None,
+        "wait_ms": snap.get(_POOL_WAIT_MS.name),
+        "checkout_ms": snap.get(_POOL_CHECKOUT_MS.name),
+    }
 
 
 @contextmanager
 def get_conn():
-    conn = psycopg2.connect(config.DATABASE_URL)
+    """Check out a pooled connection; it is rolled back if left mid-transaction and returned on exit."""
+    pool = get_pool()
+    t0 = time.perf_counter()
+    conn = pool.acquire()
+    t1 = time.perf_counter()
+    _POOL_WAIT_MS.observe((t1 - t0) * 1000.0)
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
+        _POOL_CHECKOUT_MS.observe((time.perf_counter() - t1) * 1000.0)
 
 
 def ensure_project(name: str, description: Optional[str] = None) -> str:
@@ -37,6 +207,15 @@ def ensure_project(name: str, description: Optional[str] = None) -> str:
             return pid
 
 
+def get_project_id(name: str) -> Optional[str]:
+    """Return the id of project `name`, or None (read-only counterpart of ensure_project)."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id::text FROM projects WHERE name=%s", (name,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
+
 def sha1_fingerprint(text: str) -> str:
     return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
@@ -53,6 +232,70 @@ class Document:
     fingerprint: Optional[str]
 
 
+_DOCUMENT_COLUMNS = ("source_url", "source_type", "author", "language", "title", "fingerprint", "tags", "blob_key")
+
+
+def upsert_documents(project_id: str, docs: Iterable[dict[str, Any]]) -> list[tuple[str, bool]]:
+    """Insert many documents in one statement. Returns (doc_id, created_bool) per input, in order.
+
+    Each doc is a dict keyed by the `documents` columns (source_url, ..., fingerprint, tags, blob_key).
+    Fingerprint collisions within the project (against stored rows or earlier rows in the same
+    batch) resolve to the existing id with created=False; ON CONFLICT makes this safe against
+    concurrent ingest jobs. The same content in another project is a separate document.
+    """
+    docs = list(docs)
+    if not docs:
+        return []
+    # Client-side ids let us return results without relying on RETURNING order
+    ids = [str(uuid.uuid4()) for _ in docs]
+    first_by_fp: dict[str, int] = {}
+    values = []
+    for i, doc in enumerate(docs):
+        fp = doc.get("fingerprint")
+        if fp:
+            if fp in first_by_fp:
+                continue
+            first_by_fp[fp] = i
+        values.append((ids[i], project_id) + tuple(doc.get(col) for col in _DOCUMENT_COLUMNS))
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            inserted = psycopg2.extras.execute_values(
+                cur,
+                f"""
+                INSERT INTO documents (id, project_id, {", ".join(_DOCUMENT_COLUMNS)})
+                VALUES %s
+                ON CONFLICT (project_id, fingerprint) DO NOTHING
+                RETURNING id::text
+                """,
+                values,
+                template="(%s::uuid,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+                page_size=config.DB_BULK_PAGE_SIZE,
+                fetch=True,
+            )
+            created = {row[0] for row in inserted}
+            existing: dict[str, str] = {}
+            conflicted = [fp for fp, i in first_by_fp.items() if ids[i] not in created]
+            if conflicted:
+                cur.execute(
+                    "SELECT fingerprint, id::text FROM documents WHERE project_id = %s AND fingerprint = ANY(%s)",
+                    (project_id, conflicted),
+                )
+                existing = {row[0]: row[1] for row in cur.fetchall()}
+        conn.commit()
+
+    out: list[tuple[str, bool]] = []
+    for i, doc in enumerate(docs):
+        fp = doc.get("fingerprint")
+        if ids[i] in created:
+            out.append((ids[i], True))
+        elif fp and ids[first_by_fp[fp]] in created:
+            out.append((ids[first_by_fp[fp]], False))
+        else:
+            out.append((existing[fp], False))
+    return out
+
+
 def upsert_document(
     project_id: str,
     *,
@@ -66,37 +309,17 @@ def upsert_document(
     blob_key: Optional[str] = None,
 ) -> tuple[str, bool]:
     """Insert a document. Returns (doc_id, created_bool). If fingerprint exists, returns existing id, created=False."""
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            if fingerprint:
-                cur.execute(
-                    "SELECT id FROM documents WHERE fingerprint=%s AND project_id=%s",
-                    (fingerprint, project_id),
-                )
-                row = cur.fetchone()
-                if row:
-                    return (str(row[0]), False)
-            cur.execute(
-                """
-                INSERT INTO documents (project_id, source_url, source_type, author, language, title, fingerprint, tags, blob_key)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                RETURNING id
-                """,
-                (
-                    project_id,
-                    source_url,
-                    source_type,
-                    author,
-                    language,
-                    title,
-                    fingerprint,
-                    tags,
-                    blob_key,
-                ),
-            )
-            doc_id = str(cur.fetchone()[0])
-            conn.commit()
-            return (doc_id, True)
+    doc = {
+        "source_url": source_url,
+        "source_type": source_type,
+        "author": author,
+        "language": language,
+        "title": title,
+        "fingerprint": fingerprint,
+        "tags": tags,
+        "blob_key": blob_key,
+    }
+    return upsert_documents(project_id, [doc])[0]
 
 
 @dataclass
@@ -111,25 +334,304 @@ class Chunk:
     metadata: dict[str, Any]
 
 
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""})
+
+
+def _copy_field(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class _CopyReader:
+    """File-like object that renders COPY text-format lines lazily from an iterator of tuples."""
+
+    def __init__(self, rows: Iterable[tuple]):
+        self._rows = iter(rows)
+        self._buf = ""
+
+    def _line(self, row: tuple) -> str:
+        return "\t".join(_copy_field(v) for v in row) + "\n"
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buf) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buf += self._line(row)
+        if size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+    def readline(self, size: int = -1) -> str:
+        if not self._buf:
+            row = next(self._rows, None)
+            if row is None:
+                return ""
+            self._buf = self._line(row)
+        out, self._buf = self._buf, ""
+        return out
+
+
+def copy_chunks(rows: Iterable[tuple[str, int, str, int, int, int, dict[str, Any]]]) -> list[str]:
+    """Bulk-load chunks with COPY, streaming rows as they are produced.
+
+    rows: iterable of (document_id, idx, text, token_count, start_offset, end_offset, metadata),
+    possibly spanning many documents. Ids are generated client-side and returned in input order.
+    """
+    ids: list[str] = []
+
+    def _with_ids():
+        for document_id, idx, text, tok_count, start, end, metadata in rows:
+            cid = str(uuid.uuid4())
+            ids.append(cid)
+            content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            yield (cid, document_id, idx, text, tok_count, start, end, json.dumps(metadata or {}), content_hash)
+
+    stream = _with_ids()
+    first = next(stream, None)
+    if first is None:
+        return []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.copy_expert(
+                "COPY chunks (id, document_id, idx, text, token_count, start_offset, end_offset, metadata, content_hash) "
+                "FROM STDIN WITH (FORMAT text)",
+                _CopyReader(itertools.chain([first], stream)),
+                size=config.DB_COPY_BUFFER_BYTES,
+            )
+        conn.commit()
+    return ids
+
+
 def insert_chunks(
     document_id: str,
     chunks: Iterable[tuple[int, str, int, int, int, dict[str, Any]]],
 ) -> list[str]:
-    ids: list[str] = []
+    return copy_chunks(
+        (document_id, idx, text, tok_count, start, end, metadata)
+        for idx, text, tok_count, start, end, metadata in chunks
+    )
+
+
+def find_document(project_id: str, source_url: str) -> Optional[tuple[str, Optional[str]]]:
+    """Most recently ingested (doc_id, fingerprint) of the project for `source_url`, if any."""
     with get_conn() as conn:
         with conn.cursor() as cur:
-            for idx, text, tok_count, start, end, metadata in chunks:
-                cur.execute(
+            cur.execute(
+                """
+                SELECT id::text, fingerprint FROM documents
+                WHERE project_id = %s AND source_url = %s
+                ORDER BY ingested_at DESC LIMIT 1
+                """,
+                (project_id, source_url),
+            )
+            row = cur.fetchone()
+            return (row[0], row[1]) if row else None
+
+
+def get_document_chunks(document_id: str) -> list[tuple[str, int, int, int, str]]:
+    """(chunk_id, idx, start_offset, end_offset, content_hash) of a document's stored chunks."""
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # Chunks written before content_hash existed are hashed on the fly
+            cur.execute(
+                """
+                SELECT id::text, idx, start_offset, end_offset,
+                       COALESCE(content_hash, encode(sha256(convert_to(text, 'UTF8')), 'hex'))
+                FROM chunks WHERE document_id = %s
+                ORDER BY idx
+                """,
+                (document_id,),
+            )
+            return [(r[0], int(r[1]), r[2], r[3], r[4]) for r in cur.fetchall()]
+
+
+def document_with_fingerprint(project_id: str, fingerprint: str) -> Optional[str]:
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id::text FROM documents WHERE project_id = %s AND fingerprint = %s",
+                (project_id, fingerprint),
+            )
+            row = cur.fetchone()
+            return row[0] if row else None
+
+
+def _release_aliases(cur, chunk_ids: list[str], document_id: str) -> list[str]:
+    """Store again the aliases of other documents that point at `chunk_ids` (about to be deleted).
+
+    Per deleted chunk the closest alias becomes a chunk and the rest alias it where still near enough
+    (dedupe.plan_release). Aliases recorded before their text was kept fall back to the canonical
+    chunk's text. Returns the ids of the new chunks, which still need embedding.
+    """
+    from .dedupe import bands, plan_release, simhash, to_signed
+
+    cur.execute(
+        """
+        SELECT a.document_id::text, a.idx, a.canonical_chunk_id::text, COALESCE(a.text, c.text),
+               COALESCE(a.token_count, c.token_count), a.start_offset, a.end_offset,
+               COALESCE(a.metadata, c.metadata), d.project_id::text
+        FROM chunk_aliases a
+        JOIN chunks c ON c.id = a.canonical_chunk_id
+        JOIN documents d ON d.id = a.document_id
+        WHERE a.canonical_chunk_id = ANY(%s::uuid[]) AND a.document_id <> %s
+        ORDER BY a.canonical_chunk_id, a.distance, a.document_id, a.idx
+        FOR UPDATE OF a
+        """,
+        (chunk_ids, document_id),
+    )
+    aliases = cur.fetchall()
+    if not aliases:
+        return []
+    store, relink = plan_release([(a[2], a[3]) for a in aliases])
+    new_ids = {pos: str(uuid.uuid4()) for pos in store}
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO chunks (id, document_id, idx, text, token_count, start_offset, end_offset, metadata, content_hash)
+        VALUES %s
+        """,
+        [
+            (new_ids[pos], a[0], a[1], a[3], a[4], a[5], a[6], json.dumps(a[7] or {}), hashlib.sha256(a[3].encode("utf-8")).hexdigest())
+            for pos, a in ((pos, aliases[pos]) for pos in store)
+        ],
+        page_size=config.DB_BULK_PAGE_SIZE,
+    )
+    hashes = {pos: simhash(aliases[pos][3]) for pos in store}
+    psycopg2.extras.execute_values(
+        cur,
+        "INSERT INTO chunk_simhash (chunk_id, project_id, simhash, b0, b1, b2, b3) VALUES %s ON CONFLICT (chunk_id) DO NOTHING",
+        [(new_ids[pos], aliases[pos][8], to_signed(h), *bands(h)) for pos, h in hashes.items()],
+        page_size=config.DB_BULK_PAGE_SIZE,
+    )
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        DELETE FROM chunk_aliases a USING (VALUES %s) AS v(document_id, idx)
+        WHERE a.document_id = v.document_id::uuid AND a.idx = v.idx
+        """,
+        [(aliases[pos][0], aliases[pos][1]) for pos in store],
+        page_size=config.DB_BULK_PAGE_SIZE,
+    )
+    if relink:
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            UPDATE chunk_aliases a SET canonical_chunk_id = v.canonical::uuid, distance = v.distance
+            FROM (VALUES %s) AS v(document_id, idx, canonical, distance)
+            WHERE a.document_id = v.document_id::uuid AND a.idx = v.idx
+            """,
+            [(aliases[pos][0], aliases[pos][1], new_ids[to], d) for pos, to, d in relink],
+            page_size=config.DB_BULK_PAGE_SIZE,
+        )
+    return [new_ids[pos] for pos in store]
+
+
+def apply_chunk_diff(document_id: str, repositioned: Iterable[tuple[str, int, int, int]], stale_chunk_ids: Iterable[str]) -> list[str]:
+    """In one transaction: move kept chunks to their new (idx, start, end), delete stale chunks and
+    drop the document's chunk aliases (they are recomputed for the chunks stored next).
+
+    Other documents' aliases of stale chunks are stored as chunks first; their ids are returned for
+    embedding.
+    """
+    repositioned = list(repositioned)
+    stale = list(stale_chunk_ids)
+    released: list[str] = []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            if repositioned:
+                psycopg2.extras.execute_values(
+                    cur,
                     """
-                    INSERT INTO chunks (document_id, idx, text, token_count, start_offset, end_offset, metadata)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s)
-                    RETURNING id
+                    UPDATE chunks SET idx = v.idx, start_offset = v.start_offset, end_offset = v.end_offset
+                    FROM (VALUES %s) AS v(id, idx, start_offset, end_offset)
+                    WHERE chunks.id = v.id::uuid
                     """,
-                    (document_id, idx, text, tok_count, start, end, psycopg2.extras.Json(metadata or {})),
+                    repositioned,
+                    page_size=config.DB_BULK_PAGE_SIZE,
                 )
-                ids.append(str(cur.fetchone()[0]))
+            cur.execute("DELETE FROM chunk_aliases WHERE document_id = %s", (document_id,))
+            if stale:
+                released = _release_aliases(cur, stale, document_id)
+                cur.execute("DELETE FROM chunks WHERE id = ANY(%s::uuid[])", (stale,))
+        conn.commit()
+    return released
+
+
+def update_document(document_id: str, doc: dict[str, Any]) -> None:
+    """Overwrite the given `documents` columns (keys of _DOCUMENT_COLUMNS) and bump ingested_at."""
+    cols = [c for c in _DOCUMENT_COLUMNS if c in doc]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE documents SET {''.join(f'{c} = %s, ' for c in cols)}ingested_at = now() WHERE id = %s",
+                [doc[c] for c in cols] + [document_id],
+            )
+        conn.commit()
+
+
+def find_simhash_candidates(project_id: str, band_values: list[list[int]]) -> list[tuple[str, int]]:
+    """Stored (chunk_id, simhash) of the project sharing at least one band value (see pivot.dedupe)."""
+    if not any(band_values):
+        return []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT chunk_id::text, simhash FROM chunk_simhash
+                WHERE project_id = %s
+                  AND (b0 = ANY(%s) OR b1 = ANY(%s) OR b2 = ANY(%s) OR b3 = ANY(%s))
+                """,
+                (project_id, *band_values),
+            )
+            return [(row[0], int(row[1])) for row in cur.fetchall()]
+
+
+def put_chunk_simhashes(project_id: str, rows: Iterable[tuple[str, int, int, int, int, int]]) -> None:
+    """rows: (chunk_id, signed simhash, b0, b1, b2, b3)."""
+    rows = [(cid, project_id, *rest) for cid, *rest in rows]
+    if not rows:
+        return
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO chunk_simhash (chunk_id, project_id, simhash, b0, b1, b2, b3) VALUES %s
+                ON CONFLICT (chunk_id) DO NOTHING
+                """,
+                rows,
+                page_size=config.DB_BULK_PAGE_SIZE,
+            )
+        conn.commit()
+
+
+def link_chunk_aliases(rows: Iterable[tuple[str, int, str, int, str, int, int, int, dict[str, Any]]]) -> None:
+    """rows: (document_id, idx, canonical_chunk_id, hamming distance, text, token_count,
+    start_offset, end_offset, metadata); the alias's own chunk is kept for _release_aliases."""
+    rows = [(*r[:8], json.dumps(r[8] or {})) for r in rows]
+    if not rows:
+        return
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO chunk_aliases
+                  (document_id, idx, canonical_chunk_id, distance, text, token_count, start_offset, end_offset, metadata)
+                VALUES %s
+                ON CONFLICT (document_id, idx) DO UPDATE
+                SET canonical_chunk_id = EXCLUDED.canonical_chunk_id, distance = EXCLUDED.distance,
+                    text = EXCLUDED.text, token_count = EXCLUDED.token_count, start_offset = EXCLUDED.start_offset,
+                    end_offset = EXCLUDED.end_offset, metadata = EXCLUDED.metadata
+                """,
+                rows,
+                page_size=config.DB_BULK_PAGE_SIZE,
+            )
         conn.commit()
-    return ids
 
 
 def get_chunk_texts(chunk_ids: list[str]) -> list[tuple[str, str]]:
@@ -153,6 +655,53 @@ def get_chunk_snippet(chunk_id: str) -> Optional[str]:
             return row[0] if row else None
 
 
+def get_chunk_snippets(chunk_ids: list[str], max_chars: int = 5000) -> dict[str, dict[str, Any]]:
+    """Hydrate search hits in one round trip.
+
+    Returns {chunk_id: {"snippet", "doc_id", "idx", "source_url"}}; unknown ids are omitted.
+    """
+    if not chunk_ids:
+        return {}
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.id::text, left(c.text, %s), c.document_id::text, c.idx, d.source_url
+                FROM chunks c
+                LEFT JOIN documents d ON d.id = c.document_id
+                WHERE c.id = ANY(%s::uuid[])
+                """,
+                (max_chars, chunk_ids),
+            )
+            return {
+                row[0]: {"snippet": row[1], "doc_id": row[2], "idx": int(row[3]), "source_url": row[4]}
+                for row in cur.fetchall()
+            }
+
+
+def lexical_search(project_id: str, query: str, limit: int = 25) -> list[tuple[str, float, str, int]]:
+    """Full-text search over the project's chunks (GIN index on chunks.tsv).
+
+    Returns (chunk_id, ts_rank_cd score, doc_id, idx), best first, in the shape of vector search hits.
+    """
+    if not query.strip():
+        return []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT c.id::text, ts_rank_cd(c.tsv, q), c.document_id::text, c.idx
+                FROM websearch_to_tsquery('{config.LEXICAL_TS_CONFIG}', %s) q, chunks c
+                JOIN documents d ON d.id = c.document_id
+                WHERE d.project_id = %s AND c.tsv @@ q
+                ORDER BY 2 DESC
+                LIMIT %s
+                """,
+                (query, project_id, limit),
+            )
+            return [(row[0], float(row[1]), row[2], int(row[3])) for row in cur.fetchall()]
+
+
 def get_chunk_meta(chunk_ids: list[str]) -> list[tuple[str, str, int]]:
     """Return list of (chunk_id, document_id, idx)."""
     if not chunk_ids:
@@ -176,3 +725,34 @@ def get_documents_source_url(doc_ids: list[str]) -> dict[str, str | None]:
                 (doc_ids,),
             )
             return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def get_stored_embeddings(model: str, content_hashes: list[str]) -> dict[str, bytes]:
+    """Return {content_hash: packed float32 vector} for hashes already embedded under `model`."""
+    if not content_hashes:
+        return {}
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT content_hash, vector FROM embedding_store WHERE model=%s AND content_hash = ANY(%s)",
+                (model, content_hashes),
+            )
+            return {row[0]: bytes(row[1]) for row in cur.fetchall()}
+
+
+def put_stored_embeddings(model: str, items: Iterable[tuple[str, int, bytes]]) -> int:
+    """Bulk-insert (content_hash, dim, packed vector) rows; existing hashes are left untouched."""
+    values = [(model, h, dim, psycopg2.Binary(vec)) for (h, dim, vec) in items]
+    if not values:
+        return 0
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO embedding_store (model, content_hash, dim, vector) VALUES %s "
+                "ON CONFLICT (model, content_hash) DO NOTHING",
+                values,
+                page_size=config.DB_BULK_PAGE_SIZE,
+            )
+        conn.commit()
+    return len(values)
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+# asyncpg is optional; without it the sync helpers in pivot.db run in a worker thread
+try:
+    import asyncpg  # type: ignore
+    _HAS_ASYNCPG = True
+except Exception:
+    asyncpg = None  # type: ignore
+    _HAS_ASYNCPG = False
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional["asyncpg.Pool"] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def get_pool() -> "asyncpg.Pool":
+    """Return the asyncpg pool bound to the running event loop (created on first use)."""
+    global _pool, _pool_loop, _pool_lock
+    loop = asyncio.get_running_loop()
+    if _pool is not None and _pool_loop is loop:
+        return _pool
+    if _pool_loop is not loop:
+        # asyncpg pools are bound to the loop that created them
+        _pool, _pool_loop, _pool_lock = None, loop, asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                config.DATABASE_URL,
+                min_size=config.DB_POOL_MIN,
+                max_size=config.DB_POOL_MAX,
+                timeout=config.DB_POOL_TIMEOUT_S,
+            )
+        return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def _run_sync(fn, *args, **kwargs):
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+async def get_project_id(name: str) -> Optional[str]:
+    """Async twin of db.get_project_id."""
+    if not _HAS_ASYNCPG:
+        from . import db
+
+        return await _run_sync(db.get_project_id, name)
+    pool = await get_pool()
+    return await pool.fetchval("SELECT id::text FROM projects WHERE name=$1", name)
+
+
+async def lexical_search(project_id: str, query: str, limit: int = 25) -> list[tuple[str, float, str, int]]:
+    """Async twin of db.lexical_search."""
+    if not _HAS_ASYNCPG:
+        from . import db
+
+        return await _run_sync(db.lexical_search, project_id, query, limit)
+    if not query.strip():
+        return []
+    pool = await get_pool()
+    rows = await pool.fetch(
+        f"""
+        SELECT c.id::text, ts_rank_cd(c.tsv, q), c.document_id::text, c.idx
+        FROM websearch_to_tsquery('{config.LEXICAL_TS_CONFIG}', $1) q, chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE d.project_id = $2::uuid AND c.tsv @@ q
+        ORDER BY 2 DESC
+        LIMIT $3
+        """,
+        query,
+        project_id,
+        limit,
+    )
+    return [(row[0], float(row[1]), row[2], int(row[3])) for row in rows]
+
+
+async def get_chunk_snippets(chunk_ids: list[str], max_chars: int = 5000) -> dict[str, dict[str, Any]]:
+    """Async twin of db.get_chunk_snippets."""
+    if not chunk_ids:
+        return {}
+    if not _HAS_ASYNCPG:
+        from . import db
+
+        return await _run_sync(db.get_chunk_snippets, chunk_ids, max_chars=max_chars)
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT c.id::text, left(c.text, $1), c.document_id::text, c.idx, d.source_url
+        FROM chunks c
+        LEFT JOIN documents d ON d.id = c.document_id
+        WHERE c.id = ANY($2::uuid[])
+        """,
+        max_chars,
+        chunk_ids,
+    )
+    return {
+        row[0]: {"snippet": row[1], "doc_id": row[2], "idx": int(row[3]), "source_url": row[4]}
+        for row in rows
+    }
+
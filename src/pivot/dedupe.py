@@ -0,0 +1,184 @@
+"""Chunk-level near-duplicate suppression with 64-bit SimHash and banded LSH.
+
+A chunk within DEDUPE_MAX_DISTANCE bits (Hamming) of a chunk already stored in the project, or of
+an earlier chunk of the same ingest, is not stored again: its position is linked to the existing
+chunk in `chunk_aliases` instead, so it is never embedded, indexed or returned as a redundant hit.
+The alias keeps its own text: when the canonical chunk is deleted, the alias is stored as a chunk
+again (see `plan_release` and db.apply_chunk_diff).
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from . import config
+
+BANDS = 4
+BAND_BITS = 16
+_MASK64 = (1 << 64) - 1
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+Ref = Union[str, Tuple[str, int]]  # stored chunk id, or ("new", position in this ingest)
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """Unsigned 64-bit SimHash over word `shingle`-grams of the lowercased text."""
+    terms = _TERM_RE.findall(text.lower())
+    grams = [" ".join(terms[i : i + shingle]) for i in range(max(1, len(terms) - shingle + 1))]
+    votes = [0] * 64
+    for gram in grams:
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            votes[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if votes[bit] > 0)
+
+
+def bands(h: int) -> Tuple[int, ...]:
+    mask = (1 << BAND_BITS) - 1
+    return tuple((h >> (i * BAND_BITS)) & mask for i in range(BANDS))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK64).count("1")
+
+
+def to_signed(h: int) -> int:
+    """Postgres BIGINT representation."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def from_signed(h: int) -> int:
+    return h & _MASK64
+
+
+class SimHashIndex:
+    """In-memory banded index: candidates share at least one band, so every hash within
+    BANDS - 1 bits is found."""
+
+    def __init__(self):
+        self._buckets: Dict[Tuple[int, int], List[Tuple[Ref, int]]] = {}
+
+    def add(self, ref: Ref, h: int) -> None:
+        for i, value in enumerate(bands(h)):
+            self._buckets.setdefault((i, value), []).append((ref, h))
+
+    def nearest(self, h: int, max_distance: int) -> Optional[Tuple[Ref, int]]:
+        best: Optional[Tuple[Ref, int]] = None
+        for i, value in enumerate(bands(h)):
+            for ref, other in self._buckets.get((i, value), ()):
+                d = hamming(h, other)
+                if d <= max_distance and (best is None or d < best[1]):
+                    best = (ref, d)
+        return best
+
+
+# lookup(project_id, band values per band) -> stored (chunk_id, signed simhash) sharing a band
+Lookup = Callable[[str, List[List[int]]], List[Tuple[str, int]]]
+
+
+class ChunkDeduper:
+    """Filter for copy_chunks rows (document_id, idx, text, token_count, start, end, metadata).
+
+    `filter` yields the rows to store, looking up stored candidates one block of rows at a time;
+    after the rows are written, `commit(chunk_ids)` records their hashes and the alias links.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        *,
+        max_distance: Optional[int] = None,
+        min_chars: Optional[int] = None,
+        block: Optional[int] = None,
+        lookup: Optional[Lookup] = None,
+    ):
+        self.project_id = project_id
+        self.max_distance = config.DEDUPE_MAX_DISTANCE if max_distance is None else max_distance
+        self.min_chars = config.DEDUPE_MIN_CHARS if min_chars is None else min_chars
+        self.block = block or config.DEDUPE_BLOCK
+        self._lookup = lookup
+        self._new = SimHashIndex()
+        self._kept = 0
+        self.hashes: List[Tuple[int, int]] = []  # (kept position, simhash)
+        self.aliases: List[Tuple[str, int, Ref, int]] = []  # (document_id, idx, canonical, distance)
+        self._alias_rows: List[tuple] = []
+
+    def _stored(self, hashes: Sequence[int]) -> SimHashIndex:
+        index = SimHashIndex()
+        if not hashes:
+            return index
+        lookup = self._lookup
+        if lookup is None:
+            from . import db
+
+            lookup = db.find_simhash_candidates
+        per_band = [sorted({bands(h)[i] for h in hashes}) for i in range(BANDS)]
+        for chunk_id, signed in lookup(self.project_id, per_band):
+            index.add(chunk_id, from_signed(signed))
+        return index
+
+    def filter(self, rows: Iterable[tuple]) -> Iterator[tuple]:
+        rows = iter(rows)
+        while True:
+            block = list(itertools.islice(rows, self.block))
+            if not block:
+                return
+            hashes = [simhash(r[2]) if len(r[2]) >= self.min_chars else None for r in block]
+            stored = self._stored([h for h in hashes if h is not None])
+            for row, h in zip(block, hashes):
+                if h is not None:
+                    matches = [m for m in (self._new.nearest(h, self.max_distance), stored.nearest(h, self.max_distance)) if m]
+                    if matches:
+                        ref, distance = min(matches, key=lambda m: m[1])
+                        self.aliases.append((row[0], int(row[1]), ref, distance))
+                        self._alias_rows.append(row)
+                        continue
+                    self._new.add(("new", self._kept), h)
+                    self.hashes.append((self._kept, h))
+                self._kept += 1
+                yield row
+
+    def commit(self, chunk_ids: List[str]) -> Dict[str, int]:
+        """Store hashes of the written rows (`chunk_ids` as returned by copy_chunks) and the aliases."""
+        from . import db
+
+        db.put_chunk_simhashes(
+            self.project_id,
+            [(chunk_ids[pos], to_signed(h), *bands(h)) for pos, h in self.hashes],
+        )
+        db.link_chunk_aliases(
+            [
+                (document_id, idx, chunk_ids[ref[1]] if isinstance(ref, tuple) else ref, distance, *row[2:7])
+                for (document_id, idx, ref, distance), row in zip(self.aliases, self._alias_rows)
+            ]
+        )
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        return {"kept": self._kept, "aliased": len(self.aliases)}
+
+
+def plan_release(
+    aliases: Sequence[Tuple[str, str]], max_distance: Optional[int] = None
+) -> Tuple[List[int], List[Tuple[int, int, int]]]:
+    """Re-home the aliases of canonical chunks that are about to be deleted.
+
+    aliases: (canonical chunk id, alias text), closest alias first per canonical chunk. Returns the
+    positions to store as chunks and (position, promoted position, distance) re-links: the first
+    alias of each canonical chunk is promoted, the others alias it when still within `max_distance`.
+    """
+    max_distance = config.DEDUPE_MAX_DISTANCE if max_distance is None else max_distance
+    store: List[int] = []
+    relink: List[Tuple[int, int, int]] = []
+    promoted: Dict[str, Tuple[int, int]] = {}
+    for pos, (canonical, text) in enumerate(aliases):
+        h = simhash(text)
+        first = promoted.get(canonical)
+        if first is not None and hamming(h, first[1]) <= max_distance:
+            relink.append((pos, first[0], hamming(h, first[1])))
+            continue
+        promoted.setdefault(canonical, (pos, h))
+        store.append(pos)
+    return store, relink
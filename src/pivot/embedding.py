@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+from array import array
 from functools import lru_cache
-from typing import Iterable, List
+from typing import Iterable, List, Tuple
 
 import hashlib
+import logging
 import math
+import os
+import re
+import threading
+import unicodedata
 
 # Try to import sentence_transformers and numpy; fall back to lightweight implementation if missing
 try:
@@ -17,10 +23,22 @@ except Exception:
     _HAS_ST = False
 
 from . import config
+from . import metrics
+from .cache import TTLCache
+from .redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
 
 
 @lru_cache(maxsize=1)
 def get_embed_model() -> "SentenceTransformer | None":
+    if config.MODEL_BACKEND == "onnx":
+        try:
+            from .model_backends import load_embedder
+
+            return load_embedder(config.EMBED_MODEL)
+        except Exception as e:
+            logger.warning("ONNX embedder for %s unavailable (%s); falling back to sentence-transformers", config.EMBED_MODEL, e)
     if _HAS_ST:
         return SentenceTransformer(config.EMBED_MODEL)
     return None
@@ -49,24 +67,194 @@ def _hash_embed(text: str, dim: int = 128) -> List[float]:
     return vec
 
 
+def _encode(model, texts: List[str], normalize: bool, batch_size: int) -> List[List[float]]:
+    vecs = model.encode(texts, normalize_embeddings=normalize, batch_size=batch_size)
+    if isinstance(vecs, (list, tuple)):
+        # convert numpy arrays if necessary
+        try:
+            return (vecs.astype(float).tolist() if hasattr(vecs, 'astype') else [[float(x) for x in v] for v in vecs])
+        except Exception:
+            return [[float(x) for x in v] for v in vecs]
+    elif np is not None and isinstance(vecs, np.ndarray):
+        return vecs.astype(float).tolist()
+    else:
+        return [[float(x) for x in v] for v in vecs]
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def microbatching_enabled() -> bool:
+    return config.EMBED_MICROBATCH and get_embed_model() is not None
+
+
+def get_batcher():
+    """Process-wide MicroBatcher in front of the embedding model (rebuilt after fork)."""
+    global _batcher
+    from .embedding_batcher import MicroBatcher
+
+    with _batcher_lock:
+        if _batcher is None or _batcher.pid != os.getpid():
+            model = get_embed_model()
+            _batcher = MicroBatcher(
+                lambda texts, normalize: _encode(model, texts, normalize, config.EMBED_MICROBATCH_MAX),
+                max_batch=config.EMBED_MICROBATCH_MAX,
+                max_wait_ms=config.EMBED_MICROBATCH_WAIT_MS,
+            )
+        return _batcher
+
+
 def embed_texts(texts: Iterable[str], *, normalize: bool = False, batch_size: int = 64) -> List[List[float]]:
     texts = list(texts)
     model = get_embed_model()
     if model is not None:
-        vecs = model.encode(texts, normalize_embeddings=normalize, batch_size=batch_size)
-        if isinstance(vecs, (list, tuple)):
-            # convert numpy arrays if necessary
-            try:
-                return (vecs.astype(float).tolist() if hasattr(vecs, 'astype') else [[float(x) for x in v] for v in vecs])
-            except Exception:
-                return [[float(x) for x in v] for v in vecs]
-        elif np is not None and isinstance(vecs, np.ndarray):
-            return vecs.astype(float).tolist()
-        else:
-            return [[float(x) for x in v] for v in vecs]
+        # Small calls (queries, tiny docs) are coalesced with concurrent callers; bulk calls go straight through
+        if config.EMBED_MICROBATCH and len(texts) < config.EMBED_MICROBATCH_MAX:
+            return get_batcher().encode(texts, normalize)
+        return _encode(model, texts, normalize, batch_size)
     # fallback
     return [_hash_embed(t) for t in texts]
 
 
+def model_id() -> str:
+    """Identify the active embedding space (model name and backend, or the hash fallback)."""
+    model = get_embed_model()
+    if model is None:
+        return "hash-128"
+    if type(model).__name__ == "OnnxEmbedder":
+        return f"{config.EMBED_MODEL}@onnx{'-int8' if config.ONNX_QUANTIZED else ''}"
+    return config.EMBED_MODEL
+
+
+def pack_vector(vec: Iterable[float]) -> bytes:
+    """Serialize a vector as compact (native byte order) float32 bytes."""
+    return array("f", vec).tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(data)
+    return vec.tolist()
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _query_key(text: str, normalize: bool) -> str:
+    norm = _WS_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+    raw = f"{model_id()}|{int(normalize)}|{norm}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# Tier 1: per-process LRU of packed float32 vectors
+_query_cache = TTLCache(
+    maxsize=config.QUERY_EMBED_CACHE_SIZE,
+    ttl=config.QUERY_EMBED_CACHE_TTL_S,
+    name="query_embeddings",
+)
+_REDIS_HITS = metrics.counter("query_embed_cache_redis_hits")
+_REDIS_MISSES = metrics.counter("query_embed_cache_redis_misses")
+_REDIS_ERRORS = metrics.counter("query_embed_cache_redis_errors")
+
+# Optional shared tier (tier 2) of the query embedding cache
+_redis = RedisClient(
+    "Query embedding cache",
+    lambda: config.QUERY_EMBED_CACHE_REDIS,
+    timeout_s=config.QUERY_EMBED_CACHE_REDIS_TIMEOUT_S,
+    fallback="using local tier only",
+)
+
+
+def _redis_failed(e: Exception) -> None:
+    _REDIS_ERRORS.inc()
+    _redis.failed(e)
+
+
+def embed_query_with_status(text: str, *, normalize: bool = False) -> Tuple[List[float], str]:
+    """Return (vector, cache_status) where cache_status is "local", "redis" or "miss"."""
+    key = _query_key(text, normalize)
+    packed = _query_cache.get(key)
+    if packed is not None:
+        return unpack_vector(packed), "local"
+
+    client = _redis.get()
+    rkey = f"pivot:qemb:{key}"
+    if client is not None:
+        try:
+            packed = client.get(rkey)
+        except Exception as e:
+            _redis_failed(e)
+            client = None
+        if packed is not None:
+            _REDIS_HITS.inc()
+            _query_cache.set(key, packed)
+            return unpack_vector(packed), "redis"
+        if client is not None:
+            _REDIS_MISSES.inc()
+
+    vec = embed_texts([text], normalize=normalize)[0]
+    packed = pack_vector(vec)
+    _query_cache.set(key, packed)
+    if client is not None:
+        try:
+            client.set(rkey, packed, ex=int(config.QUERY_EMBED_CACHE_TTL_S) or None)
+        except Exception as e:
+            _redis_failed(e)
+    # The float32 round trip: a later hit from either tier returns exactly this vector
+    return unpack_vector(packed), "miss"
+
+
+def embed_queries_with_status(texts: List[str], *, normalize: bool = False) -> Tuple[List[List[float]], List[str]]:
+    """Batch form of embed_query_with_status: both cache tiers are read in bulk and all misses
+    (each distinct text once) are embedded in a single embed_texts call."""
+    keys = [_query_key(t, normalize) for t in texts]
+    found = _query_cache.get_many(keys)
+    status = {k: "local" for k in found}
+
+    client = _redis.get()
+    pending = [k for k in dict.fromkeys(keys) if k not in found]
+    if client is not None and pending:
+        try:
+            for k, packed in zip(pending, client.mget([f"pivot:qemb:{k}" for k in pending])):
+                if packed is not None:
+                    found[k], status[k] = packed, "redis"
+                    _query_cache.set(k, packed)
+            _REDIS_HITS.inc(sum(1 for k in pending if k in found))
+            _REDIS_MISSES.inc(sum(1 for k in pending if k not in found))
+        except Exception as e:
+            _redis_failed(e)
+            client = None
+
+    missing = [k for k in dict.fromkeys(keys) if k not in found]
+    if missing:
+        text_by_key = dict(zip(keys, texts))
+        fresh = {k: pack_vector(v) for k, v in zip(missing, embed_texts([text_by_key[k] for k in missing], normalize=normalize))}
+        _query_cache.set_many(fresh)
+        found.update(fresh)
+        status.update((k, "miss") for k in missing)
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for k, packed in fresh.items():
+                    pipe.set(f"pivot:qemb:{k}", packed, ex=int(config.QUERY_EMBED_CACHE_TTL_S) or None)
+                pipe.execute()
+            except Exception as e:
+                _redis_failed(e)
+    return [unpack_vector(found[k]) for k in keys], [status[k] for k in keys]
+
+
 def embed_query(text: str, *, normalize: bool = False) -> List[float]:
-    return embed_texts([text], normalize=normalize)[0]
+    return embed_query_with_status(text, normalize=normalize)[0]
+
+
+def query_cache_stats() -> dict:
+    return {
+        "local": _query_cache.stats(),
+        "redis": {
+            "enabled": _redis.get() is not None,
+            "hits": _REDIS_HITS.value,
+            "misses": _REDIS_MISSES.value,
+            "errors": _REDIS_ERRORS.value,
+        },
+    }
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE = metrics.histogram(
+    "embed_microbatch_size", buckets=(1, 2, 4, 8, 16, 32, 64, 128), description="Texts per micro-batched forward pass"
+)
+_QUEUE_WAIT_MS = metrics.histogram(
+    "embed_microbatch_queue_wait_ms",
+    buckets=(0.5, 1, 2, 5, 10, 20, 50, 100, 250),
+    description="Time a request waited before its batch started",
+)
+
+EncodeFn = Callable[[List[str], bool], List[List[float]]]
+
+
+@dataclass
+class _Request:
+    texts: List[str]
+    normalize: bool
+    future: Future = field(default_factory=Future)
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """Coalesce concurrent embedding calls into one model forward pass.
+
+    A background thread takes the first waiting request, then keeps collecting requests until
+    `max_batch` texts are queued or `max_wait_ms` has passed, runs `encode_fn` once per
+    normalization setting and hands each caller its slice of the result.
+    """
+
+    def __init__(self, encode_fn: EncodeFn, *, max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+        self.pid = os.getpid()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="pivot-embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str], normalize: bool = False) -> Future:
+        req = _Request(list(texts), normalize)
+        self._queue.put(req)
+        return req.future
+
+    def encode(self, texts: List[str], normalize: bool = False) -> List[List[float]]:
+        return self.submit(texts, normalize).result()
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        n = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait_s
+        while n < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                req = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(req)
+            n += len(req.texts)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for req in batch:
+                _QUEUE_WAIT_MS.observe((started - req.enqueued) * 1000.0)
+            for normalize in (False, True):
+                group = [r for r in batch if r.normalize == normalize and r.future.set_running_or_notify_cancel()]
+                if group:
+                    self._encode_group(group, normalize)
+
+    def _encode_group(self, group: List[_Request], normalize: bool) -> None:
+        texts = [t for r in group for t in r.texts]
+        _BATCH_SIZE.observe(len(texts))
+        try:
+            vecs = self.encode_fn(texts, normalize)
+        except Exception as e:
+            logger.warning("Micro-batched embedding failed for %d texts: %s", len(texts), e)
+            for r in group:
+                r.future.set_exception(e)
+            return
+        pos = 0
+        for r in group:
+            r.future.set_result(vecs[pos : pos + len(r.texts)])
+            pos += len(r.texts)
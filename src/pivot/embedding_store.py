@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+
+from . import config
+from . import embedding
+from . import metrics
+
+# Worker-side cache effectiveness; the hit ratio is hits / (hits + misses) on /metrics
+_HITS = metrics.counter("embedding_store_hits", description="Chunk texts served from the embedding store")
+_MISSES = metrics.counter("embedding_store_misses", description="Chunk texts that needed a forward pass")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def space_id(normalize: bool = False) -> str:
+    """Key for the embedding space: model identity plus output normalization."""
+    return f"{embedding.model_id()}{':norm' if normalize else ''}"
+
+
+def embed_texts_stored(
+    texts: Iterable[str],
+    *,
+    normalize: bool = False,
+    batch_size: int = 64,
+) -> Tuple[List[List[float]], Dict[str, int]]:
+    """Embed `texts`, reusing vectors already in the content-addressed store.
+
+    Only texts whose (model, sha256) is unknown are embedded (each distinct text once), and the new
+    vectors are written back in one bulk insert. Returns (vectors in input order, {"embedded", "reused"}).
+    """
+    from . import db
+
+    texts = list(texts)
+    if not texts:
+        return [], {"embedded": 0, "reused": 0}
+    if not config.EMBED_STORE_ENABLED:
+        return embedding.embed_texts(texts, normalize=normalize, batch_size=batch_size), {"embedded": len(texts), "reused": 0}
+
+    model = space_id(normalize)
+    hashes = [content_hash(t) for t in texts]
+    unique = list(dict.fromkeys(hashes))
+    vectors: Dict[str, List[float]] = {
+        h: embedding.unpack_vector(packed) for h, packed in db.get_stored_embeddings(model, unique).items()
+    }
+
+    text_by_hash = dict(zip(hashes, texts))
+    missing = [h for h in unique if h not in vectors]
+    if missing:
+        new_vecs = embedding.embed_texts([text_by_hash[h] for h in missing], normalize=normalize, batch_size=batch_size)
+        db.put_stored_embeddings(model, [(h, len(v), embedding.pack_vector(v)) for h, v in zip(missing, new_vecs)])
+        vectors.update(zip(missing, new_vecs))
+
+    _HITS.inc(len(texts) - len(missing))
+    _MISSES.inc(len(missing))
+    # "reused" counts every input served without its own forward pass (store hits and in-batch repeats)
+    return [vectors[h] for h in hashes], {"embedded": len(missing), "reused": len(texts) - len(missing)}
+
+
+def lookup_vectors(texts: List[str], *, normalize: bool = False) -> Dict[int, List[float]]:
+    """Return {position: stored vector} for texts already in the store (no embedding is computed)."""
+    from . import db
+
+    get_stored = getattr(db, "get_stored_embeddings", None)
+    if not texts or get_stored is None or not config.EMBED_STORE_ENABLED:
+        return {}
+    hashes = [content_hash(t) for t in texts]
+    stored = get_stored(space_id(normalize), list(dict.fromkeys(hashes)))
+    return {i: embedding.unpack_vector(stored[h]) for i, h in enumerate(hashes) if h in stored}
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+# Default latency buckets in milliseconds
+DEFAULT_MS_BUCKETS: tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_lock = threading.Lock()
+_histograms: Dict[str, "Histogram"] = {}
+_counters: Dict[str, "Counter"] = {}
+_gauges: Dict[str, "Gauge"] = {}
+
+Labels = Optional[Dict[str, str]]
+
+
+def _key(name: str, labels: Labels) -> str:
+    """Registry key: the name, plus sorted labels as in the exposition format."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics) kept in process memory."""
+
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_MS_BUCKETS, description: str = "", labels: Labels = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time_ms(self) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe((time.perf_counter() - t0) * 1000.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = [], 0
+        for le, c in zip(list(self.buckets) + [float("inf")], counts):
+            running += c
+            cumulative.append((le, running))
+        return {"count": count, "sum": total, "buckets": cumulative}
+
+
+class Counter:
+    def __init__(self, name: str, description: str = "", labels: Labels = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    """Value read from a callback when metrics are exported (e.g. a cache's hit ratio)."""
+
+    def __init__(self, name: str, fn: Callable[[], float], description: str = "", labels: Labels = None):
+        self.name = name
+        self.fn = fn
+        self.description = description
+        self.labels = dict(labels or {})
+
+    @property
+    def value(self) -> Optional[float]:
+        try:
+            return float(self.fn())
+        except Exception:
+            return None
+
+
+def histogram(
+    name: str, buckets: Sequence[float] = DEFAULT_MS_BUCKETS, description: str = "", labels: Labels = None
+) -> Histogram:
+    """Return the process-wide histogram `name` (with `labels`), creating it on first use."""
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = Histogram(name, buckets, description, labels)
+        return h
+
+
+def counter(name: str, description: str = "", labels: Labels = None) -> Counter:
+    key = _key(name, labels)
+    with _lock:
+        c = _counters.get(key)
+        if c is None:
+            c = _counters[key] = Counter(name, description, labels)
+        return c
+
+
+def gauge(name: str, fn: Callable[[], float], description: str = "", labels: Labels = None) -> Gauge:
+    """Register (or replace) the callback gauge `name` with `labels`."""
+    g = Gauge(name, fn, description, labels)
+    with _lock:
+        _gauges[_key(name, labels)] = g
+    return g
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return all registered metrics as plain data (for /stats and tests)."""
+    with _lock:
+        hs = dict(_histograms)
+        cs = dict(_counters)
+    return {
+        "histograms": {name: h.snapshot() for name, h in hs.items()},
+        "counters": {name: c.value for name, c in cs.items()},
+    }
+
+
+def export(*, gauges: bool = True) -> Dict[str, Any]:
+    """All metrics with names, labels and descriptions (see pivot.prometheus)."""
+    with _lock:
+        hs = list(_histograms.values())
+        cs = list(_counters.values())
+        gs = list(_gauges.values()) if gauges else []
+    return {
+        "histograms": [
+            {"name": h.name, "labels": h.labels, "description": h.description, **h.snapshot()} for h in hs
+        ],
+        "counters": [{"name": c.name, "labels": c.labels, "description": c.description, "value": c.value} for c in cs],
+        "gauges": [{"name": g.name, "labels": g.labels, "description": g.description, "value": g.value} for g in gs],
+    }
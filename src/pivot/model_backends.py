@@ -0,0 +1,267 @@
+"""ONNX Runtime CPU backend for the embedding and reranking models.
+
+Export (and int8-quantize) once, then select with MODEL_BACKEND=onnx:
+
+    python -m pivot.model_backends export --kind embed --model BAAI/bge-large-en
+    python -m pivot.model_backends export --kind rerank --model BAAI/bge-reranker-v2-m3
+    python -m pivot.model_backends parity --kind embed --model BAAI/bge-large-en
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# All optional: torch/transformers only for export and parity, onnxruntime for serving
+try:
+    import numpy as np
+except Exception:
+    np = None  # type: ignore
+
+try:
+    import onnxruntime as ort  # type: ignore
+    _HAS_ORT = True
+except Exception:
+    ort = None  # type: ignore
+    _HAS_ORT = False
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_META_FILE = "pivot_onnx.json"
+
+
+def model_dir(model_name: str) -> str:
+    """Directory holding the exported ONNX graphs and tokenizer for `model_name`."""
+    return os.path.join(config.ONNX_MODEL_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+
+def _onnx_file(path: str) -> str:
+    name = "model.int8.onnx" if config.ONNX_QUANTIZED else "model.onnx"
+    return os.path.join(path, name)
+
+
+def _session(path: str) -> "ort.InferenceSession":
+    if not _HAS_ORT:
+        raise RuntimeError("onnxruntime is not installed")
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if config.ONNX_INTRA_OP_THREADS > 0:
+        opts.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    opts.inter_op_num_threads = config.ONNX_INTER_OP_THREADS
+    return ort.InferenceSession(_onnx_file(path), sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+class _OnnxModel:
+    def __init__(self, path: str, max_length: Optional[int] = None):
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(path, _META_FILE)) as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.max_length = max_length or int(self.meta.get("max_length", 512))
+        self.session = _session(path)
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _run(self, first: List[str], second: Optional[List[str]] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Return (first graph output, attention mask) for a padded batch."""
+        enc = self.tokenizer(
+            first,
+            second,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+        return self.session.run(None, feeds)[0], enc["attention_mask"]
+
+
+class OnnxEmbedder(_OnnxModel):
+    """Drop-in for the SentenceTransformer.encode() surface used by pivot.embedding."""
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = False, batch_size: int = 64, **_kw) -> "np.ndarray":
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, int(self.meta.get("dim", 0))), dtype=np.float32)
+        # Length-sorted batches keep padding small; results are restored to input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: List[Optional["np.ndarray"]] = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            idx = order[start : start + batch_size]
+            hidden, mask = self._run([texts[i] for i in idx])
+            if self.meta.get("pooling") == "mean":
+                m = mask[..., None].astype(np.float32)
+                pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            else:
+                pooled = hidden[:, 0]
+            for i, vec in zip(idx, pooled):
+                out[i] = vec
+        vecs = np.stack(out).astype(np.float32)
+        if normalize_embeddings:
+            vecs /= np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """Drop-in for the CrossEncoder.predict() surface used by the reranker."""
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **_kw) -> "np.ndarray":
+        pairs = list(pairs)
+        scores: List[float] = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start : start + batch_size]
+            logits, _mask = self._run([q for q, _ in batch], [t for _, t in batch])
+            scores.extend(logits.reshape(len(batch), -1)[:, 0].tolist())
+        # Match CrossEncoder's default sigmoid activation for single-label models
+        return np.asarray([1.0 / (1.0 + math.exp(-s)) for s in scores], dtype=np.float32)
+
+
+def load_embedder(model_name: str) -> OnnxEmbedder:
+    return OnnxEmbedder(model_dir(model_name))
+
+
+def load_cross_encoder(model_name: str, max_length: Optional[int] = None) -> OnnxCrossEncoder:
+    return OnnxCrossEncoder(model_dir(model_name), max_length=max_length)
+
+
+def export(model_name: str, kind: str, *, quantize: bool = True, max_length: int = 512, opset: int = 17) -> str:
+    """Export `model_name` ("embed" or "rerank") to ONNX, optionally with dynamic int8 quantization."""
+    import torch
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    out = model_dir(model_name)
+    os.makedirs(out, exist_ok=True)
+    tok = AutoTokenizer.from_pretrained(model_name)
+    model_cls = AutoModel if kind == "embed" else AutoModelForSequenceClassification
+    model = model_cls.from_pretrained(model_name).eval()
+
+    sample = tok(["export sample"], ["export pair"] if kind == "rerank" else None, return_tensors="pt")
+    input_names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in sample]
+    dynamic = {name: {0: "batch", 1: "seq"} for name in input_names}
+    dynamic["output"] = {0: "batch", 1: "seq"} if kind == "embed" else {0: "batch"}
+    fp32_path = os.path.join(out, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[k] for k in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["output"],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+        )
+    tok.save_pretrained(out)
+
+    meta: Dict[str, Any] = {"model": model_name, "kind": kind, "max_length": max_length}
+    if kind == "embed":
+        meta["dim"] = int(model.config.hidden_size)
+        meta["pooling"] = _pooling_mode(model_name)
+    with open(os.path.join(out, _META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(fp32_path, os.path.join(out, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    logger.info("Exported %s (%s) to %s", model_name, kind, out)
+    return out
+
+
+def _pooling_mode(model_name: str) -> str:
+    """Pooling used by the sentence-transformers config (BGE models use CLS)."""
+    try:
+        from sentence_transformers import SentenceTransformer
+
+        for module in SentenceTransformer(model_name, device="cpu"):
+            if hasattr(module, "get_pooling_mode_str"):
+                return "mean" if module.get_pooling_mode_str() == "mean" else "cls"
+    except Exception as e:
+        logger.warning("Could not read pooling mode for %s (%s); assuming cls", model_name, e)
+    return "cls"
+
+
+_PARITY_QUERIES = [
+    "how do I rotate database credentials",
+    "error code 0x80070005 access denied",
+    "what is retrieval augmented generation",
+    "steps to configure a reverse proxy",
+]
+_PARITY_DOCS = [
+    "Rotate credentials by creating a new user, updating the secret, then dropping the old user.",
+    "Access denied (0x80070005) usually means the service account lacks write permission.",
+    "Retrieval-augmented generation feeds retrieved passages to a language model as context.",
+    "Configure the reverse proxy by adding an upstream block and a location that proxies to it.",
+    "The weather tomorrow is expected to be sunny with light winds.",
+    "Bananas are a good source of potassium and dietary fibre.",
+]
+
+
+def _topk(scores: "np.ndarray", k: int) -> List[List[int]]:
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+
+def parity_check(model_name: str, kind: str, *, k: int = 3, queries=None, docs=None) -> Dict[str, Any]:
+    """Compare the ONNX backend's top-k against the PyTorch backend on a small query/doc set.
+
+    Returns the mean top-k overlap (1.0 = identical sets) and the fraction of identical top-1 picks.
+    """
+    queries = list(queries or _PARITY_QUERIES)
+    docs = list(docs or _PARITY_DOCS)
+    k = min(k, len(docs))
+    if kind == "embed":
+        from sentence_transformers import SentenceTransformer
+
+        ref, onnx = SentenceTransformer(model_name, device="cpu"), load_embedder(model_name)
+        scores = []
+        for m in (ref, onnx):
+            q = np.asarray(m.encode(queries, normalize_embeddings=True))
+            d = np.asarray(m.encode(docs, normalize_embeddings=True))
+            scores.append(q @ d.T)
+    else:
+        from sentence_transformers.cross_encoder import CrossEncoder
+
+        ref, onnx = CrossEncoder(model_name), load_cross_encoder(model_name)
+        pairs = [(q, d) for q in queries for d in docs]
+        scores = [np.asarray(m.predict(pairs)).reshape(len(queries), len(docs)) for m in (ref, onnx)]
+    ref_top, onnx_top = _topk(scores[0], k), _topk(scores[1], k)
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(ref_top, onnx_top)]
+    return {
+        "model": model_name,
+        "kind": kind,
+        "quantized": config.ONNX_QUANTIZED,
+        "k": k,
+        "topk_overlap": float(sum(overlap) / len(overlap)),
+        "top1_agreement": float(sum(a[0] == b[0] for a, b in zip(ref_top, onnx_top)) / len(queries)),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m pivot.model_backends")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="export a model to ONNX (+ int8 quantization)")
+    par = sub.add_parser("parity", help="compare ONNX top-k against the PyTorch backend")
+    for p in (exp, par):
+        p.add_argument("--kind", choices=["embed", "rerank"], required=True)
+        p.add_argument("--model", required=True)
+    exp.add_argument("--no-quantize", action="store_true")
+    exp.add_argument("--max-length", type=int, default=512)
+    par.add_argument("--k", type=int, default=3)
+    par.add_argument("--min-overlap", type=float, default=0.9, help="exit non-zero below this top-k overlap")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "export":
+        print(export(args.model, args.kind, quantize=not args.no_quantize, max_length=args.max_length))
+        return 0
+    result = parity_check(args.model, args.kind, k=args.k)
+    print(json.dumps(result, indent=2))
+    return 0 if result["topk_overlap"] >= args.min_overlap else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,11 +2,40 @@ from __future__ import annotations
 
 import re
 import unicodedata
-from bs4 import BeautifulSoup
-from langdetect import detect, DetectorFactory
+from html.entities import html5
+from html.parser import HTMLParser
 
+from . import config
 
-DetectorFactory.seed = 42
+# Reference extractor (and the one html_to_text used originally)
+try:
+    from bs4 import BeautifulSoup
+    _HAS_BS4 = True
+except Exception:
+    BeautifulSoup = None  # type: ignore
+    _HAS_BS4 = False
+
+# Optional C-backed HTML5 extractors (opt-in, see _engine)
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser  # type: ignore
+    _HAS_SELECTOLAX = True
+except Exception:
+    _SelectolaxParser = None  # type: ignore
+    _HAS_SELECTOLAX = False
+
+try:
+    import lxml.html  # type: ignore
+    _HAS_LXML = True
+except Exception:
+    _HAS_LXML = False
+
+try:
+    from langdetect import detect, DetectorFactory
+    DetectorFactory.seed = 42
+    _HAS_LANGDETECT = True
+except Exception:
+    detect = None  # type: ignore
+    _HAS_LANGDETECT = False
 
 
 _EMOJI_PATTERN = re.compile(
@@ -18,37 +47,237 @@ _EMOJI_PATTERN = re.compile(
     "[\u2700-\u27BF]",          # dingbats
     flags=re.UNICODE,
 )
+# Same ranges as one character class (a single scan instead of six alternatives)
+_EMOJI_CLASS = re.compile(
+    "[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\u2600-\u26FF\u2700-\u27BF]"
+)
+_QUOTE_PATTERN = re.compile(r"^>\s*>\s*>\s*>+", flags=re.MULTILINE)
 
+_SKIP_TAGS = ("script", "style")
+HTML_ENGINES = ("auto", "selectolax", "lxml", "stdlib", "bs4")
 
-def html_to_text(html: str) -> str:
+
+def _html_to_text_bs4(html: str) -> str:
     soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style"]):
+    for tag in soup(list(_SKIP_TAGS)):
         tag.extract()
     text = soup.get_text(separator="\n")
     return text
 
 
+def _entity_table() -> dict[str, str]:
+    # Names with and without the trailing ";" (first in sorted order wins), as bs4's
+    # EntitySubstitution builds HTML_ENTITY_TO_CHARACTER
+    table: dict[str, str] = {}
+    for name, char in sorted(html5.items()):
+        table.setdefault(name[:-1] if name.endswith(";") else name, char)
+    return table
+
+
+_ENTITIES = _entity_table()
+
+
+class _TextExtractor(HTMLParser):
+    """The strings get_text() returns from BeautifulSoup's html.parser tree, without building it.
+
+    Mirrors BeautifulSoupHTMLParser: character references are resolved by hand (unknown entities stay
+    literal, without their ";"; numeric references follow the WHATWG rules), adjacent
+    data is one string, CDATA sections are text, and comments, declarations, processing instructions
+    and script/style contents are dropped.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts: list[str] = []
+        self._data: list[str] = []
+        self._skip = 0
+
+    def _end_data(self) -> None:
+        if self._data:
+            if not self._skip:
+                self.parts.append("".join(self._data))
+            self._data = []
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_data()
+
+    def handle_endtag(self, tag):
+        self._end_data()
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        char = _ENTITIES.get(name)
+        self._data.append(char if char is not None else f"&{name}")
+
+    def handle_charref(self, name):
+        # The WHATWG numeric character reference rules, as applied by bs4's UnicodeDammit.
+        code = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        if code == 0 or code > 0x10FFFF or 0xD800 <= code <= 0xDFFF:
+            char = "\N{REPLACEMENT CHARACTER}"
+        elif 0x80 <= code <= 0x9F:
+            try:
+                char = bytes([code]).decode("windows-1252")
+            except UnicodeDecodeError:
+                char = chr(code)
+        else:
+            char = chr(code)
+        self._data.append(char)
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA[") and not self._skip:
+            self.parts.append(data[len("CDATA[") :])
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+
+def _html_to_text_stdlib(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return "\n".join(parser.parts)
+
+
+def _html_to_text_selectolax(html: str) -> str:
+    tree = _SelectolaxParser(html)
+    tree.strip_tags(list(_SKIP_TAGS))
+    root = tree.root
+    return root.text(separator="\n") if root is not None else ""
+
+
+def _html_to_text_lxml(html: str) -> str:
+    # Walk the tree rather than drop_tree(): dropping merges the tail into the previous text node,
+    # gluing the words on either side of a comment or script together.
+    parts: list[str] = []
+    stack = [lxml.html.document_fromstring(html)]
+    while stack:
+        el = stack.pop()
+        if isinstance(el, str):
+            parts.append(el)
+            continue
+        if el.tail:
+            stack.append(el.tail)
+        if isinstance(el.tag, str) and el.tag not in _SKIP_TAGS:  # comments and PIs have no str tag
+            stack.extend(reversed(el))
+            if el.text:
+                stack.append(el.text)
+    return "\n".join(parts)
+
+
+def _engine(name: str):
+    # auto is the stdlib extractor: it reproduces bs4's output exactly. selectolax and lxml are
+    # HTML5 parsers and resolve malformed markup differently (CDATA sections dropped, "&bogus;"
+    # kept whole, "&notit;" read as "¬it;", text either side of an ignored stray tag merged), so
+    # they are opt-in.
+    if name == "auto":
+        name = "stdlib"
+    if name == "selectolax" and _HAS_SELECTOLAX:
+        return _html_to_text_selectolax
+    if name == "lxml" and _HAS_LXML:
+        return _html_to_text_lxml
+    if name == "bs4" and _HAS_BS4:
+        return _html_to_text_bs4
+    if name not in HTML_ENGINES:
+        raise ValueError(f"Unsupported NORMALIZE_HTML_ENGINE: {name}")
+    return _html_to_text_stdlib
+
+
+def html_to_text(html: str, engine: str | None = None) -> str:
+    """Visible text of an HTML document, text nodes separated by newlines (script/style dropped).
+
+    On well-formed markup the engines differ only in whitespace between text nodes, which
+    normalize_text collapses; see _engine for where the HTML5 engines part from bs4.
+    """
+    extract = _engine(engine or config.NORMALIZE_HTML_ENGINE)
+    if extract is _html_to_text_stdlib:
+        return extract(html)
+    try:
+        return extract(html)
+    except Exception:
+        # e.g. lxml rejects empty or whitespace-only documents
+        return _html_to_text_stdlib(html)
+
+
 def strip_emojis(text: str) -> str:
-    return _EMOJI_PATTERN.sub("", text)
+    return _EMOJI_CLASS.sub("", text)
 
 
-def normalize_text(text: str, *, is_html: bool = False) -> tuple[str, str]:
-    """Return (clean_text, language_code). Handles HTML stripping, emoji removal, quote threading.
-    Quote threading: collapse more than 3 consecutive '>' to '>>>' and trim excess spaces.
+def clean_text(text: str) -> str:
+    """Newline normalization, quote threading, emoji removal and whitespace collapse.
+
+    Same result as the sequence of full-text regex passes in _clean_text_reference, but passes that
+    cannot apply are skipped and the collapse/strip is one split/join.
     """
-    if is_html:
-        text = html_to_text(text)
-    # Normalize newlines and whitespace
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if ">" in text:
+        text = _QUOTE_PATTERN.sub(">>>", text)
+    text = _EMOJI_CLASS.sub("", text)
+    # str.split() and re's \s agree on what is whitespace for str input
+    return " ".join(text.split())
+
+
+def _clean_text_reference(text: str) -> str:
     text = text.replace("\r\n", "\n").replace("\r", "\n")
-    # Simplify quote threading
     text = re.sub(r"^>\s*>\s*>\s*>+", ">>>", text, flags=re.MULTILINE)
-    # Remove emojis
-    text = strip_emojis(text)
-    # Collapse excessive whitespace
+    text = _EMOJI_PATTERN.sub("", text)
     text = re.sub(r"\s+", " ", text)
-    text = text.strip()
+    return text.strip()
+
+
+def language_sample(text: str, max_chars: int | None = None) -> str:
+    """Up to `max_chars` of whitespace-collapsed text for language detection: equal slices from the
+    start, middle and end, trimmed to whole words. Short texts are returned unchanged."""
+    max_chars = config.LANGDETECT_SAMPLE_CHARS if max_chars is None else max_chars
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    part = max_chars // 3
+    mid = (len(text) - part) // 2
+    slices = []
+    for start in (0, mid, len(text) - part):
+        s = text[start : start + part]
+        if start > 0 and " " in s:
+            s = s[s.index(" ") + 1 :]
+        if start + part < len(text) and " " in s:
+            s = s[: s.rindex(" ")]
+        slices.append(s)
+    return " ".join(s for s in slices if s)
+
+
+def detect_language(text: str) -> str:
+    if not text or not _HAS_LANGDETECT:
+        return "unknown"
     try:
-        lang = detect(text) if text else "unknown"
+        return detect(language_sample(text))
     except Exception:
-        lang = "unknown"
-    return text, lang
+        return "unknown"
+
+
+def normalize_text(text: str, *, is_html: bool = False) -> tuple[str, str]:
+    """Return (clean_text, language_code). Handles HTML stripping, emoji removal, quote threading.
+    Quote threading: collapse more than 3 consecutive '>' to '>>>' and trim excess spaces.
+    """
+    if is_html:
+        text = html_to_text(text)
+    text = clean_text(text)
+    return text, detect_language(text)
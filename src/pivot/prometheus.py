@@ -0,0 +1,207 @@
+"""Prometheus text exposition of the pivot.metrics registry, across API and worker processes.
+
+Worker processes publish their registry to Redis every METRICS_PUBLISH_INTERVAL_S and once more
+when they exit; the API's /metrics renders its own registry merged with every published one (the
+last values of exited processes included, so totals never go backwards), so one scrape target
+covers the whole deployment.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from . import config
+from . import metrics
+from .redis_client import RedisClient, redis
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PREFIX = "pivot_"
+_PROCESSES_KEY = "pivot:metrics:processes"
+_RETIRED_KEY = "pivot:metrics:retired"
+
+_redis = RedisClient(
+    "Metrics", lambda: config.METRICS_REDIS, timeout_s=1.0, fallback="serving this process's metrics only"
+)
+_process: Optional[tuple] = None
+_publisher: Optional[threading.Thread] = None
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, Any], **extra: Any) -> str:
+    items = sorted({**labels, **extra}.items())
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}" if items else ""
+
+
+def _number(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return f"{v:g}" if float(v).is_integer() and abs(v) < 1e15 else repr(float(v))
+
+
+def merge(exports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum counters and histograms with the same name and labels; gauges keep the first value."""
+    hists: Dict[tuple, Dict[str, Any]] = {}
+    counters: Dict[tuple, Dict[str, Any]] = {}
+    gauges: Dict[tuple, Dict[str, Any]] = {}
+    for exp in exports:
+        for h in exp.get("histograms", []):
+            key = (h["name"], tuple(sorted(h["labels"].items())))
+            cur = hists.get(key)
+            bounds = [le for le, _ in h["buckets"]]
+            if cur is None:
+                hists[key] = {**h, "buckets": [list(b) for b in h["buckets"]]}
+            elif [le for le, _ in cur["buckets"]] == bounds:
+                for b, (_le, n) in zip(cur["buckets"], h["buckets"]):
+                    b[1] += n
+                cur["sum"] += h["sum"]
+                cur["count"] += h["count"]
+            else:
+                logger.warning("Histogram %s has different buckets across processes; keeping the first", h["name"])
+        for c in exp.get("counters", []):
+            key = (c["name"], tuple(sorted(c["labels"].items())))
+            if key in counters:
+                counters[key]["value"] += c["value"]
+            else:
+                counters[key] = dict(c)
+        for g in exp.get("gauges", []):
+            gauges.setdefault((g["name"], tuple(sorted(g["labels"].items()))), g)
+    return {"histograms": list(hists.values()), "counters": list(counters.values()), "gauges": list(gauges.values())}
+
+
+def render(export: Dict[str, Any]) -> str:
+    """Exposition-format text for one (merged) export."""
+    lines: List[str] = []
+    seen = set()
+
+    def header(name: str, kind: str, description: str) -> None:
+        if name not in seen:
+            seen.add(name)
+            if description:
+                lines.append(f"# HELP {name} {_escape(description)}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for h in sorted(export.get("histograms", []), key=lambda x: x["name"]):
+        name = PREFIX + h["name"]
+        header(name, "histogram", h["description"])
+        for le, n in h["buckets"]:
+            lines.append(f"{name}_bucket{_labels(h['labels'], le=_number(le))} {_number(n)}")
+        lines.append(f"{name}_sum{_labels(h['labels'])} {_number(h['sum'])}")
+        lines.append(f"{name}_count{_labels(h['labels'])} {_number(h['count'])}")
+    for c in sorted(export.get("counters", []), key=lambda x: x["name"]):
+        name = PREFIX + c["name"] + "_total"
+        header(name, "counter", c["description"])
+        lines.append(f"{name}{_labels(c['labels'])} {_number(c['value'])}")
+    for g in sorted(export.get("gauges", []), key=lambda x: x["name"]):
+        if g["value"] is None:
+            continue
+        name = PREFIX + g["name"]
+        header(name, "gauge", g["description"])
+        lines.append(f"{name}{_labels(g['labels'])} {_number(g['value'])}")
+    return "\n".join(lines) + "\n"
+
+
+# -- cross-process publishing ----------------------------------------------------------------------
+def _process_id() -> str:
+    """Hash field for this process; the start time keeps a reused pid from overwriting a dead process."""
+    global _process
+    if _process is None or _process[0] != os.getpid():
+        _process = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{time.time():.6f}")
+    return _process[1]
+
+
+def publish() -> bool:
+    """Write this process's counters and histograms to Redis (gauges stay local)."""
+    client = _redis.get()
+    if client is None:
+        return False
+    client.hset(_PROCESSES_KEY, _process_id(), json.dumps({"ts": time.time(), "export": metrics.export(gauges=False)}))
+    return True
+
+
+def _publish_loop() -> None:
+    while True:
+        time.sleep(config.METRICS_PUBLISH_INTERVAL_S)
+        try:
+            publish()
+        except Exception as e:
+            logger.warning("Publishing metrics to redis failed: %s", e)
+
+
+def start_publisher() -> None:
+    """Publish this process's metrics periodically (called in each worker process)."""
+    global _publisher
+    if _publisher is None or not _publisher.is_alive():
+        _publisher = threading.Thread(target=_publish_loop, name="pivot-metrics-publish", daemon=True)
+        _publisher.start()
+
+
+def _retire(client, stale: List[bytes]) -> None:
+    """Fold the last exports of processes that stopped publishing into the retired total, atomically,
+    so the merged series never drop (concurrent collectors retry on the WATCH and find nothing left)."""
+    with client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(_RETIRED_KEY)
+                values = pipe.hmget(_PROCESSES_KEY, stale)
+                gone = [(f, v) for f, v in zip(stale, values) if v]
+                if not gone:
+                    return
+                retired = pipe.get(_RETIRED_KEY)
+                exports = ([json.loads(retired)] if retired else []) + [json.loads(v)["export"] for _f, v in gone]
+                pipe.multi()
+                pipe.set(_RETIRED_KEY, json.dumps(merge(exports)))
+                pipe.hdel(_PROCESSES_KEY, *[f for f, _v in gone])
+                pipe.execute()
+                return
+            except redis.WatchError:
+                continue
+
+
+def collect() -> List[Dict[str, Any]]:
+    """Exports published by other processes, including the final values of processes that exited.
+
+    A process's last export stays in the hash (and in the totals) after it dies; once it is older than
+    METRICS_RETIRE_AFTER_S it is merged into one retired export, like prometheus_client's
+    multiprocess mode keeps the counters of dead workers.
+    """
+    client = _redis.get()
+    if client is None:
+        return []
+    try:
+        with client.pipeline(transaction=True) as pipe:
+            retired, published = pipe.get(_RETIRED_KEY).hgetall(_PROCESSES_KEY).execute()
+    except Exception as e:
+        _redis.failed(e)
+        return []
+    own = _process_id().encode()
+    cutoff = time.time() - max(config.METRICS_RETIRE_AFTER_S, config.METRICS_PUBLISH_INTERVAL_S * 3)
+    exports = [json.loads(retired)] if retired else []
+    stale = []
+    for field, value in published.items():
+        entry = json.loads(value)
+        if field != own:
+            exports.append(entry["export"])
+        if entry["ts"] < cutoff:
+            stale.append(field)
+    if stale:
+        try:
+            _retire(client, stale)
+        except Exception as e:
+            logger.warning("Retiring metrics of exited processes failed: %s", e)
+    return exports
+
+
+def render_all() -> str:
+    """This process's metrics merged with those published by workers."""
+    return render(merge([metrics.export()] + collect()))
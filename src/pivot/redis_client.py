@@ -0,0 +1,62 @@
+"""Lazily created redis clients (REDIS_URL) with a back-off after errors.
+
+The query embedding cache, the response cache's project generations and the cross-process metrics
+each hold one `RedisClient`; after a failed command its `get()` returns None for `backoff_s`, so a
+redis outage costs one timeout per back-off period instead of one per request.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable
+
+try:
+    import redis  # type: ignore
+    _HAS_REDIS = True
+except Exception:
+    redis = None  # type: ignore
+    _HAS_REDIS = False
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class RedisClient:
+    """`enabled` is read on every call (the config flag of the feature); `fallback` completes the
+    warning logged on errors ("redis unavailable, <fallback> for 30s")."""
+
+    def __init__(
+        self,
+        name: str,
+        enabled: Callable[[], bool],
+        *,
+        timeout_s: float,
+        fallback: str,
+        backoff_s: float = 30.0,
+    ):
+        self.name = name
+        self._enabled = enabled
+        self.timeout_s = timeout_s
+        self.fallback = fallback
+        self.backoff_s = backoff_s
+        self._client = None
+        self._down_until = 0.0
+
+    def configured(self) -> bool:
+        """redis-py is installed and the feature is switched on (the server may still be down)."""
+        return _HAS_REDIS and self._enabled()
+
+    def get(self):
+        """The client, or None when not configured or backing off after an error."""
+        if not self.configured() or time.monotonic() < self._down_until:
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                config.REDIS_URL, socket_timeout=self.timeout_s, socket_connect_timeout=self.timeout_s
+            )
+        return self._client
+
+    def failed(self, e: Exception) -> None:
+        self._down_until = time.monotonic() + self.backoff_s
+        logger.warning("%s: redis unavailable, %s for %gs (%s)", self.name, self.fallback, self.backoff_s, e)
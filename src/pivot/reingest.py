@@ -0,0 +1,45 @@
+"""Chunk-level diff for re-ingesting a changed document in place (ingest mode "update")."""
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Tuple
+
+from .embedding_store import content_hash
+
+# (chunk_id, idx, start_offset, end_offset, content_hash) as stored
+StoredChunk = Tuple[str, int, int, int, str]
+# (idx, text, token_count, start_offset, end_offset, ...) as produced by the chunker
+NewChunk = tuple
+
+
+@dataclass
+class ChunkDiff:
+    kept: List[Tuple[str, int]] = field(default_factory=list)  # (chunk_id, new idx): text unchanged
+    repositioned: List[Tuple[str, int, int, int]] = field(default_factory=list)  # (chunk_id, idx, start, end)
+    added: List[NewChunk] = field(default_factory=list)  # new or modified text: store and embed
+    moved: List[Tuple[str, int]] = field(default_factory=list)  # kept, idx changed: vector row carries the old idx
+    stale: List[str] = field(default_factory=list)  # stored chunk ids no longer in the document
+
+
+def diff_chunks(stored: Iterable[StoredChunk], new: Iterable[NewChunk]) -> ChunkDiff:
+    """Match new chunks to stored ones by content hash (in order, so repeated text pairs up
+    one-to-one). Matched chunks keep their id and vector; the rest are added or stale."""
+    by_hash: Dict[str, Deque[StoredChunk]] = defaultdict(deque)
+    for row in sorted(stored, key=lambda r: r[1]):
+        by_hash[row[4]].append(row)
+    diff = ChunkDiff()
+    for chunk in new:
+        idx, text, _tok, start, end = chunk[:5]
+        candidates = by_hash.get(content_hash(text))
+        if not candidates:
+            diff.added.append(chunk)
+            continue
+        cid, old_idx, old_start, old_end, _h = candidates.popleft()
+        diff.kept.append((cid, idx))
+        if (old_idx, old_start, old_end) != (idx, start, end):
+            diff.repositioned.append((cid, idx, start, end))
+        if old_idx != idx:
+            diff.moved.append((cid, idx))
+    diff.stale = [row[0] for rows in by_hash.values() for row in rows]
+    return diff
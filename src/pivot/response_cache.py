@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+try:
+    import numpy as np
+except Exception:
+    np = None  # type: ignore
+
+from . import config
+from . import metrics
+from .redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+_HITS = metrics.counter("response_cache_hits")
+_MISSES = metrics.counter("response_cache_misses")
+_INVALIDATIONS = metrics.counter("response_cache_invalidations")
+
+
+@dataclass
+class _Entry:
+    vector: Any  # unit query vector (numpy array when available)
+    terms: FrozenSet[str]
+    response: Dict[str, Any]
+    generation: int
+    expires: float
+
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can could do does for from how i in is it me my of on or our should "
+    "the their this to was we what when where which who why will with would you your".split()
+)
+
+
+def query_terms(text: str) -> FrozenSet[str]:
+    """Content words of a query. Embedders put "reset password on Android" and "... on iOS" well
+    above any usable cosine threshold, so a hit also needs the same content words."""
+    return frozenset(w for w in _WORD.findall(text.casefold()) if w not in _STOPWORDS)
+
+
+def _unit(vec: List[float]):
+    if np is not None:
+        v = np.asarray(vec, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n > 0 else v
+    n = sum(x * x for x in vec) ** 0.5
+    return [x / n for x in vec] if n > 0 else list(vec)
+
+
+class ResponseCache:
+    """Answers keyed by query embedding: a lookup hits when a cached query of the same project (and
+    top_k), with the same content words, is within `threshold` cosine similarity.
+
+    Each entry records the project's generation as read before its answer was computed; ingest
+    bumps the generation, so entries from before new or changed documents are never served, even
+    when the invalidation lands while the answer is being generated.
+    """
+
+    def __init__(self, *, threshold: float, ttl: float, max_per_project: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_project = max(1, max_per_project)
+        self._entries: Dict[Tuple[str, int], "OrderedDict[int, _Entry]"] = {}
+        self._matrix: Dict[Tuple[str, int], Tuple[Any, List[int]]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(
+        self, project_id: str, top_k: int, query: str, query_vector: List[float], generation: int
+    ) -> Optional[Dict[str, Any]]:
+        key = (project_id, top_k)
+        terms = query_terms(query)
+        q = _unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._entries.get(key)
+            if not bucket:
+                _MISSES.inc()
+                return None
+            stale = [eid for eid, e in bucket.items() if e.expires <= now or e.generation != generation]
+            for eid in stale:
+                del bucket[eid]
+            if stale:
+                self._matrix.pop(key, None)
+            best_id, best = self._nearest(key, bucket, q, terms)
+            if best_id is None:
+                _MISSES.inc()
+                return None
+            bucket.move_to_end(best_id)
+            entry = bucket[best_id]
+        _HITS.inc()
+        resp = entry.response
+        return {**resp, "results": [dict(r) for r in resp.get("results", [])], "cache_similarity": round(best, 6)}
+
+    def _nearest(self, key, bucket: "OrderedDict[int, _Entry]", q, terms: FrozenSet[str]) -> Tuple[Optional[int], float]:
+        """The most similar entry with the same content words, if it is within the threshold."""
+        if not bucket:
+            return None, -1.0
+        if np is not None:
+            cached = self._matrix.get(key)
+            if cached is None:
+                ids = list(bucket)
+                cached = self._matrix[key] = (np.stack([bucket[i].vector for i in ids]), ids)
+            mat, ids = cached
+            if mat.shape[1] != len(q):
+                return None, -1.0
+            sims = mat @ q
+            matches = [pos for pos in np.flatnonzero(sims >= self.threshold) if bucket[ids[pos]].terms == terms]
+            if not matches:
+                return None, -1.0
+            pos = max(matches, key=lambda p: sims[p])
+            return ids[pos], float(sims[pos])
+        best_id, best = None, -1.0
+        for eid, e in bucket.items():
+            if len(e.vector) == len(q) and e.terms == terms:
+                sim = sum(a * b for a, b in zip(e.vector, q))
+                if sim >= self.threshold and sim > best:
+                    best_id, best = eid, sim
+        return best_id, best
+
+    def store(
+        self,
+        project_id: str,
+        top_k: int,
+        query: str,
+        query_vector: List[float],
+        response: Dict[str, Any],
+        generation: int,
+    ) -> None:
+        """Cache `response`, computed from the project as of `generation` (read before retrieval)."""
+        response = {**response, "results": [dict(r) for r in response.get("results", [])]}
+        entry = _Entry(_unit(query_vector), query_terms(query), response, generation, time.monotonic() + self.ttl)
+        key = (project_id, top_k)
+        with self._lock:
+            bucket = self._entries.setdefault(key, OrderedDict())
+            self._next_id += 1
+            bucket[self._next_id] = entry
+            while len(bucket) > self.max_per_project:
+                bucket.popitem(last=False)
+            self._matrix.pop(key, None)
+
+    def forget(self, project_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == project_id]:
+                del self._entries[key]
+                self._matrix.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = sum(len(b) for b in self._entries.values())
+        return {
+            "size": size,
+            "hits": _HITS.value,
+            "misses": _MISSES.value,
+            "invalidations": _INVALIDATIONS.value,
+            "threshold": self.threshold,
+        }
+
+
+# -- project generations -------------------------------------------------------------------------
+# Ingest runs in worker processes, so a generation kept in this process would never see it: without
+# the shared counter in redis nothing is cached or served.
+_redis = RedisClient(
+    "Response cache",
+    lambda: config.RESPONSE_CACHE_REDIS,
+    timeout_s=config.RESPONSE_CACHE_REDIS_TIMEOUT_S,
+    fallback="not caching responses",
+)
+
+
+def project_generation(project_id: str) -> Optional[int]:
+    """The project's shared generation, or None when redis is not available."""
+    client = _redis.get()
+    if client is None:
+        return None
+    try:
+        return int(client.get(f"pivot:gen:{project_id}") or 0)
+    except Exception as e:
+        _redis.failed(e)
+        return None
+
+
+def invalidate_project(project_id: str) -> None:
+    """Mark every cached response of the project stale (called when its documents change)."""
+    _INVALIDATIONS.inc()
+    _cache.forget(project_id)
+    client = _redis.get()
+    if client is not None:
+        try:
+            client.incr(f"pivot:gen:{project_id}")
+        except Exception as e:
+            _redis.failed(e)
+
+
+_cache = ResponseCache(
+    threshold=config.RESPONSE_CACHE_THRESHOLD,
+    ttl=config.RESPONSE_CACHE_TTL_S,
+    max_per_project=config.RESPONSE_CACHE_MAX_PER_PROJECT,
+)
+
+
+def enabled() -> bool:
+    return config.RESPONSE_CACHE and _redis.configured()
+
+
+def generation(project_id: str) -> Optional[int]:
+    """The project's generation, to be read before retrieval and passed to `lookup` and `store`
+    (None when the cache is off or redis is unavailable, which makes both no-ops)."""
+    return project_generation(project_id) if enabled() else None
+
+
+def lookup(
+    project_id: str, top_k: int, query: str, query_vector: List[float], generation: Optional[int]
+) -> Optional[Dict[str, Any]]:
+    if generation is None:
+        return None
+    return _cache.lookup(project_id, top_k, query, query_vector, generation)
+
+
+def store(
+    project_id: str,
+    top_k: int,
+    query: str,
+    query_vector: List[float],
+    response: Dict[str, Any],
+    generation: Optional[int],
+) -> None:
+    if generation is not None:
+        _cache.store(project_id, top_k, query, query_vector, response, generation)
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
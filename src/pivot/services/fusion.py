@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+Hit = Tuple[str, float, str, int]  # (chunk_id, score, doc_id, idx)
+FusedHit = Tuple[str, Optional[float], str, int, float]  # (chunk_id, score, doc_id, idx, fused_score)
+
+
+def reciprocal_rank_fusion(
+    ranked: Sequence[Sequence[Hit]],
+    weights: Optional[Sequence[float]] = None,
+    *,
+    k: int = 60,
+    limit: Optional[int] = None,
+) -> List[FusedHit]:
+    """Merge ranked hit lists by weighted reciprocal rank: fused_score = sum(w / (k + rank)).
+
+    Only ranks are used, so lists with incomparable scores (cosine, ts_rank) combine safely.
+    Returns (chunk_id, score, doc_id, idx, fused_score), best first, where `score` is the chunk's
+    score in the first list (the vector search; None for chunks only the other lists found).
+    """
+    weights = list(weights) if weights is not None else [1.0] * len(ranked)
+    fused: Dict[str, float] = {}
+    meta: Dict[str, Tuple[str, int]] = {}
+    primary = {h[0]: h[1] for h in ranked[0]} if ranked else {}
+    for hits, weight in zip(ranked, weights):
+        if weight <= 0:
+            continue
+        for rank, (chunk_id, _score, doc_id, idx) in enumerate(hits, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (k + rank)
+            meta.setdefault(chunk_id, (doc_id, idx))
+    order = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [(cid, primary.get(cid), meta[cid][0], meta[cid][1], fused[cid]) for cid in order]
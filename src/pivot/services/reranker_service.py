@@ -1,12 +1,22 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any
+from collections import Counter
+from typing import List, Dict, Any, Optional
+import hashlib
 import logging
+import math
+import re
 
 from .. import config
+from ..cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+try:
+    import numpy as np
+except Exception:
+    np = None  # type: ignore
+
 # Try to import CrossEncoder from sentence_transformers (optional, best-effort)
 try:
     from sentence_transformers.cross_encoder import CrossEncoder
@@ -16,74 +26,297 @@ except Exception:
     _HAS_CROSS = False
 
 
+# (model, backend, query hash, chunk_id) -> cross-encoder score, shared by all Reranker instances
+_score_cache = TTLCache(maxsize=config.RERANK_CACHE_SIZE, ttl=config.RERANK_CACHE_TTL_S, name="rerank_scores")
+
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _terms(text: str) -> List[str]:
+    return _TERM_RE.findall(text.lower())
+
+
+def lexical_scores(query: str, texts: List[str], *, k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """BM25 of each text against the query terms, with idf over the candidate set, scaled to [0, 1]."""
+    qterms = list(dict.fromkeys(_terms(query)))
+    if not qterms or not texts:
+        return [0.0] * len(texts)
+    tf, lengths = [], []
+    for text in texts:
+        counts = Counter(_terms(text))
+        tf.append([counts.get(t, 0) for t in qterms])
+        lengths.append(sum(counts.values()))
+    n = len(texts)
+    if np is not None:
+        tfm = np.asarray(tf, dtype=np.float32)
+        dl = np.asarray(lengths, dtype=np.float32)
+        df = (tfm > 0).sum(axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        norm = k1 * (1.0 - b + b * dl / max(float(dl.mean()), 1.0))
+        scores = ((tfm * (k1 + 1.0)) / (tfm + norm[:, None]) * idf).sum(axis=1)
+        top = float(scores.max())
+        return (scores / top).tolist() if top > 0 else scores.tolist()
+    avgdl = max(sum(lengths) / n, 1.0)
+    idf = [math.log1p((n - df + 0.5) / (df + 0.5)) for df in (sum(1 for row in tf if row[j]) for j in range(len(qterms)))]
+    scores = []
+    for row, dl in zip(tf, lengths):
+        norm = k1 * (1.0 - b + b * dl / avgdl)
+        scores.append(sum(w * f * (k1 + 1.0) / (f + norm) for w, f in zip(idf, row)))
+    top = max(scores)
+    return [x / top for x in scores] if top > 0 else scores
+
+
+def _cosines(qvec: List[float], vecs: List[List[float]]) -> List[float]:
+    """Cosine of `qvec` against every row of `vecs` (one matrix-vector product with numpy)."""
+    if np is not None:
+        m = np.asarray(vecs, dtype=np.float32)
+        q = np.asarray(qvec, dtype=np.float32)
+        denom = np.linalg.norm(m, axis=1) * float(np.linalg.norm(q))
+        return (m @ q / np.where(denom == 0, 1.0, denom)).tolist()
+    qn = math.sqrt(sum(x * x for x in qvec))
+    out = []
+    for v in vecs:
+        vn = math.sqrt(sum(x * x for x in v))
+        out.append(sum(x * y for x, y in zip(qvec, v)) / (qn * vn) if qn and vn else 0.0)
+    return out
+
+
 class Reranker:
     def __init__(self, model_name: str | None = None):
         self.model_name = model_name or config.getenv("RERANKER_MODEL") or "BAAI/bge-reranker-v2-m3"
+        self.max_length = config.RERANK_MAX_LENGTH
+        self.batch_size = config.RERANK_BATCH_SIZE
+        self.max_batch_tokens = config.RERANK_MAX_BATCH_TOKENS
         self._cross = None
-        if _HAS_CROSS:
+        if config.MODEL_BACKEND == "onnx":
+            try:
+                from ..model_backends import load_cross_encoder
+
+                self._cross = load_cross_encoder(self.model_name, max_length=self.max_length)
+            except Exception as e:
+                logger.warning("ONNX cross-encoder for %s unavailable (%s); falling back to sentence-transformers", self.model_name, e)
+        if self._cross is None and _HAS_CROSS:
             try:
-                self._cross = CrossEncoder(self.model_name)
+                self._cross = CrossEncoder(self.model_name, max_length=self.max_length)
             except Exception as e:
                 logger.warning("Failed to load CrossEncoder %s: %s", self.model_name, e)
                 self._cross = None
 
-    def _embed_rescore(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        # Fallback: try to compute embeddings for snippets if embedding module available
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count per text (capped at max_length); character count when no tokenizer is exposed."""
+        tok = getattr(self._cross, "tokenizer", None)
+        if tok is not None:
+            try:
+                enc = tok(texts, add_special_tokens=False, truncation=True, max_length=self.max_length)
+                return [len(ids) for ids in enc["input_ids"]]
+            except Exception as e:
+                logger.debug("Tokenizer length probe failed (%s); using character lengths", e)
+        return [min(len(t), self.max_length) for t in texts]
+
+    def _length_buckets(self, lengths: List[int]) -> List[List[int]]:
+        """Group indices into batches of similar length so padding stays small.
+
+        A batch closes when it reaches batch_size pairs or its padded size (pairs x longest pair)
+        would exceed max_batch_tokens.
+        """
+        batches: List[List[int]] = []
+        cur: List[int] = []
+        cur_max = 0
+        for i in sorted(range(len(lengths)), key=lengths.__getitem__):
+            longest = max(cur_max, lengths[i])
+            if cur and (len(cur) >= self.batch_size or longest * (len(cur) + 1) > self.max_batch_tokens):
+                batches.append(cur)
+                cur, longest = [], lengths[i]
+            cur.append(i)
+            cur_max = longest
+        if cur:
+            batches.append(cur)
+        return batches
+
+    def _cross_scores(self, query: str, candidates: List[Dict[str, Any]]) -> List[float]:
+        """Cross-encoder scores in candidate order, served from the score cache where possible."""
+        return self._cross_scores_many([query], [candidates])[0]
+
+    def _cross_scores_many(self, queries: List[str], candidate_lists: List[List[Dict[str, Any]]]) -> List[List[float]]:
+        """Score every (query, candidate) pair; uncached pairs of all queries share the length buckets."""
+        backend = type(self._cross).__name__
+        scores: List[List[Optional[float]]] = []
+        keys: List[List[Optional[tuple]]] = []
+        todo: List[tuple] = []  # (query position, candidate position)
+        for qi, (query, candidates) in enumerate(zip(queries, candidate_lists)):
+            qhash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+            qkeys = [(self.model_name, backend, qhash, c.get("chunk_id")) if c.get("chunk_id") else None for c in candidates]
+            qscores = [_score_cache.get(k) if k else None for k in qkeys]
+            keys.append(qkeys)
+            scores.append(qscores)
+            todo.extend((qi, ci) for ci, sc in enumerate(qscores) if sc is None)
+        if todo:
+            texts = [candidate_lists[qi][ci].get("snippet", "") or "" for qi, ci in todo]
+            qlens = self._token_lengths(queries)
+            lengths = [min(qlens[qi] + n, self.max_length) for (qi, _ci), n in zip(todo, self._token_lengths(texts))]
+            for bucket in self._length_buckets(lengths):
+                pairs = [(queries[todo[j][0]], texts[j]) for j in bucket]
+                out = self._cross.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+                for j, score in zip(bucket, out):
+                    qi, ci = todo[j]
+                    scores[qi][ci] = float(score)
+                    if keys[qi][ci]:
+                        _score_cache.set(keys[qi][ci], scores[qi][ci])
+        return [[float(sc) for sc in qscores] for qscores in scores]
+
+    def _stored_vectors(self, candidates: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+        """Candidate vectors from the vector store, then the content-addressed embedding store; never re-embeds."""
+        out: List[Optional[List[float]]] = [None] * len(candidates)
+        ids = [c.get("chunk_id") for c in candidates]
         try:
-            from ..embedding import embed_query as _embed_query, embed_texts as _embed_texts
-            qvec = _embed_query(query)
-            snippets = [c.get("snippet", "") for c in candidates]
-            vecs = _embed_texts(snippets)
-            # cosine similarity
-            import math
-
-            def cosine(a, b):
-                ad = sum(x * y for x, y in zip(a, b))
-                an = math.sqrt(sum(x * x for x in a))
-                bn = math.sqrt(sum(x * x for x in b))
-                if an == 0 or bn == 0:
-                    return 0.0
-                return ad / (an * bn)
-
-            for c, v in zip(candidates, vecs):
-                c["rerank_score"] = float(cosine(qvec, v))
-            return sorted(candidates, key=lambda x: x.get("rerank_score", 0.0), reverse=True)
+            from ..adapters import milvus_adapter
+
+            found = milvus_adapter.get_vectors([cid for cid in ids if cid])
+            for k, cid in enumerate(ids):
+                out[k] = found.get(cid) if cid else None
         except Exception as e:
-            logger.info("Embedding-based rescoring not available (%s), falling back to simple scorer", e)
-            # Simple fallback: score by overlap of words / length heuristic
-            qtokens = set(query.lower().split())
-            for c in candidates:
-                txt = (c.get("snippet", "") or "").lower()
-                score = sum(1 for t in txt.split() if t in qtokens)
-                # normalize by length
-                denom = max(1, len(txt.split()))
-                c["rerank_score"] = float(score) / denom
-            return sorted(candidates, key=lambda x: x.get("rerank_score", 0.0), reverse=True)
-
-    def rerank(self, query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Return candidates reordered with an added `rerank_score` field (higher is better)."""
+            logger.info("Vector store lookup for rescoring failed: %s", e)
+        # Only untruncated snippets hash to the stored chunk text
+        snippets = [c.get("snippet", "") or "" for c in candidates]
+        rest = [k for k, v in enumerate(out) if v is None and snippets[k] and len(snippets[k]) < config.SNIPPET_MAX_CHARS]
+        if rest:
+            try:
+                from ..embedding_store import lookup_vectors
+
+                for pos, vec in lookup_vectors([snippets[k] for k in rest]).items():
+                    out[rest[pos]] = vec
+            except Exception as e:
+                logger.info("Embedding store lookup for rescoring failed: %s", e)
+        return out
+
+    def _embed_rescore(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        query_vector: Optional[List[float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Fallback scorer: cosine against stored candidate vectors blended with a BM25 lexical score.
+
+        Candidates without a stored vector get the mean dense score of the others; with no vectors at
+        all the ranking is purely lexical.
+        """
+        lex = lexical_scores(query, [c.get("snippet", "") or "" for c in candidates])
+        dense: List[Optional[float]] = [None] * len(candidates)
+        vecs = self._stored_vectors(candidates)
+        if any(v is not None for v in vecs):
+            try:
+                if query_vector is None:
+                    from ..embedding import embed_query as _embed_query
+
+                    query_vector = _embed_query(query)
+                have = [i for i, v in enumerate(vecs) if v is not None and len(v) == len(query_vector)]
+                if have:
+                    for i, sim in zip(have, _cosines(query_vector, [vecs[i] for i in have])):
+                        dense[i] = float(sim)
+            except Exception as e:
+                logger.info("Dense rescoring not available (%s), using lexical score only", e)
+
+        known = [d for d in dense if d is not None]
+        w = config.RERANK_FALLBACK_LEXICAL_WEIGHT if known else 1.0
+        prior = sum(known) / len(known) if known else 0.0
+        for c, d, lx in zip(candidates, dense, lex):
+            c["rerank_score"] = float((1.0 - w) * (prior if d is None else d) + w * lx)
+        return sorted(candidates, key=lambda x: x.get("rerank_score", 0.0), reverse=True)
+
+    def rerank(
+        self,
+        query: str,
+        candidates: List[Dict[str, Any]],
+        *,
+        top_m: Optional[int] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return candidates reordered with an added `rerank_score` field (higher is better).
+
+        Only the first `top_m` candidates (default RERANK_TOP_M; 0 = all) are scored; the rest keep
+        their retrieval order after them with rerank_score=None. `query_vector` lets the fallback
+        scorer reuse the query embedding the caller already has.
+        """
         if not candidates:
             return []
+        top_m = config.RERANK_TOP_M if top_m is None else top_m
+        head, tail = (candidates[:top_m], candidates[top_m:]) if top_m and top_m > 0 else (candidates, [])
+        for c in tail:
+            c["rerank_score"] = None
         # Prefer cross-encoder scoring when available
         if self._cross is not None:
             try:
-                # cross encoder expects list of pairs (query, text)
-                pairs = [(query, c.get("snippet", "")) for c in candidates]
-                scores = self._cross.predict(pairs)
-                for c, s in zip(candidates, scores):
-                    c["rerank_score"] = float(s)
+                for c, s in zip(head, self._cross_scores(query, head)):
+                    c["rerank_score"] = s
                 # Higher is better in CrossEncoder
-                return sorted(candidates, key=lambda x: x.get("rerank_score", 0.0), reverse=True)
+                return sorted(head, key=lambda x: x.get("rerank_score", 0.0), reverse=True) + tail
             except Exception as e:
                 logger.warning("CrossEncoder scoring failed: %s", e)
                 # fallback to embed rescore
         # Fallback
-        return self._embed_rescore(query, candidates)
+        return self._embed_rescore(query, head, query_vector) + tail
+
+    def rerank_many(
+        self,
+        queries: List[str],
+        candidate_lists: List[List[Dict[str, Any]]],
+        *,
+        top_m: Optional[int] = None,
+        query_vectors: Optional[List[Optional[List[float]]]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """`rerank` for several queries at once: cross-encoder pairs of all queries are batched together.
+
+        Candidate dicts must not be shared between lists (each gets its own rerank_score).
+        """
+        top_m = config.RERANK_TOP_M if top_m is None else top_m
+        query_vectors = query_vectors or [None] * len(queries)
+        heads, tails = [], []
+        for candidates in candidate_lists:
+            head, tail = (candidates[:top_m], candidates[top_m:]) if top_m and top_m > 0 else (candidates, [])
+            for c in tail:
+                c["rerank_score"] = None
+            heads.append(head)
+            tails.append(tail)
+        if self._cross is not None:
+            try:
+                out = []
+                for head, tail, qscores in zip(heads, tails, self._cross_scores_many(queries, heads)):
+                    for c, sc in zip(head, qscores):
+                        c["rerank_score"] = sc
+                    out.append(sorted(head, key=lambda x: x.get("rerank_score", 0.0), reverse=True) + tail)
+                return out
+            except Exception as e:
+                logger.warning("CrossEncoder scoring failed: %s", e)
+        return [
+            (self._embed_rescore(q, head, qv) if head else []) + tail
+            for q, head, tail, qv in zip(queries, heads, tails, query_vectors)
+        ]
 
 
 # module-level default
 _default_reranker = Reranker()
 
 
-def rerank(query: str, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    return _default_reranker.rerank(query, candidates)
+def rerank(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    *,
+    top_m: Optional[int] = None,
+    query_vector: Optional[List[float]] = None,
+) -> List[Dict[str, Any]]:
+    return _default_reranker.rerank(query, candidates, top_m=top_m, query_vector=query_vector)
+
+
+def rerank_many(
+    queries: List[str],
+    candidate_lists: List[List[Dict[str, Any]]],
+    *,
+    top_m: Optional[int] = None,
+    query_vectors: Optional[List[Optional[List[float]]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    return _default_reranker.rerank_many(queries, candidate_lists, top_m=top_m, query_vectors=query_vectors)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _score_cache.stats()
@@ -0,0 +1,114 @@
+"""Per-stage timing for the query and ingest pipelines, with optional OpenTelemetry spans.
+
+`stage("query", "search")` records `query_stage_ms{stage="search"}` and, when OTEL_ENABLED and
+opentelemetry is installed, wraps the stage in a span. `inject`/`attach` carry the trace context
+through Celery message headers so worker spans join the trace of the /ingest request.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import context as otel_context  # type: ignore
+    from opentelemetry import propagate, trace  # type: ignore
+    _HAS_OTEL = True
+except Exception:
+    otel_context = None  # type: ignore
+    propagate = None  # type: ignore
+    trace = None  # type: ignore
+    _HAS_OTEL = False
+
+from . import config
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper buckets cover LLM generation and whole-document ingest stages
+STAGE_MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return _HAS_OTEL and config.OTEL_ENABLED
+
+
+def _configure_sdk() -> None:
+    """Install an OTLP-exporting tracer provider unless the application already set one."""
+    try:
+        from opentelemetry.sdk.resources import Resource  # type: ignore
+        from opentelemetry.sdk.trace import TracerProvider  # type: ignore
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor  # type: ignore
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter  # type: ignore
+    except Exception:
+        logger.info("opentelemetry-sdk/exporter not installed; spans go to the globally configured provider")
+        return
+    if type(trace.get_tracer_provider()).__name__ != "ProxyTracerProvider":
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": config.OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _configure_sdk()
+                _tracer = trace.get_tracer("pivot")
+    return _tracer
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Any]]:
+    """A span named `name` under the current context (a no-op yielding None when tracing is off)."""
+    if not enabled():
+        yield None
+        return
+    with get_tracer().start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None}) as s:
+        yield s
+
+
+def _stage_histogram(pipeline: str, name: str) -> metrics.Histogram:
+    return metrics.histogram(
+        f"{pipeline}_stage_ms",
+        buckets=STAGE_MS_BUCKETS,
+        description=f"Duration of each {pipeline} pipeline stage",
+        labels={"stage": name},
+    )
+
+
+@contextmanager
+def stage(pipeline: str, name: str, **attributes: Any) -> Iterator[None]:
+    """Time one pipeline stage into `<pipeline>_stage_ms{stage=name}`, inside a span when tracing is on."""
+    with span(f"{pipeline}.{name}", **attributes):
+        with _stage_histogram(pipeline, name).time_ms():
+            yield
+
+
+def observe(pipeline: str, name: str, ms: float) -> None:
+    """Record a stage duration measured by the caller (for stages that cannot be one `with` block)."""
+    _stage_histogram(pipeline, name).observe(ms)
+
+
+def inject(carrier: Dict[str, Any]) -> None:
+    """Write the current trace context into `carrier` (e.g. Celery message headers)."""
+    if enabled():
+        propagate.inject(carrier)
+
+
+def attach(carrier: Optional[Dict[str, Any]]):
+    """Make the trace context in `carrier` current; returns a token for `detach` (None when off)."""
+    if not enabled() or not carrier:
+        return None
+    return otel_context.attach(propagate.extract(carrier))
+
+
+def detach(token) -> None:
+    if token is not None:
+        otel_context.detach(token)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import logging
 import os
+import time
 
 try:
     from celery import Celery
@@ -18,6 +20,76 @@ try:
         task_soft_time_limit=540,
     )
 
+    from celery import signals
+    from .. import metrics, prometheus, tracing
+
+    # Queue wait (publish to start) and run time per task; the publish time and the trace context of
+    # the enqueuing request travel in the message headers
+    _ENQUEUED_AT = "pivot_enqueued_at"
+    _active: dict = {}
+
+    @signals.before_task_publish.connect
+    def _stamp_headers(sender=None, headers=None, **_kw):
+        if headers is not None:
+            headers[_ENQUEUED_AT] = time.time()
+            tracing.inject(headers)
+
+    @signals.task_prerun.connect
+    def _task_started(task_id=None, task=None, **_kw):
+        request = task.request
+        enqueued_at = getattr(request, _ENQUEUED_AT, None)
+        if enqueued_at is not None:
+            metrics.histogram(
+                "task_queue_wait_ms",
+                buckets=tracing.STAGE_MS_BUCKETS,
+                description="Time from enqueue to task start",
+                labels={"task": task.name},
+            ).observe(max(0.0, (time.time() - float(enqueued_at)) * 1000.0))
+        token = tracing.attach({k: getattr(request, k) for k in ("traceparent", "tracestate") if getattr(request, k, None)})
+        span = tracing.span(f"task.{task.name}", task_id=task_id)
+        span.__enter__()
+        _active[task_id] = (time.perf_counter(), token, span)
+
+    @signals.task_postrun.connect
+    def _task_finished(task_id=None, task=None, **_kw):
+        started = _active.pop(task_id, None)
+        if started is None:
+            return
+        t0, token, span = started
+        span.__exit__(None, None, None)
+        tracing.detach(token)
+        metrics.histogram(
+            "task_run_ms",
+            buckets=tracing.STAGE_MS_BUCKETS,
+            description="Task execution time",
+            labels={"task": task.name},
+        ).observe((time.perf_counter() - t0) * 1000.0)
+
+    # worker_process_init fires in each prefork child; worker_ready covers the solo and thread pools
+    @signals.worker_process_init.connect
+    @signals.worker_ready.connect
+    def _start_metrics_publisher(**_kw):
+        prometheus.start_publisher()
+
+    # Prefork children exit without running atexit handlers
+    @signals.worker_process_shutdown.connect
+    def _flush_vectors(**_kw):
+        from ..adapters import milvus_adapter
+
+        try:
+            milvus_adapter.flush()
+        except Exception as e:
+            logging.getLogger(__name__).warning("Flushing vectors at worker shutdown failed: %s", e)
+
+    # The final values stay in /metrics after the process is gone (see pivot.prometheus.collect)
+    @signals.worker_process_shutdown.connect
+    @signals.worker_shutdown.connect
+    def _publish_final_metrics(**_kw):
+        try:
+            prometheus.publish()
+        except Exception as e:
+            logging.getLogger(__name__).warning("Publishing metrics at worker shutdown failed: %s", e)
+
     # Ensure tasks module is imported so Celery can register task definitions
     from . import tasks  # noqa: E402,F401
 
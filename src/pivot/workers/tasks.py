@@ -1,21 +1,148 @@
 from __future__ import annotations
 
+import itertools
+import logging
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from .celery_app import celery_app
 from .. import config
 from ..connectors import run_connector
 from ..normalize import normalize_text
-from ..chunker.token_chunker import chunk_text
+from ..chunker.token_chunker import chunk_texts, iter_chunks
 from .. import db
-from .. import embedding
+from ..dedupe import ChunkDeduper
+from ..reingest import diff_chunks
+from .. import embedding_store
+from .. import response_cache
+from .. import tracing
 from ..adapters import milvus_adapter
 
+logger = logging.getLogger(__name__)
+
+
+class _TimedIter:
+    """Iterator that accumulates the time spent producing its items, so lazy chunking can be told
+    apart from the COPY that consumes it."""
+
+    def __init__(self, items):
+        self._it = iter(items)
+        self.ms = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        try:
+            return next(self._it)
+        finally:
+            self.ms += (time.perf_counter() - t0) * 1000.0
+
+
+def _store_chunks_timed(project_id: str, rows: _TimedIter, chunk_ms: float = 0.0) -> tuple[list[str], int]:
+    """_store_chunks recording the "chunk" (time producing `rows`, plus `chunk_ms` spent beforehand)
+    and "db_insert" ingest stages."""
+    t0 = time.perf_counter()
+    with tracing.span("ingest.chunk_and_insert", project_id=project_id):
+        result = _store_chunks(project_id, rows)
+    total_ms = (time.perf_counter() - t0) * 1000.0
+    tracing.observe("ingest", "chunk", chunk_ms + rows.ms)
+    tracing.observe("ingest", "db_insert", total_ms - rows.ms)
+    return result
+
+
+def _store_chunks(project_id: str, rows) -> tuple[list[str], int]:
+    """COPY chunk rows, dropping near-duplicates of stored chunks when DEDUPE_CHUNKS is on.
+    Returns (chunk_ids, number of chunks aliased instead of stored)."""
+    if not config.DEDUPE_CHUNKS:
+        return db.copy_chunks(rows), 0
+    deduper = ChunkDeduper(project_id)
+    chunk_ids = db.copy_chunks(deduper.filter(rows))
+    stats = deduper.commit(chunk_ids)
+    if stats["aliased"]:
+        logger.info("Project %s: %d near-duplicate chunks aliased", project_id, stats["aliased"])
+    return chunk_ids, stats["aliased"]
+
+
+def _update_in_place(
+    project_id: str, payload: Dict[str, Any], meta: Dict[str, Any], clean_text: str, language: Optional[str], fp: str
+) -> Optional[Dict[str, Any]]:
+    """Ingest mode "update": re-ingest the project's existing document for the same source_url.
+
+    Chunks whose text is unchanged keep their ids and vectors; only added or modified chunks are
+    stored and embedded, and stale chunks are removed with their vectors. Returns None when there
+    is no such document (the caller then creates one).
+
+    Chunks are fixed token windows with overlap, so an edit that changes the token count shifts
+    every later window: the diff saves work for appended text and length-preserving edits, while
+    an insertion near the start re-embeds nearly the whole document.
+    """
+    source_url = meta.get("source_url")
+    existing = db.find_document(project_id, source_url) if source_url else None
+    if existing is None:
+        return None
+    doc_id, old_fp = existing
+    if old_fp == fp:
+        return {"project_id": project_id, "document_id": doc_id, "skipped": True}
+    owner = db.document_with_fingerprint(project_id, fp)
+    if owner is not None:
+        # The new content is already stored as another document
+        return {"project_id": project_id, "document_id": owner, "skipped": True}
+
+    source_type = payload["source_type"]
+    stored = db.get_document_chunks(doc_id)
+    with tracing.stage("ingest", "chunk"):
+        chunks = iter_chunks(clean_text, max_tokens=config.CHUNK_MAX_TOKENS, overlap=config.CHUNK_OVERLAP_TOKENS)
+        diff = diff_chunks(stored, chunks)
+    # Vectors first: a retry after a failure below diffs again and finds the same stale ids
+    milvus_adapter.delete(project_id, diff.stale)
+    released = db.apply_chunk_diff(doc_id, diff.repositioned, diff.stale)
+    if released:
+        # Other documents' aliases of the stale chunks, now stored as chunks of their own
+        embed_job.apply_async(args=[project_id, None, released], queue="embed")
+    if diff.moved:
+        # Kept vectors are rewritten under their new idx, not re-embedded
+        vectors = milvus_adapter.get_vectors([cid for cid, _idx in diff.moved])
+        milvus_adapter.upsert_embeddings(
+            project_id, [(cid, doc_id, idx, vectors[cid]) for cid, idx in diff.moved if cid in vectors]
+        )
+    rows = ((doc_id, idx, text, tok, start, end, {"source_type": source_type}) for idx, text, tok, start, end, _ in diff.added)
+    with tracing.stage("ingest", "db_insert"):
+        chunk_ids, aliased = _store_chunks(project_id, rows)
+    # Enqueued as soon as the chunks are committed: a retry would diff them as kept (or skip the
+    # document once its fingerprint is stored) and never embed them
+    if chunk_ids:
+        embed_job.apply_async(args=[project_id, doc_id, chunk_ids], queue="embed")
+    # The fingerprint goes last so that an interrupted update is redone by the retry
+    db.update_document(
+        doc_id,
+        {
+            "source_type": meta.get("source_type"),
+            "author": meta.get("author"),
+            "language": language,
+            "title": meta.get("title"),
+            "fingerprint": fp,
+            "tags": payload.get("tags"),
+        },
+    )
+    response_cache.invalidate_project(project_id)
+    return {
+        "project_id": project_id,
+        "document_id": doc_id,
+        "updated": True,
+        "chunk_count": len(diff.kept) + len(chunk_ids),
+        "kept": len(diff.kept),
+        "embedded": len(chunk_ids),
+        "removed": len(diff.stale),
+        "deduplicated": aliased,
+    }
+
 
 @celery_app.task(name="ingest_job", bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
 def ingest_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-    """Payload keys: project (name), source_type, source_ref, metadata (optional), tags (optional)"""
+    """Payload keys: project (name), source_type, source_ref, metadata (optional), tags (optional),
+    mode (optional): "create" (default) or "update" to re-ingest the document of the same source_url"""
     t0 = time.time()
     project_name = payload.get("project") or "default"
     source_type = payload["source_type"]
@@ -25,13 +152,20 @@ def ingest_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
 
     project_id = db.ensure_project(project_name)
 
-    raw_text, meta = run_connector(source_type, source_ref, extra_meta)
+    with tracing.stage("ingest", "fetch", source_type=source_type):
+        raw_text, meta = run_connector(source_type, source_ref, extra_meta)
     is_html = bool(meta.get("is_html"))
-    clean_text, language = normalize_text(raw_text, is_html=is_html)
+    with tracing.stage("ingest", "normalize", chars=len(raw_text)):
+        clean_text, language = normalize_text(raw_text, is_html=is_html)
 
     # Fingerprint for dedupe
     fp = db.sha1_fingerprint(clean_text[:10000])  # limit to speed
 
+    if payload.get("mode") == "update":
+        updated = _update_in_place(project_id, payload, meta, clean_text, language, fp)
+        if updated is not None:
+            return {**updated, "elapsed_ms": int((time.time() - t0) * 1000)}
+
     doc_id, created = db.upsert_document(
         project_id=project_id,
         source_url=meta.get("source_url"),
@@ -45,10 +179,14 @@ def ingest_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
     if not created:
         return {"project_id": project_id, "document_id": doc_id, "skipped": True}
 
-    # Chunk
-    chunks = chunk_text(clean_text, max_tokens=config.CHUNK_MAX_TOKENS, overlap=config.CHUNK_OVERLAP_TOKENS)
-    chunk_rows = [(idx, text, tok, start, end, {"source_type": source_type}) for (idx, text, tok, start, end, _) in chunks]
-    chunk_ids = db.insert_chunks(doc_id, chunk_rows)
+    # Chunk: windows are tokenized lazily and streamed straight into COPY. The normalized text is
+    # in memory already (normalize_text works on the whole document); streaming bounds the token
+    # offsets and chunk rows, not the document
+    chunks = iter_chunks(clean_text, max_tokens=config.CHUNK_MAX_TOKENS, overlap=config.CHUNK_OVERLAP_TOKENS)
+    chunk_rows = _TimedIter((doc_id, idx, text, tok, start, end, {"source_type": source_type}) for (idx, text, tok, start, end, _) in chunks)
+    chunk_ids, aliased = _store_chunks_timed(project_id, chunk_rows)
+    # New chunks are visible to lexical search right away
+    response_cache.invalidate_project(project_id)
 
     # Enqueue embedding
     embed_job.apply_async(args=[project_id, doc_id, chunk_ids], queue="embed")
@@ -57,16 +195,105 @@ def ingest_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         "project_id": project_id,
         "document_id": doc_id,
         "chunk_count": len(chunk_ids),
+        "deduplicated": aliased,
         "elapsed_ms": int((time.time() - t0) * 1000),
     }
 
 
+@celery_app.task(name="ingest_batch_job", bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
+def ingest_batch_job(self, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ingest many (typically small) documents together; each payload as for ingest_job.
+
+    Per project: one documents insert, one batched tokenizer call for all new documents (those over
+    INGEST_BATCH_MAX_CHARS are streamed individually), one COPY for every chunk and one embed_job.
+    Sources that fail to load are reported in `failed` instead of retrying the whole batch.
+    """
+    t0 = time.time()
+    by_project: Dict[str, List[tuple]] = {}
+    failed = []
+    for payload in payloads:
+        try:
+            with tracing.stage("ingest", "fetch", source_type=payload["source_type"]):
+                raw_text, meta = run_connector(payload["source_type"], payload["source_ref"], payload.get("metadata") or {})
+        except Exception as e:
+            logger.warning("Batch ingest: could not load %s: %s", payload.get("source_ref"), e)
+            failed.append({"source_ref": payload.get("source_ref"), "error": str(e)})
+            continue
+        with tracing.stage("ingest", "normalize", chars=len(raw_text)):
+            clean_text, language = normalize_text(raw_text, is_html=bool(meta.get("is_html")))
+        by_project.setdefault(payload.get("project") or "default", []).append((payload, meta, clean_text, language))
+
+    projects = []
+    for project_name, items in by_project.items():
+        project_id = db.ensure_project(project_name)
+        # Update-mode payloads whose source_url is already stored are diffed one by one
+        updated, pending = 0, []
+        for item in items:
+            payload, meta, clean_text, language = item
+            if payload.get("mode") == "update":
+                result = _update_in_place(project_id, payload, meta, clean_text, language, db.sha1_fingerprint(clean_text[:10000]))
+                if result is not None:
+                    updated += bool(result.get("updated"))
+                    continue
+            pending.append(item)
+        docs = [
+            {
+                "source_url": meta.get("source_url"),
+                "source_type": meta.get("source_type"),
+                "author": meta.get("author"),
+                "language": language,
+                "title": meta.get("title"),
+                "fingerprint": db.sha1_fingerprint(clean_text[:10000]),
+                "tags": payload.get("tags"),
+            }
+            for payload, meta, clean_text, language in pending
+        ]
+        new = [(doc_id, item) for (doc_id, created), item in zip(db.upsert_documents(project_id, docs), pending) if created]
+        small = [(doc_id, item) for doc_id, item in new if len(item[2]) <= config.INGEST_BATCH_MAX_CHARS]
+        large = [(doc_id, item) for doc_id, item in new if len(item[2]) > config.INGEST_BATCH_MAX_CHARS]
+        t_chunk = time.perf_counter()
+        chunk_lists = chunk_texts(
+            [item[2] for _doc_id, item in small],
+            max_tokens=config.CHUNK_MAX_TOKENS,
+            overlap=config.CHUNK_OVERLAP_TOKENS,
+        )
+        batch_chunk_ms = (time.perf_counter() - t_chunk) * 1000.0
+        per_doc = [(doc_id, item[0]["source_type"], chunks) for (doc_id, item), chunks in zip(small, chunk_lists)]
+        per_doc += [
+            (doc_id, item[0]["source_type"], iter_chunks(item[2], max_tokens=config.CHUNK_MAX_TOKENS, overlap=config.CHUNK_OVERLAP_TOKENS))
+            for doc_id, item in large
+        ]
+        rows = _TimedIter(itertools.chain.from_iterable(
+            ((doc_id, idx, text, tok, start, end, {"source_type": source_type}) for idx, text, tok, start, end, _ in chunks)
+            for doc_id, source_type, chunks in per_doc
+        ))
+        chunk_ids, aliased = _store_chunks_timed(project_id, rows, batch_chunk_ms)
+        if chunk_ids:
+            response_cache.invalidate_project(project_id)
+            embed_job.apply_async(args=[project_id, None, chunk_ids], queue="embed")
+        projects.append(
+            {
+                "project_id": project_id,
+                "documents": len(items),
+                "created": len(new),
+                "updated": updated,
+                "chunk_count": len(chunk_ids),
+                "deduplicated": aliased,
+            }
+        )
+
+    return {"projects": projects, "failed": failed, "elapsed_ms": int((time.time() - t0) * 1000)}
+
+
 @celery_app.task(name="embed_job", bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 3})
-def embed_job(self, project_id: str, document_id: str, chunk_ids: list[str]) -> Dict[str, Any]:
+def embed_job(self, project_id: str, document_id: Optional[str], chunk_ids: list[str]) -> Dict[str, Any]:
+    """Embed and index `chunk_ids` (of one document, or of a whole batch when document_id is None)."""
     t0 = time.time()
     id_texts = db.get_chunk_texts(chunk_ids)
     texts = [t for (_id, t) in id_texts]
-    vecs = embedding.embed_texts(texts, normalize=False, batch_size=64)
+    # Only text never embedded under this model hits the model; the rest comes from the store
+    with tracing.stage("ingest", "embed", chunks=len(texts)):
+        vecs, embed_stats = embedding_store.embed_texts_stored(texts, normalize=False, batch_size=64)
     rows = []
     # Need doc_id and idx per chunk; fetch meta in one query
     metas = db.get_chunk_meta(chunk_ids)
@@ -74,5 +301,13 @@ def embed_job(self, project_id: str, document_id: str, chunk_ids: list[str]) ->
     for (cid, _t), vec in zip(id_texts, vecs):
         doc_id, idx = meta_map[cid]
         rows.append((cid, doc_id, idx, vec))
-    upserted = milvus_adapter.upsert_embeddings(project_id, rows, vector_dim=len(vecs[0]) if vecs else None)
-    return {"upserted": upserted, "elapsed_ms": int((time.time() - t0) * 1000)}
+    with tracing.stage("ingest", "vector_upsert", rows=len(rows)):
+        upserted = milvus_adapter.upsert_embeddings(
+            project_id, rows, vector_dim=len(vecs[0]) if vecs else None, buffered=True
+        )
+        # Written before the cache is invalidated (and before the task ends: prefork children do not
+        # run atexit); only this project's rows, so a write that keeps failing (and stays queued for
+        # the retry) cannot fail the embed jobs of other projects
+        milvus_adapter.flush(project_id)
+    response_cache.invalidate_project(project_id)
+    return {"upserted": upserted, **embed_stats, "elapsed_ms": int((time.time() - t0) * 1000)}
@@ -0,0 +1,24 @@
+import sys
+sys.path.insert(0, 'src')
+
+from pivot.bench import suite
+
+
+def test_suite_runs_offline_and_reports_every_stage():
+    result = suite.run(docs=2, kb=2, queries=3, top_k=3, memory=True)
+    stages = result["stages"]
+    assert {"normalize_text", "chunk_text", "db.insert_chunks", "milvus_adapter.search", "Reranker.rerank", "api.main.query"} <= set(stages)
+    assert any(name.startswith("embed_texts") for name in stages)
+    for r in stages.values():
+        assert r["calls"] > 0 and r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"]
+        assert r["peak_kib"] is not None
+    assert result["params"]["chunks"] > 0
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    base = {"stages": {"s": {"p50_ms": 10.0, "p95_ms": 20.0, "peak_kib": 100.0, "items_per_s": 50.0}}}
+    same = {"stages": {"s": {"p50_ms": 11.0, "p95_ms": 21.0, "peak_kib": 110.0, "items_per_s": 45.0}}}
+    worse = {"stages": {"s": {"p50_ms": 14.0, "p95_ms": 20.0, "peak_kib": 100.0, "items_per_s": 30.0}, "new": {}}}
+    assert suite.compare(same, base, 0.25) == []
+    assert [r.split(":")[1].split()[0] for r in suite.compare(worse, base, 0.25)] == ["p50_ms", "items_per_s"]
+    assert suite.percentile([1, 2, 3, 4], 50) == 2 and suite.percentile([1, 2, 3, 4], 99) == 4
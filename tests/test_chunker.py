@@ -0,0 +1,81 @@
+import re
+import sys
+sys.path.insert(0, 'src')
+
+from pivot.chunker import token_chunker
+
+
+class _RegexTokenizer:
+    """Offsets-only stand-in for a HF fast tokenizer."""
+
+    def __init__(self, pattern):
+        self.pattern = re.compile(pattern)
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, **_kw):
+        if isinstance(text, list):
+            encs = [self(t, return_offsets_mapping=return_offsets_mapping) for t in text]
+            return {k: [e[k] for e in encs] for k in encs[0]}
+        spans = [m.span() for m in self.pattern.finditer(text)]
+        out = {"input_ids": [hash(text[a:b]) % 50000 for a, b in spans]}
+        if return_offsets_mapping:
+            out["offset_mapping"] = spans
+        return out
+
+
+_TEXT = " ".join(f"word{i % 37}" + ("\n\n" if i % 11 == 0 else "") for i in range(3000)) + "  tail."
+
+
+def test_iter_chunks_matches_chunk_text(monkeypatch):
+    # WordPiece-like (whitespace dropped) and byte-level-BPE-like (leading space kept on the word)
+    for pattern in (r"\S+", r" ?\S+|\s+"):
+        tok = _RegexTokenizer(pattern)
+        monkeypatch.setattr(token_chunker, "get_tokenizer", lambda: tok)
+        expected = token_chunker.chunk_text(_TEXT, max_tokens=64, overlap=16)
+        for window in (50, 997, 10**6):
+            got = list(token_chunker.iter_chunks(_TEXT, max_tokens=64, overlap=16, window_chars=window))
+            assert got == expected
+
+
+def test_iter_chunks_accepts_pieces(monkeypatch):
+    tok = _RegexTokenizer(r"\S+")
+    monkeypatch.setattr(token_chunker, "get_tokenizer", lambda: tok)
+    pieces = [_TEXT[i : i + 333] for i in range(0, len(_TEXT), 333)]
+    got = list(token_chunker.iter_chunks(iter(pieces), max_tokens=50, overlap=10, window_chars=200))
+    assert got == token_chunker.chunk_text(_TEXT, max_tokens=50, overlap=10)
+
+
+def test_chunk_texts_matches_chunk_text_per_document(monkeypatch):
+    tok = _RegexTokenizer(r"\S+")
+    monkeypatch.setattr(token_chunker, "get_tokenizer", lambda: tok)
+    texts = [_TEXT[:5000], "", "short doc", _TEXT]
+    got = token_chunker.chunk_texts(texts, max_tokens=64, overlap=16, workers=0)
+    assert got == [token_chunker.chunk_text(t, max_tokens=64, overlap=16) for t in texts]
+
+
+def test_chunk_texts_stops_trying_a_failed_pool(monkeypatch):
+    tok = _RegexTokenizer(r"\S+")
+    monkeypatch.setattr(token_chunker, "get_tokenizer", lambda: tok)
+    monkeypatch.setattr(token_chunker, "_pool_failed_pid", None)
+    attempts = []
+
+    def failing_pool(workers):
+        attempts.append(workers)
+        raise AssertionError("daemonic processes are not allowed to have children")
+
+    monkeypatch.setattr(token_chunker, "_get_pool", failing_pool)
+    texts = ["short doc", _TEXT[:2000]]
+    expected = [token_chunker.chunk_text(t, max_tokens=64, overlap=16) for t in texts]
+    for _ in range(3):
+        assert token_chunker.chunk_texts(texts, max_tokens=64, overlap=16, workers=2) == expected
+    assert attempts == [2]
+
+
+def test_whitespace_probe_runs_once_per_tokenizer(monkeypatch):
+    tok = _RegexTokenizer(r" ?\S+|\s+")
+    calls = []
+    monkeypatch.setattr(token_chunker, "_token_ids", lambda t, text: calls.append(text) or [hash(m) for m in t.pattern.findall(text)])
+    probes = []
+    for _ in range(3):
+        assert list(token_chunker.iter_chunks("a few words here", max_tokens=8, overlap=2, tokenizer=tok))
+        probes.append(len(calls))
+    assert probes[0] > 0 and probes == probes[:1] * 3
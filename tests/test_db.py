@@ -0,0 +1,300 @@
+import sys
+sys.path.insert(0, 'src')
+
+import os
+import threading
+import time
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from pivot import db
+
+IDLE = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+INTRANS = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if not self.conn.alive:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.executed.append(sql)
+
+
+class _FakeConn:
+    def __init__(self):
+        self.closed = 0
+        self.alive = True
+        self.status = IDLE
+        self.rollbacks = 0
+        self.fail_rollback = False
+        self.executed = []
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+        self.status = IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    opened = []
+
+    def fake_connect(dsn):
+        opened.append(_FakeConn())
+        return opened[-1]
+
+    monkeypatch.setattr(db.psycopg2, "connect", fake_connect)
+    return opened
+
+
+def _pool(**kw):
+    args = {"minconn": 1, "maxconn": 2, "timeout": 0.05, "ping_interval": 60.0, **kw}
+    return db.ConnectionPool("postgresql://test", args.pop("minconn"), args.pop("maxconn"), **args)
+
+
+def test_acquire_blocks_at_maxconn_until_a_release(connect):
+    pool = _pool(maxconn=2, timeout=0.05)
+    a, b = pool.acquire(), pool.acquire()
+    t0 = time.monotonic()
+    with pytest.raises(psycopg2.pool.PoolError):
+        pool.acquire()
+    assert time.monotonic() - t0 >= 0.04
+
+    pool.timeout = 5.0
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert got == []
+    pool.release(a)
+    waiter.join(2)
+    assert got == [a] and len(connect) == 2
+    assert pool.stats()["in_use"] == 2
+
+
+def test_release_rolls_back_and_keeps_the_connection(connect):
+    pool = _pool(minconn=0)
+    conn = pool.acquire()
+    conn.status = INTRANS
+    pool.release(conn)
+    assert conn.rollbacks == 1 and not conn.closed
+    assert pool.acquire() is conn
+
+    conn.status = INTRANS
+    conn.fail_rollback = True
+    pool.release(conn)
+    assert conn.closed and pool.stats()["idle"] == 0
+    assert pool.acquire() is not conn
+
+
+def test_connections_above_minconn_stay_open(connect):
+    pool = _pool(minconn=1, maxconn=3)
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    assert not any(c.closed for c in conns)
+    assert pool.stats()["idle"] == 3
+
+
+def test_dead_idle_connection_is_replaced(connect):
+    pool = _pool(minconn=0, ping_interval=0.0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed
+    assert len(connect) == 2
+
+
+def test_recently_used_connection_is_not_pinged(connect):
+    pool = _pool(minconn=0, ping_interval=60.0)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn and conn.executed == []
+
+
+def test_pool_inherited_across_fork_is_set_aside(connect, monkeypatch):
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_inherited_pools", [])
+    parent = db.get_pool()
+    assert db.get_pool() is parent
+
+    # A pool created by another process (what get_pool sees in a child without register_at_fork)
+    monkeypatch.setattr(parent, "pid", parent.pid + 1)
+    child = db.get_pool()
+    assert child is not parent and db._inherited_pools == [parent]
+    assert not any(c.closed for c, _last in parent._idle)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_register_at_fork_resets_the_pool_in_the_child(connect, monkeypatch):
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_inherited_pools", [])
+    parent = db.get_pool()
+    pid = os.fork()
+    if pid == 0:
+        ok = db._pool is None and db._inherited_pools == [parent] and db.get_pool() is not parent
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert db._pool is parent
+
+
+def test_copy_field_escapes_text_format():
+    assert db._copy_field(None) == "\\N"
+    # NUL cannot be stored in a text column and is dropped
+    assert db._copy_field("a\tb\nc\\d\re\x00f") == "a\\tb\\nc\\\\d\\ref"
+    assert db._copy_field(3) == "3"
+    assert db._copy_field("\\N") == "\\\\N"  # a literal backslash-N is text, not NULL
+
+
+def test_copy_reader_chunks_rows_on_read_and_readline():
+    rows = [("a", 1, None), ("tab\there", 2, "x"), ("last", 3, "")]
+    expected = "a\t1\t\\N\ntab\\there\t2\tx\nlast\t3\t\n"
+
+    reader = db._CopyReader(iter(rows))
+    parts = []
+    while True:
+        part = reader.read(5)
+        if not part:
+            break
+        assert len(part) <= 5
+        parts.append(part)
+    assert "".join(parts) == expected
+
+    assert db._CopyReader(iter(rows)).read() == expected
+    reader = db._CopyReader(iter(rows))
+    assert [reader.readline() for _ in range(4)] == ["a\t1\t\\N\n", "tab\\there\t2\tx\n", "last\t3\t\n", ""]
+
+
+class _Table:
+    """`documents` rows keyed by (project_id, fingerprint), as the unique index of migration 007."""
+
+    def __init__(self):
+        self.rows = {}
+        self.queries = []
+
+    def execute_values(self, cur, sql, values, template=None, page_size=100, fetch=False):
+        assert "ON CONFLICT (project_id, fingerprint) DO NOTHING" in sql
+        inserted = []
+        for doc_id, project_id, *cols in values:
+            key = (project_id, cols[db._DOCUMENT_COLUMNS.index("fingerprint")])
+            if key[1] is not None and key in self.rows:
+                continue
+            self.rows[key if key[1] is not None else (project_id, doc_id)] = doc_id
+            inserted.append((doc_id,))
+        return inserted
+
+
+class _TableCursor:
+    def __init__(self, table):
+        self.table = table
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.table.queries.append(sql)
+        project_id, fingerprints = params
+        self.result = [(fp, self.table.rows[(p, fp)]) for (p, fp) in self.table.rows if p == project_id and fp in fingerprints]
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql, file, size=8192):
+        self.table.copied = []
+        while True:
+            data = file.read(size)
+            if not data:
+                break
+            assert len(data) <= size
+            self.table.copied.append(data)
+
+
+class _TableConn:
+    def __init__(self, table):
+        self.table = table
+        self.commits = 0
+
+    def cursor(self):
+        return _TableCursor(self.table)
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def table(monkeypatch):
+    from contextlib import contextmanager
+
+    table = _Table()
+    conn = _TableConn(table)
+
+    @contextmanager
+    def get_conn():
+        yield conn
+
+    monkeypatch.setattr(db, "get_conn", get_conn)
+    monkeypatch.setattr(db.psycopg2.extras, "execute_values", table.execute_values)
+    return table
+
+
+def _doc(fp, url=None):
+    return {"source_url": url, "source_type": "web", "fingerprint": fp}
+
+
+def test_upsert_documents_resolves_duplicate_fingerprints_in_one_batch(table):
+    out = db.upsert_documents("p1", [_doc("fp-a"), _doc("fp-b"), _doc("fp-a", "mirror"), _doc(None), _doc(None)])
+    ids = [doc_id for doc_id, _ in out]
+    assert [created for _, created in out] == [True, True, False, True, True]
+    assert ids[2] == ids[0] and len(set(ids)) == 4
+    assert table.queries == []  # nothing conflicted with stored rows
+
+
+def test_upsert_documents_scopes_fingerprints_to_the_project(table):
+    (first, created), = db.upsert_documents("p1", [_doc("fp-a")])
+    assert created
+
+    # Same content in another project is a new document; in the same project it resolves to the stored one
+    (other, other_created), = db.upsert_documents("p2", [_doc("fp-a")])
+    assert other_created and other != first
+    again = db.upsert_documents("p1", [_doc("fp-a"), _doc("fp-a")])
+    assert again == [(first, False), (first, False)]
+
+
+def test_copy_chunks_streams_rows_in_buffer_sized_reads(table, monkeypatch):
+    monkeypatch.setattr(db.config, "DB_COPY_BUFFER_BYTES", 16)
+    rows = [("d1", i, f"chunk {i}\twith tab", 3, 0, 10, {"source_type": "web"}) for i in range(5)]
+    ids = db.copy_chunks(iter(rows))
+
+    assert len(ids) == 5 and len(set(ids)) == 5
+    lines = "".join(table.copied).splitlines()
+    assert [line.split("\t")[0] for line in lines] == ids
+    assert lines[0].split("\t")[3] == "chunk 0\\twith tab"
+    assert db.copy_chunks(iter([])) == []
@@ -0,0 +1,92 @@
+import sys
+sys.path.insert(0, 'src')
+
+from pivot.dedupe import ChunkDeduper, SimHashIndex, bands, from_signed, hamming, plan_release, simhash, to_signed
+
+BASE = (
+    "The ingestion worker normalizes each document, splits it into overlapping token windows and "
+    "writes the resulting chunks with a single COPY before the embedding job is enqueued for them. "
+    "Retrieval later searches the vectors of the project and reranks the candidates with a cross encoder."
+)
+
+
+def _rows(doc, texts):
+    return [(doc, i, t, len(t.split()), 0, len(t), {}) for i, t in enumerate(texts)]
+
+
+def test_simhash_is_close_for_near_duplicates():
+    near = BASE.replace("single COPY", "single  COPY").replace("The ingestion", "the ingestion")
+    other = "Completely unrelated text about gardening, tomatoes, watering schedules and the soil. " * 3
+    assert hamming(simhash(BASE), simhash(near)) == 0
+    assert hamming(simhash(BASE), simhash(other)) > 10
+    h = simhash(BASE)
+    assert from_signed(to_signed(h)) == h and to_signed(h) < 2 ** 63
+    idx = SimHashIndex()
+    idx.add("x", h)
+    assert idx.nearest(h ^ 0b1011, 3) == ("x", 3)
+    assert idx.nearest(h ^ 0b1111, 3) is None
+
+
+def test_deduper_aliases_stored_and_in_batch_duplicates(monkeypatch):
+    stored_id, stored_hash = "c-old", simhash(BASE)
+    lookups = []
+
+    def lookup(project_id, per_band):
+        lookups.append(per_band)
+        hit = any(v in per_band[i] for i, v in enumerate(bands(stored_hash)))
+        return [(stored_id, to_signed(stored_hash))] if hit else []
+
+    fresh = "A distinct paragraph about query batching, response caching and hybrid lexical retrieval. " * 3
+    rows = _rows("d1", [BASE, fresh, fresh + " ", "short"])
+    d = ChunkDeduper("p1", max_distance=3, min_chars=50, block=10, lookup=lookup)
+    kept = list(d.filter(rows))
+
+    assert [r[1] for r in kept] == [1, 3]  # 0 matches the stored chunk, 2 repeats chunk 1
+    assert len(lookups) == 1
+    assert d.aliases == [("d1", 0, "c-old", 0), ("d1", 2, ("new", 0), 0)]
+    assert d.hashes == [(0, simhash(fresh))]
+
+    written = []
+    dedupe_db = type("DB", (), {
+        "put_chunk_simhashes": staticmethod(lambda pid, rows: written.append(("hash", pid, list(rows)))),
+        "link_chunk_aliases": staticmethod(lambda rows: written.append(("alias", list(rows)))),
+    })
+    import pivot
+    monkeypatch.setattr(pivot, "db", dedupe_db, raising=False)
+    assert d.commit(["c-1", "c-3"]) == {"kept": 2, "aliased": 2}
+    assert written[0][2][0][0] == "c-1"
+    assert [a[:4] for a in written[1][1]] == [("d1", 0, "c-old", 0), ("d1", 2, "c-1", 0)]
+    # The alias keeps its own row, to be stored again if the canonical chunk is deleted
+    assert written[1][1][1][4:] == rows[2][2:]
+
+
+def test_plan_release_promotes_closest_alias_and_relinks_near_ones():
+    near = BASE.replace("The ingestion", "the ingestion")
+    far = BASE.replace("cross encoder", "bi encoder model of another family entirely")
+    other = "A distinct paragraph about query batching, response caching and hybrid lexical retrieval. " * 3
+    store, relink = plan_release([("c1", BASE), ("c1", near), ("c1", far), ("c2", other)], max_distance=3)
+    assert store == [0, 2, 3]
+    assert relink == [(1, 0, 0)]
+
+
+def test_update_stores_and_embeds_aliases_of_stale_chunks(monkeypatch):
+    from pivot.workers import tasks
+
+    enqueued = []
+    fake_db = type("DB", (), {
+        "find_document": staticmethod(lambda project_id, url: ("d1", "old-fp")),
+        "document_with_fingerprint": staticmethod(lambda project_id, fp: None),
+        "get_document_chunks": staticmethod(lambda doc_id: [("c-stale", 0, 0, 10, "not-in-new-text")]),
+        "apply_chunk_diff": staticmethod(lambda doc_id, repositioned, stale: ["c-released"] if stale == ["c-stale"] else []),
+        "copy_chunks": staticmethod(lambda rows: [f"c-new-{i}" for i, _ in enumerate(rows)]),
+        "update_document": staticmethod(lambda doc_id, doc: None),
+    })
+    monkeypatch.setattr(tasks, "db", fake_db)
+    monkeypatch.setattr(tasks.config, "DEDUPE_CHUNKS", False)
+    monkeypatch.setattr(tasks, "iter_chunks", lambda text, **kw: iter([(0, text, 2, 0, len(text), {})]))
+    monkeypatch.setattr(tasks.embed_job, "apply_async", lambda args, queue: enqueued.append(args))
+    monkeypatch.setattr(tasks.response_cache, "invalidate_project", lambda project_id: None)
+
+    result = tasks._update_in_place("p1", {"source_type": "web"}, {"source_url": "u"}, "fresh text", "en", "new-fp")
+    assert result["removed"] == 1
+    assert ["p1", None, ["c-released"]] in enqueued
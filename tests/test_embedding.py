@@ -0,0 +1,147 @@
+import sys
+sys.path.insert(0, 'src')
+
+from types import SimpleNamespace
+
+from pivot import embedding
+
+
+def test_query_embedding_cache_tiers(monkeypatch):
+    monkeypatch.setattr(embedding.config, 'QUERY_EMBED_CACHE_REDIS', False)
+    embedding._query_cache.clear()
+
+    vec, status = embedding.embed_query_with_status("What is  PIVOT?")
+    assert status == "miss"
+    # whitespace differences normalize to the same key
+    vec2, status2 = embedding.embed_query_with_status(" What is PIVOT? ")
+    assert status2 == "local"
+    assert vec2 == embedding.unpack_vector(embedding.pack_vector(vec))
+    assert embedding.query_cache_stats()["local"]["hits"] >= 1
+
+
+def test_pack_vector_roundtrip_is_float32():
+    packed = embedding.pack_vector([0.5, -0.25, 1.0])
+    assert len(packed) == 12
+    assert embedding.unpack_vector(packed) == [0.5, -0.25, 1.0]
+
+
+def test_embed_texts_stored_only_embeds_misses(monkeypatch):
+    from pivot import db, embedding_store
+
+    store = {}
+    monkeypatch.setattr(db, 'get_stored_embeddings', lambda model, hashes: {h: store[(model, h)] for h in hashes if (model, h) in store}, raising=False)
+    monkeypatch.setattr(db, 'put_stored_embeddings', lambda model, items: store.update({(model, h): v for h, _dim, v in items}), raising=False)
+    embedded = []
+    real_embed = embedding.embed_texts
+    monkeypatch.setattr(embedding, 'embed_texts', lambda texts, **kw: embedded.extend(texts) or real_embed(texts, **kw))
+
+    vecs, stats = embedding_store.embed_texts_stored(["a", "b", "a"])
+    assert embedded == ["a", "b"]
+    assert stats == {"embedded": 2, "reused": 1}
+    assert vecs[0] == vecs[2]
+
+    embedded.clear()
+    vecs2, stats2 = embedding_store.embed_texts_stored(["b", "c"])
+    assert embedded == ["c"]
+    assert stats2 == {"embedded": 1, "reused": 1}
+    assert vecs2[0] == embedding.unpack_vector(embedding.pack_vector(vecs[1]))
+
+
+def test_microbatcher_coalesces_concurrent_calls():
+    from concurrent.futures import ThreadPoolExecutor
+    from pivot.embedding_batcher import MicroBatcher
+
+    calls = []
+
+    def fake_encode(texts, normalize):
+        calls.append(list(texts))
+        return [[float(len(t)), float(normalize)] for t in texts]
+
+    batcher = MicroBatcher(fake_encode, max_batch=8, max_wait_ms=200)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futs = [pool.submit(batcher.encode, ["x" * i], False) for i in range(1, 5)]
+        results = [f.result(timeout=5) for f in futs]
+
+    assert results == [[[1.0, 0.0]], [[2.0, 0.0]], [[3.0, 0.0]], [[4.0, 0.0]]]
+    assert len(calls) < 4
+    assert sum(len(c) for c in calls) == 4
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+        self.calls = []
+
+    def _call(self, name):
+        self.calls.append(name)
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def get(self, key):
+        self._call("get")
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._call("set")
+        self.data[key] = value
+
+    def mget(self, keys):
+        self._call("mget")
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def set(self, key, value, ex=None):
+        self.queued.append((key, value))
+
+    def execute(self):
+        self.client._call("pipeline")
+        self.client.data.update(self.queued)
+
+
+def test_query_embedding_redis_tier_and_backoff(monkeypatch):
+    from pivot import redis_client
+
+    fake = _FakeRedis()
+    monkeypatch.setattr(redis_client, "_HAS_REDIS", True)
+    monkeypatch.setattr(redis_client, "redis", SimpleNamespace(Redis=SimpleNamespace(from_url=lambda url, **kw: fake)))
+    monkeypatch.setattr(embedding.config, "QUERY_EMBED_CACHE_REDIS", True)
+    monkeypatch.setattr(embedding._redis, "_client", None)
+    monkeypatch.setattr(embedding._redis, "_down_until", 0.0)
+    embedding._query_cache.clear()
+
+    vec, status = embedding.embed_query_with_status("shared tier")
+    assert status == "miss" and fake.calls == ["get", "set"]
+    assert vec == embedding.unpack_vector(embedding.pack_vector(vec))
+
+    # Another process: empty local tier, hit in redis; the batch form reads with one MGET
+    embedding._query_cache.clear()
+    assert embedding.embed_query_with_status("shared tier") == (vec, "redis")
+    embedding._query_cache.clear()
+    vecs, statuses = embedding.embed_queries_with_status(["shared tier", "new one", "new one"])
+    assert statuses == ["redis", "miss", "miss"] and vecs[0] == vec
+    assert fake.calls[-2:] == ["mget", "pipeline"] and len(fake.data) == 2
+
+    # An error backs off: the next queries do not touch redis until the back-off ends
+    errors = embedding._REDIS_ERRORS.value
+    fake.fail = True
+    embedding._query_cache.clear()
+    assert embedding.embed_query_with_status("shared tier") == (vec, "miss")
+    assert embedding._REDIS_ERRORS.value == errors + 1
+    calls = len(fake.calls)
+    embedding._query_cache.clear()
+    assert embedding.embed_queries_with_status(["shared tier"]) == ([vec], ["miss"])
+    assert len(fake.calls) == calls and embedding._redis.get() is None
+
+    fake.fail = False
+    monkeypatch.setattr(embedding._redis, "_down_until", 0.0)
+    embedding._query_cache.clear()
+    assert embedding.embed_query_with_status("shared tier") == (vec, "redis")
@@ -0,0 +1,20 @@
+import sys
+sys.path.insert(0, 'src')
+
+from pivot.services.fusion import reciprocal_rank_fusion
+
+
+def test_rrf_rewards_agreement_and_respects_weights():
+    dense = [("a", 0.9, "d1", 0), ("b", 0.8, "d1", 1), ("c", 0.7, "d2", 0)]
+    lexical = [("c", 12.0, "d2", 0), ("a", 3.0, "d1", 0), ("e", 1.0, "d3", 0)]
+
+    fused = reciprocal_rank_fusion([dense, lexical], k=60)
+    assert [h[0] for h in fused][:2] == ["a", "c"]
+    assert {h[0] for h in fused} == {"a", "b", "c", "e"}
+    assert fused[0][1:4] == (0.9, "d1", 0)
+    # the vector score is kept; the RRF value is separate
+    assert fused[0][4] == 1 / 61 + 1 / 62
+    assert [h[1] for h in fused if h[0] == "e"] == [None]
+
+    lexical_only = reciprocal_rank_fusion([dense, lexical], [0.0, 1.0], limit=2)
+    assert [h[0] for h in lexical_only] == ["c", "a"]
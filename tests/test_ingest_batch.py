@@ -0,0 +1,115 @@
+import sys
+sys.path.insert(0, 'src')
+
+import hashlib
+
+import pytest
+
+from pivot.api import main as api_main
+from pivot.api.main import IngestBatchReq, IngestReq
+from pivot.workers import tasks
+
+
+def _run(task, *args):
+    # Celery binds `self` for task.run; the stub app without celery calls the function as written
+    run = getattr(task, "run", None)
+    return run(*args) if run is not None else task(None, *args)
+
+
+class _BatchDB:
+    def __init__(self, stored_fingerprints=()):
+        self.stored = set(stored_fingerprints)
+        self.copied = []
+
+    def ensure_project(self, name):
+        return f"id-{name}"
+
+    def sha1_fingerprint(self, text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def upsert_documents(self, project_id, docs):
+        out = []
+        for i, doc in enumerate(docs):
+            created = doc["fingerprint"] not in self.stored
+            self.stored.add(doc["fingerprint"])
+            out.append((f"{project_id}-doc{i}", created))
+        return out
+
+    def copy_chunks(self, rows):
+        rows = list(rows)
+        self.copied.extend(rows)
+        return [f"c{len(self.copied) - len(rows) + i}" for i in range(len(rows))]
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    fake_db = _BatchDB(stored_fingerprints={hashlib.sha1(b"already stored").hexdigest()})
+    streamed, updates, enqueued = [], [], []
+
+    def run_connector(source_type, source_ref, metadata):
+        if source_ref == "broken":
+            raise IOError("404 Not Found")
+        return source_ref, {"source_type": source_type, "source_url": f"https://example.org/{source_ref[:8]}"}
+
+    def iter_chunks(text, **kw):
+        streamed.append(text)
+        return iter([(0, text[:10], 2, 0, 10, {}), (1, text[10:20], 2, 10, 20, {})])
+
+    def update_in_place(project_id, payload, meta, clean_text, language, fp):
+        updates.append(payload["source_ref"])
+        return {"updated": True} if payload["source_ref"] == "changed page" else None
+
+    monkeypatch.setattr(tasks, "db", fake_db)
+    monkeypatch.setattr(tasks, "run_connector", run_connector)
+    monkeypatch.setattr(tasks, "chunk_texts", lambda texts, **kw: [[(0, t, 2, 0, len(t), {})] for t in texts])
+    monkeypatch.setattr(tasks, "iter_chunks", iter_chunks)
+    monkeypatch.setattr(tasks, "_update_in_place", update_in_place)
+    monkeypatch.setattr(tasks.config, "DEDUPE_CHUNKS", False)
+    monkeypatch.setattr(tasks.config, "INGEST_BATCH_MAX_CHARS", 50)
+    monkeypatch.setattr(tasks.embed_job, "apply_async", lambda args, queue: enqueued.append(args))
+    monkeypatch.setattr(tasks.response_cache, "invalidate_project", lambda project_id: None)
+    return {"db": fake_db, "streamed": streamed, "updates": updates, "enqueued": enqueued}
+
+
+def _payload(ref, project="default", mode="create"):
+    return {"project": project, "source_type": "text", "source_ref": ref, "mode": mode}
+
+
+def test_ingest_batch_job_groups_projects_and_reports_failures(batch):
+    large = "a long document " * 10
+    result = _run(tasks.ingest_batch_job, [
+        _payload("short note"),
+        _payload("broken"),
+        _payload(large),
+        _payload("changed page", mode="update"),
+        _payload("new page", mode="update"),
+        _payload("already stored", project="archive"),
+    ])
+
+    assert result["failed"] == [{"source_ref": "broken", "error": "404 Not Found"}]
+    assert batch["updates"] == ["changed page", "new page"]
+    default, archive = result["projects"]
+    assert (default["documents"], default["created"], default["updated"]) == (4, 3, 1)
+    # "short note" and "new page" are chunked together; the large document is streamed
+    assert batch["streamed"] == [large.strip()]
+    assert default["chunk_count"] == 4
+    assert [row[2] for row in batch["db"].copied] == ["short note", "new page", large[:10], large[10:20]]
+
+    # Nothing new in the archive project: no chunks, no embed job
+    assert (archive["created"], archive["chunk_count"]) == (0, 0)
+    assert batch["enqueued"] == [["id-default", None, ["c0", "c1", "c2", "c3"]]]
+
+
+def test_ingest_batch_splits_into_tasks_and_validates_items(monkeypatch):
+    monkeypatch.setattr(api_main.config, "INGEST_BATCH_MAX_DOCS", 2)
+    sent = []
+    monkeypatch.setattr(tasks.ingest_batch_job, "apply_async", lambda args, queue: sent.append(args) or type("R", (), {"id": f"t{len(sent)}"})())
+
+    items = [IngestReq(source_type="text", source_ref=f"doc {i}") for i in range(5)]
+    result = api_main.ingest_batch(IngestBatchReq(items=items))
+    assert result == {"task_ids": ["t1", "t2", "t3"], "documents": 5}
+    assert [len(args[0]) for args in sent] == [2, 2, 1]
+    assert [p["source_ref"] for p in sent[0][0]] == ["doc 0", "doc 1"]
+
+    with pytest.raises(api_main.HTTPException):
+        api_main.ingest_batch(IngestBatchReq(items=[IngestReq(source_type="text", source_ref="x", mode="replace")]))
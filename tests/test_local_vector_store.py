@@ -0,0 +1,66 @@
+import sys
+sys.path.insert(0, 'src')
+
+from pivot.adapters.local_vector_store import LocalVectorStore
+
+
+def _rows():
+    return [
+        ("c1", "d1", 0, [1.0, 0.0, 0.0]),
+        ("c2", "d1", 1, [0.0, 1.0, 0.0]),
+        ("c3", "d2", 0, [0.7, 0.7, 0.0]),
+    ]
+
+
+def test_search_upsert_and_delete(tmp_path):
+    store = LocalVectorStore(str(tmp_path), use_hnsw=False)
+    assert store.upsert("p1", _rows()) == 3
+
+    hits = store.search("p1", [2.0, 0.0, 0.0], top_k=2)
+    assert [h[0] for h in hits] == ["c1", "c3"]
+    assert abs(hits[0][1] - 1.0) < 1e-6 and hits[0][2:] == ("d1", 0)
+    assert store.search("other", [1.0, 0.0, 0.0]) == []
+
+    store.upsert("p1", [("c1", "d1", 0, [0.0, 0.0, 1.0])])
+    store.delete("p1", ["c3"])
+    assert [h[0] for h in store.search("p1", [0.0, 0.5, 1.0], top_k=5)] == ["c1", "c2"]
+
+
+def test_reopen_from_disk_float16(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dtype="float16", use_hnsw=False)
+    store.upsert("p1", _rows())
+    store.delete("p1", ["c2"])
+    store.persist()
+    store.close()
+
+    reopened = LocalVectorStore(str(tmp_path), dtype="float16", use_hnsw=False)
+    assert [h[0] for h in reopened.search("p1", [0.0, 1.0, 0.0], top_k=5)] == ["c3", "c1"]
+    vec = reopened.get_vectors(["c1"])["c1"]
+    assert vec == [1.0, 0.0, 0.0]
+
+
+def test_shard_shared_between_processes(tmp_path):
+    # Separate stores on one directory stand in for the API and two worker processes
+    reader = LocalVectorStore(str(tmp_path), use_hnsw=False)
+    assert reader.search("p1", [1.0, 0.0, 0.0]) == []
+    w1 = LocalVectorStore(str(tmp_path), use_hnsw=False)
+    w2 = LocalVectorStore(str(tmp_path), use_hnsw=False)
+    w1.upsert("p1", _rows()[:1])
+    w2.upsert("p1", _rows()[1:2])
+    w1.upsert("p1", _rows()[2:])
+    w2.delete("p1", ["c1"])
+
+    assert sorted(h[0] for h in reader.search("p1", [1.0, 1.0, 1.0], top_k=5)) == ["c2", "c3"]
+    reopened = LocalVectorStore(str(tmp_path), use_hnsw=False)
+    hits = reopened.search("p1", [0.0, 1.0, 0.0], top_k=5)
+    assert [h[0] for h in hits] == ["c2", "c3"]
+    assert hits[0][2:] == ("d1", 1)
+
+    # A compaction by one process is picked up by the others
+    shard = w1.shard("p1")
+    w1.upsert("p1", [(f"x{i}", "d3", i, [0.0, 0.0, 1.0]) for i in range(1100)])
+    w1.delete("p1", [f"x{i}" for i in range(1100)])
+    w1.persist()
+    assert shard.count == 2
+    assert [h[0] for h in reader.search("p1", [0.0, 1.0, 0.0], top_k=5)] == ["c2", "c3"]
+    assert reader.get_vectors(["c3"])["c3"] == reopened.get_vectors(["c3"])["c3"]
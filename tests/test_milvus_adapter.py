@@ -0,0 +1,93 @@
+import sys
+import time
+sys.path.insert(0, 'src')
+
+from pivot.adapters.milvus_adapter import UpsertBuffer
+
+
+def _row(i):
+    return (f"c{i}", "d1", i, [0.0, 1.0])
+
+
+def test_upsert_buffer_flushes_on_size_and_age():
+    written = []
+    buf = UpsertBuffer(lambda project, rows: written.append((project, len(rows))) or len(rows), max_rows=3, max_age_s=0.1)
+
+    buf.add("p1", [_row(0), _row(1)])
+    assert written == [] and buf.pending() == 2
+    buf.add("p1", [_row(2)])
+    assert written == [("p1", 3)]
+
+    buf.add("p2", [_row(3)])
+    deadline = time.time() + 2
+    while buf.pending() and time.time() < deadline:
+        time.sleep(0.02)
+    assert written[-1] == ("p2", 1)
+
+
+def test_upsert_buffer_explicit_flush():
+    written = []
+    buf = UpsertBuffer(lambda project, rows: written.append(project) or len(rows), max_rows=100, max_age_s=60)
+    buf.add("a", [_row(0)])
+    buf.add("b", [_row(1)])
+    assert buf.flush() == 2
+    assert sorted(written) == ["a", "b"]
+
+
+def test_upsert_buffer_keeps_rows_of_failed_write():
+    attempts = []
+
+    def write(project, rows):
+        attempts.append([r[0] for r in rows])
+        if len(attempts) == 1:
+            raise ConnectionError("milvus down")
+        return len(rows)
+
+    buf = UpsertBuffer(write, max_rows=100, max_age_s=60)
+    buf.add("p1", [_row(0), _row(1)])
+    try:
+        buf.flush()
+    except ConnectionError:
+        pass
+    assert buf.pending() == 2
+    buf.add("p1", [_row(2)])
+    assert buf.flush() == 3
+    assert attempts[-1] == ["c0", "c1", "c2"]
+
+
+def test_upsert_buffer_project_flush_skips_a_failing_project():
+    def write(project, rows):
+        if project == "bad":
+            raise ValueError("dimension mismatch")
+        return len(rows)
+
+    buf = UpsertBuffer(write, max_rows=100, max_age_s=60)
+    buf.add("bad", [_row(0)])
+    buf.add("good", [_row(1), _row(2)])
+    assert buf.flush("good") == 2
+    assert buf.pending() == 1
+
+
+def test_partition_name_is_milvus_safe():
+    from pivot.adapters.milvus_adapter import partition_name
+
+    assert partition_name("3f2a-9c.b") == "p_3f2a_9c_b"
+
+
+def test_rescore_uses_exact_vectors_and_trims():
+    from pivot.adapters.milvus_adapter import rescore
+
+    hits = [("a", 0.9, "d", 0), ("b", 0.8, "d", 1), ("c", 0.7, "d", 2)]
+    vectors = {"a": [0.0, 1.0], "b": [1.0, 0.0]}
+    out = rescore([2.0, 0.0], hits, vectors, top_k=2)
+    assert [h[0] for h in out] == ["b", "c"]
+    assert abs(out[0][1] - 1.0) < 1e-9
+
+
+def test_index_params_per_encoding():
+    from pivot.adapters.milvus_adapter import index_params, search_params
+
+    assert index_params("IVF_PQ", "IP")["params"].keys() == {"nlist", "m", "nbits"}
+    assert index_params("HNSW_SQ", "COSINE")["params"]["sq_type"] == "SQ8"
+    assert "nprobe" in search_params(10, "IVF_SQ8", "IP")["params"]
+    assert search_params(500, "HNSW", "COSINE")["params"]["ef"] == 500
@@ -0,0 +1,133 @@
+import sys
+sys.path.insert(0, 'src')
+
+import json
+import math
+import types
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pivot import config, embedding, model_backends
+from pivot.services import reranker_service
+
+PAD = 1000.0  # hidden state of padding positions: any leak into the pooled vector shows
+
+
+class _Tokenizer:
+    """Whitespace tokenizer with the HF call surface used by _OnnxModel (ids are word lengths)."""
+
+    def __call__(self, first, second=None, padding=True, truncation=True, max_length=512, return_tensors="np"):
+        seqs = [f.split() + (s.split() if second else []) for f, s in zip(first, second or first)]
+        seqs = [s[:max_length] for s in seqs]
+        width = max(len(s) for s in seqs)
+        ids = np.zeros((len(seqs), width), dtype=np.int32)
+        mask = np.zeros((len(seqs), width), dtype=np.int32)
+        for row, words in enumerate(seqs):
+            ids[row, : len(words)] = [len(w) for w in words]
+            mask[row, : len(words)] = 1
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+class _Session:
+    """Stands in for ort.InferenceSession: embed graphs return (batch, seq, 2) hidden states of
+    [word length, 1], rerank graphs one logit per pair (its word count minus 3)."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.feeds = []
+
+    def get_inputs(self):
+        return [types.SimpleNamespace(name="input_ids"), types.SimpleNamespace(name="attention_mask")]
+
+    def run(self, output_names, feeds):
+        self.feeds.append(feeds)
+        ids, mask = feeds["input_ids"], feeds["attention_mask"]
+        if self.kind == "rerank":
+            return [(mask.sum(axis=1, keepdims=True) - 3).astype(np.float32)]
+        hidden = np.stack([ids, np.ones_like(ids)], axis=-1).astype(np.float32)
+        hidden[mask == 0] = PAD
+        return [hidden]
+
+
+@pytest.fixture
+def onnx_dir(tmp_path, monkeypatch):
+    sessions = []
+
+    def session(path):
+        kind = json.load(open(tmp_path / model_backends._META_FILE))["kind"]
+        sessions.append(_Session(kind))
+        return sessions[-1]
+
+    fake_transformers = types.ModuleType("transformers")
+    fake_transformers.AutoTokenizer = types.SimpleNamespace(from_pretrained=lambda path: _Tokenizer())
+    monkeypatch.setitem(sys.modules, "transformers", fake_transformers)
+    monkeypatch.setattr(model_backends, "_session", session)
+    monkeypatch.setattr(model_backends, "model_dir", lambda name: str(tmp_path))
+
+    def write_meta(**meta):
+        (tmp_path / model_backends._META_FILE).write_text(json.dumps(meta))
+        return sessions
+
+    return write_meta
+
+
+def test_mean_pooling_ignores_padding_and_keeps_input_order(onnx_dir):
+    sessions = onnx_dir(kind="embed", pooling="mean", dim=2, max_length=16)
+    model = model_backends.load_embedder("m")
+    texts = ["a bbb", "cc", "dddd eeeee ffffff"]
+
+    vecs = model.encode(texts, batch_size=2)
+    assert vecs.dtype == np.float32 and vecs.shape == (3, 2)
+    assert np.allclose(vecs, [[2.0, 1.0], [2.0, 1.0], [5.0, 1.0]])
+    # Length-sorted batches: the two shortest texts share the first one
+    assert [f["input_ids"].shape[0] for f in sessions[0].feeds] == [2, 1]
+    assert all(f["input_ids"].dtype == np.int64 for f in sessions[0].feeds)
+    assert "token_type_ids" not in sessions[0].feeds[0]
+
+
+def test_cls_pooling_and_normalization(onnx_dir):
+    onnx_dir(kind="embed", pooling="cls", dim=2)
+    model = model_backends.load_embedder("m")
+
+    vecs = model.encode(["xyz a", "a xyz"], normalize_embeddings=True)
+    assert np.allclose(vecs[0], np.array([3.0, 1.0]) / math.sqrt(10))
+    assert np.allclose(vecs[1], np.array([1.0, 1.0]) / math.sqrt(2))
+    assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0)
+    assert model.encode([]).shape == (0, 2)
+
+
+def test_cross_encoder_applies_sigmoid_to_the_first_logit(onnx_dir):
+    onnx_dir(kind="rerank", max_length=32)
+    model = model_backends.load_cross_encoder("m", max_length=8)
+    assert model.max_length == 8
+
+    scores = model.predict([("q", "one two"), ("q w", "one two three four"), ("q", "")], batch_size=2)
+    logits = [0.0, 3.0, -2.0]
+    assert scores.dtype == np.float32
+    assert np.allclose(scores, [1.0 / (1.0 + math.exp(-x)) for x in logits])
+
+
+def test_onnx_backend_selection_and_fallback(monkeypatch):
+    monkeypatch.setattr(config, "MODEL_BACKEND", "onnx")
+    monkeypatch.setattr(model_backends, "load_embedder", lambda name: ("onnx-embedder", name))
+    monkeypatch.setattr(model_backends, "load_cross_encoder", lambda name, max_length=None: ("onnx-cross", name, max_length))
+    embedding.get_embed_model.cache_clear()
+    try:
+        assert embedding.get_embed_model() == ("onnx-embedder", config.EMBED_MODEL)
+        r = reranker_service.Reranker("my-reranker")
+        assert r._cross == ("onnx-cross", "my-reranker", r.max_length)
+
+        def missing(*args, **kw):
+            raise FileNotFoundError("no exported model")
+
+        monkeypatch.setattr(model_backends, "load_embedder", missing)
+        monkeypatch.setattr(model_backends, "load_cross_encoder", missing)
+        monkeypatch.setattr(embedding, "_HAS_ST", False)
+        monkeypatch.setattr(reranker_service, "_HAS_CROSS", False)
+        embedding.get_embed_model.cache_clear()
+        assert embedding.get_embed_model() is None
+        assert reranker_service.Reranker("my-reranker")._cross is None
+    finally:
+        embedding.get_embed_model.cache_clear()
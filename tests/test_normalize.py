@@ -0,0 +1,88 @@
+import random
+import sys
+sys.path.insert(0, 'src')
+
+import pytest
+
+from pivot import normalize
+
+DOC = (
+    "<html><head><title>Release notes</title><style>p { color: red }</style></head>"
+    "<body><h1>Version&nbsp;2 &amp; more</h1><!-- hidden -->"
+    "<p>Faster <b>ingest</b>, fewer passes.<script>var s = '<p>no</p>';</script></p>"
+    "<blockquote>&gt; &gt;\n&gt; &gt; quoted</blockquote><p>Emoji \U0001F600 gone \u2600</p></body></html>"
+)
+
+
+def test_clean_text_matches_reference_passes():
+    rng = random.Random(7)
+    alphabet = ["a", "b", " ", "  ", "\n", "\r", "\r\n", "\t", ">", "> ", "\u00a0", "\x1c", "\U0001F600", "\u2705", "\u27BF", "\U0001F1E6"]
+    for _ in range(3000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert normalize.clean_text(text) == normalize._clean_text_reference(text), repr(text)
+
+
+# (html, text after clean_text as bs4 gives it, text from the HTML5 engines where it differs)
+CORPUS = [
+    (DOC, "Release notes Version 2 & more Faster ingest , fewer passes. >>> quoted Emoji gone", None),
+    ("<p>a<![CDATA[cdata text]]>b</p>", "a cdata text b", "a b"),
+    ("x&bogus;y", "x&bogusy", "x&bogus;y"),
+    ("&notit; &not", "&notit &not", "\u00acit; \u00ac"),
+    ("<br/>&amp", "&amp", "&"),
+    ("AT&T rocks", "AT&T rocks", None),
+    ("&amp &lt;b&gt;", "& <b>", None),
+    ("&#65;&#x42;&#X43;", "ABC", None),
+    ("&#0;|&#128;|&#129;|&#x9d;|&#xD800;|&#1114112;", "\ufffd|\u20ac|\x81|\x9d|\ufffd|\ufffd", None),
+    ("a<!-- c -->b", "a b", None),
+    ("<!DOCTYPE html><p>x</p>", "x", None),
+    ("<?php echo 1 ?>y", "y", None),
+    ("<script>s<p>x</p></script>y<style>t</style>z", "y z", None),
+    ("a<br>b", "a b", None),
+    ("<textarea>&amp;</textarea>", "&", None),
+    ("<pre> x  y </pre>", "x y", None),
+    ("<div>&nbsp;</div>", "", None),
+    ("", "", None),
+    ("   ", "", None),
+    ("<p>unclosed <b>bold", "unclosed bold", None),
+    ("1 < 2 > 0", "1 < 2 > 0", None),
+    ("</p>stray end", "stray end", None),
+    ("<title>T</title><p>b</p>", "T b", None),
+    ("<a href='&amp;'>link</a>", "link", None),
+    ("\u00e9t\u00e9 &eacute;", "\u00e9t\u00e9 \u00e9", None),
+]
+
+
+@pytest.mark.parametrize("engine", ["auto", "stdlib", "bs4", "lxml", "selectolax"])
+def test_engines_on_edge_case_corpus(engine):
+    if engine not in ("auto", "stdlib") and not getattr(normalize, f"_HAS_{engine.upper()}"):
+        pytest.skip(f"{engine} not installed")
+    html5 = engine in ("lxml", "selectolax")
+    for html, expected, html5_expected in CORPUS:
+        if html5 and html5_expected is not None:
+            expected = html5_expected
+        assert normalize.clean_text(normalize.html_to_text(html, engine)) == expected, repr(html)
+
+
+def test_stdlib_extractor_matches_bs4_on_random_markup():
+    pytest.importorskip("bs4")
+    rng = random.Random(11)
+    fragments = [
+        "a", "b c", " ", "\n", "&amp;", "&amp", "&bogus;", "&lt;", "&nbsp;", "&notit;", "&#65;", "&#x41;", "&#150;",
+        "&#129;", "&#0;", "&#xD800;", "&#99999999;", "&#", "& ", "AT&T ", "<p>", "</p>", "<b>", "</b>", "<br/>",
+        "<!-- c -->", "<![CDATA[cd]]>", "<![if x]>", "<!DOCTYPE html>", "<?php x ?>", "<script>s<p>x</p></script>",
+        "<style>t</style>", "<div class='x'>", "</div>", "<title>T</title>", "<", ">", "</", "\u00e9",
+        "<textarea>&amp;</textarea>", "<pre> x </pre>",
+    ]
+    for _ in range(2000):
+        html = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 15)))
+        expected = normalize.clean_text(normalize.html_to_text(html, "bs4"))
+        assert normalize.clean_text(normalize.html_to_text(html, "stdlib")) == expected, repr(html)
+
+
+def test_language_sample_is_bounded_and_keeps_short_text():
+    assert normalize.language_sample("short text", 100) == "short text"
+    long = " ".join(f"word{i}" for i in range(5000))
+    sample = normalize.language_sample(long, 300)
+    assert len(sample) <= 300
+    assert sample.startswith("word0 ") and sample.endswith("word4999")
+    assert all(w.startswith("word") and w[4:].isdigit() for w in sample.split())
@@ -0,0 +1,145 @@
+import sys
+sys.path.insert(0, 'src')
+
+import json
+
+from pivot import adapters, config, db, metrics, prometheus, tracing
+from pivot.api import main as api_main
+from pivot.api.main import QueryBatchReq, QueryReq
+
+
+def _export(hist_counts, counter_value):
+    return {
+        "histograms": [
+            {"name": "ingest_stage_ms", "labels": {"stage": "embed"}, "description": "d", "count": sum(hist_counts),
+             "sum": 10.0 * sum(hist_counts), "buckets": [[10, hist_counts[0]], [float("inf"), sum(hist_counts)]]},
+        ],
+        "counters": [{"name": "embedding_store_hits", "labels": {}, "description": "", "value": counter_value}],
+        "gauges": [],
+    }
+
+
+def test_merge_sums_processes_and_render_is_exposition_format():
+    merged = prometheus.merge([_export([1, 2], 3), _export([2, 0], 4)])
+    text = prometheus.render(merged)
+    lines = text.splitlines()
+    assert "# TYPE pivot_ingest_stage_ms histogram" in lines
+    assert 'pivot_ingest_stage_ms_bucket{le="10",stage="embed"} 3' in lines
+    assert 'pivot_ingest_stage_ms_bucket{le="+Inf",stage="embed"} 5' in lines
+    assert 'pivot_ingest_stage_ms_count{stage="embed"} 5' in lines
+    assert "pivot_embedding_store_hits_total 7" in lines
+
+
+def test_render_gauges_skip_missing_values():
+    text = prometheus.render({"gauges": [
+        {"name": "cache_hit_ratio", "labels": {"cache": "a"}, "description": "", "value": 0.5},
+        {"name": "cache_hit_ratio", "labels": {"cache": "b"}, "description": "", "value": None},
+    ]})
+    assert 'pivot_cache_hit_ratio{cache="a"} 0.5' in text
+    assert 'cache="b"' not in text
+
+
+class _Redis:
+    """The few redis commands pivot.prometheus uses, in memory (queued pipeline commands run at once)."""
+
+    def __init__(self):
+        self.strings, self.hashes = {}, {}
+
+    def get(self, k):
+        return self.strings.get(k)
+
+    def set(self, k, v):
+        self.strings[k] = v.encode()
+
+    def hset(self, k, f, v):
+        self.hashes.setdefault(k, {})[f.encode()] = v.encode()
+
+    def hgetall(self, k):
+        return dict(self.hashes.get(k, {}))
+
+    def hmget(self, k, fields):
+        return [self.hashes.get(k, {}).get(f) for f in fields]
+
+    def hdel(self, k, *fields):
+        for f in fields:
+            self.hashes.get(k, {}).pop(f, None)
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client, self.results, self.immediate = client, [], False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, *keys):
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+    def __getattr__(self, name):
+        def call(*args):
+            result = getattr(self.client, name)(*args)
+            if self.immediate:
+                return result
+            self.results.append(result)
+            return self
+        return call
+
+
+def test_exited_processes_stay_in_totals(monkeypatch):
+    client = _Redis()
+    monkeypatch.setattr(prometheus._redis, "get", lambda: client)
+    now = prometheus.time.time()
+    client.hset(prometheus._PROCESSES_KEY, "host:1:1.0", json.dumps({"ts": now, "export": _export([1, 2], 3)}))
+    client.hset(prometheus._PROCESSES_KEY, "host:2:1.0", json.dumps({"ts": now - 2 * config.METRICS_RETIRE_AFTER_S,
+                                                                     "export": _export([2, 0], 4)}))
+
+    for _ in range(2):  # the first collect retires host:2, the second reads it back from the retired total
+        text = prometheus.render(prometheus.merge(prometheus.collect()))
+        assert 'pivot_ingest_stage_ms_count{stage="embed"} 5' in text.splitlines()
+        assert "pivot_embedding_store_hits_total 7" in text.splitlines()
+    assert list(client.hashes[prometheus._PROCESSES_KEY]) == [b"host:1:1.0"]
+    assert json.loads(client.strings[prometheus._RETIRED_KEY])["counters"][0]["value"] == 4
+
+
+def test_query_records_every_stage(monkeypatch):
+    monkeypatch.setattr(adapters.milvus_adapter, 'search', lambda project_id, qv, top_k=25: [("c1", 0.8, "d1", 0)])
+    monkeypatch.setattr(
+        db, 'get_chunk_snippets',
+        lambda ids, max_chars=5000: {cid: {"snippet": "text", "doc_id": "d1", "idx": 0, "source_url": None} for cid in ids},
+    )
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+    stages = ("embed", "search", "hydrate", "rerank", "prompt", "generate")
+    before = {s: tracing._stage_histogram("query", s).snapshot()["count"] for s in stages}
+
+    api_main.query(QueryReq(project='default', query='What is PIVOT?', top_k=1))
+
+    for s in stages:
+        assert tracing._stage_histogram("query", s).snapshot()["count"] == before[s] + 1
+    text = prometheus.render(metrics.export())
+    assert 'pivot_query_stage_ms_count{stage="rerank"}' in text
+    assert 'pivot_cache_hit_ratio{cache="snippets"}' in text
+
+
+def test_query_batch_records_its_own_stages(monkeypatch):
+    monkeypatch.setattr(api_main, 'search_hits_many', lambda project_id, queries, qvecs, top_k: [[] for _ in queries])
+    before = tracing._stage_histogram("query", "search").snapshot()["count"]
+    batch_before = tracing._stage_histogram("query_batch", "search").snapshot()["count"]
+
+    api_main.query_batch(QueryBatchReq(project='default', queries=['a', 'b'], top_k=1))
+
+    assert tracing._stage_histogram("query", "search").snapshot()["count"] == before
+    assert tracing._stage_histogram("query_batch", "search").snapshot()["count"] == batch_before + 1
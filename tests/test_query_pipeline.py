@@ -1,6 +1,8 @@
 import sys
 sys.path.insert(0, 'src')
 
+import pytest
+
 from pivot.api import main as api_main
 from pivot.api.main import QueryReq
 from pivot import adapters, db
@@ -17,9 +19,17 @@ def test_query_pipeline_monkeypatch(monkeypatch):
 
     monkeypatch.setattr(adapters.milvus_adapter, 'search', fake_search)
 
-    # Patch db.get_documents_source_url and get_chunk_snippet
-    monkeypatch.setattr(db, 'get_documents_source_url', lambda ids: {"d1": "http://a", "d2": "http://b"})
-    monkeypatch.setattr(db, 'get_chunk_snippet', lambda cid: "PIVOT is a RAG system." if cid == 'c1' else "Other content.")
+    # Patch db.get_chunk_snippets (single joined hydration query)
+    def fake_snippets(ids, max_chars=5000):
+        rows = {
+            "c1": {"snippet": "PIVOT is a RAG system.", "doc_id": "d1", "idx": 0, "source_url": "http://a"},
+            "c2": {"snippet": "Other content.", "doc_id": "d2", "idx": 0, "source_url": "http://b"},
+        }
+        return {cid: rows[cid] for cid in ids if cid in rows}
+
+    monkeypatch.setattr(db, 'get_chunk_snippets', fake_snippets)
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
 
     req = QueryReq(project='default', query='What is PIVOT?', top_k=2)
     resp = api_main.query(req)
@@ -30,6 +40,154 @@ def test_query_pipeline_monkeypatch(monkeypatch):
     assert 'rerank_score' in resp['results'][0]
     # ensure answer included
     assert 'answer' in resp
+    assert {r['source_url'] for r in resp['results']} == {"http://a", "http://b"}
+
+
+def test_hydrate_hits_uses_cache(monkeypatch):
+    calls = []
+
+    def fake_snippets(ids, max_chars=5000):
+        calls.append(list(ids))
+        return {cid: {"snippet": f"text {cid}", "doc_id": "d1", "idx": 0, "source_url": None} for cid in ids}
+
+    monkeypatch.setattr(db, 'get_chunk_snippets', fake_snippets)
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+
+    api_main.hydrate_hits([("c1", 0.9, "d1", 0), ("c2", 0.8, "d1", 1)])
+    out = api_main.hydrate_hits([("c2", 0.8, "d1", 1), ("c3", 0.7, "d1", 2)])
+
+    # c2 is served from the cache; only c3 goes to the database
+    assert calls == [["c1", "c2"], ["c3"]]
+    assert [r["snippet"] for r in out] == ["text c2", "text c3"]
+
+
+def test_query_async_matches_sync(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(adapters.milvus_adapter, 'search', lambda project_id, query_vector, top_k=25: [("c1", 0.8, "d1", 0)])
+    monkeypatch.setattr(
+        db, 'get_chunk_snippets',
+        lambda ids, max_chars=5000: {"c1": {"snippet": "PIVOT is a RAG system.", "doc_id": "d1", "idx": 0, "source_url": "http://a"}},
+    )
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+
+    req = QueryReq(project='default', query='What is PIVOT?', top_k=1)
+    resp = asyncio.run(api_main.query_async(req))
+
+    assert [r['chunk_id'] for r in resp['results']] == ["c1"]
+    assert resp['results'][0]['source_url'] == "http://a"
+    assert 'answer' in resp and 'total_ms' in resp
+
+
+def test_query_stream_events_order(monkeypatch):
+    import asyncio
+    import json
+
+    monkeypatch.setattr(adapters.milvus_adapter, 'search', lambda project_id, query_vector, top_k=25: [("c1", 0.8, "d1", 0)])
+    monkeypatch.setattr(api_main.llm_runtime, 'generate_stream', lambda prompt: iter(["PIVOT ", "is ", "RAG."]))
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+
+    async def collect():
+        req = QueryReq(project='default', query='What is PIVOT?', top_k=1)
+        return [e async for e in api_main.query_stream_events(req)]
+
+    events = asyncio.run(collect())
+    kinds = [e.split("\n", 1)[0].split(": ", 1)[1] for e in events]
+    assert kinds == ["results", "token", "token", "token", "done"]
+    trailer = json.loads(events[-1].split("data: ", 1)[1])
+    assert trailer["chunks"] == 3
+    assert trailer["ttft_ms"] is not None and "retrieval_ms" in trailer and "chunks_per_s" in trailer
+
+
+def test_query_response_cache_hits_and_invalidates(monkeypatch):
+    generations = {}
+    shared = type("Redis", (), {
+        "get": staticmethod(generations.get),
+        "incr": staticmethod(lambda key: generations.__setitem__(key, generations.get(key, 0) + 1)),
+    })
+    monkeypatch.setattr(api_main.response_cache, "enabled", lambda: True)
+    monkeypatch.setattr(api_main.response_cache._redis, "get", lambda: shared)
+    calls = []
+    monkeypatch.setattr(
+        adapters.milvus_adapter, 'search',
+        lambda project_id, query_vector, top_k=25: calls.append(project_id) or [("c1", 0.8, "d1", 0)],
+    )
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+
+    req = QueryReq(project='default', query='What is PIVOT?', top_k=3)
+    first = api_main.query(req)
+    second = api_main.query(QueryReq(project='default', query='What is  PIVOT? ', top_k=3))
+    assert (first['cached'], second['cached']) == (False, True)
+    assert second['answer'] == first['answer'] and len(calls) == 1
+
+    api_main.response_cache.invalidate_project('default')
+    assert api_main.query(req)['cached'] is False and len(calls) == 2
+
+
+def test_query_batch_hydrates_union_once(monkeypatch):
+    from pivot.api.main import QueryBatchReq
+
+    hits = {"a": [("c1", 0.9, "d1", 0), ("c2", 0.8, "d1", 1)], "b": [("c2", 0.7, "d1", 1)]}
+    monkeypatch.setattr(adapters.milvus_adapter, 'search', lambda project_id, query_vector, top_k=25: [])
+    monkeypatch.setattr(
+        adapters.milvus_adapter, 'search_many',
+        lambda project_id, query_vectors, top_k=25: [hits["a"], hits["b"]],
+    )
+    calls = []
+
+    def fake_snippets(ids, max_chars=5000):
+        calls.append(sorted(ids))
+        return {cid: {"snippet": f"text {cid}", "doc_id": "d1", "idx": 0, "source_url": None} for cid in ids}
+
+    monkeypatch.setattr(db, 'get_chunk_snippets', fake_snippets)
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+
+    resp = api_main.query_batch(QueryBatchReq(project='default', queries=['text c1', 'text c2'], top_k=2))
+
+    assert calls == [["c1", "c2"]]
+    assert [len(item['results']) for item in resp['results']] == [2, 1]
+    assert all(item['answer'] is None for item in resp['results'])
+    # the shared chunk gets an independent result dict per query
+    assert resp['results'][0]['results'][0] is not resp['results'][1]['results'][0]
+
+
+def test_query_searches_by_project_id(monkeypatch):
+    searched = []
+    monkeypatch.setattr(db, 'get_project_id', lambda name: {"acme": "pid-acme"}.get(name))
+    monkeypatch.setattr(
+        adapters.milvus_adapter, 'search',
+        lambda project_id, query_vector, top_k=25: searched.append(project_id) or [],
+    )
+    api_main._project_ids.clear()
+    api_main.response_cache.clear()
+
+    api_main.query(QueryReq(project='acme', query='q', top_k=1))
+    resp = api_main.query(QueryReq(project='unknown', query='q', top_k=1))
+
+    assert searched == ["pid-acme"]
+    assert resp['results'] == []
+
+
+def test_query_fuses_lexical_hits(monkeypatch):
+    monkeypatch.setattr(adapters.milvus_adapter, 'search', lambda project_id, query_vector, top_k=25: [("c1", 0.8, "d1", 0)])
+    monkeypatch.setattr(db, 'lexical_search', lambda project_id, query, limit=25: [("c9", 4.0, "d9", 3)])
+    monkeypatch.setattr(
+        db, 'get_chunk_snippets',
+        lambda ids, max_chars=5000: {cid: {"snippet": "ERR-42 means disk full", "doc_id": "d", "idx": 0, "source_url": None} for cid in ids},
+    )
+    api_main._snippet_cache.clear()
+    api_main.response_cache.clear()
+
+    resp = api_main.query(QueryReq(project='default', query='ERR-42', top_k=5))
+    by_id = {r['chunk_id']: r for r in resp['results']}
+    assert set(by_id) == {"c1", "c9"}
+    assert by_id["c1"]["score"] == 0.8 and by_id["c9"]["score"] is None
+    assert by_id["c1"]["fused_score"] > 0
 
 
 if __name__ == '__main__':
@@ -37,3 +195,43 @@ if __name__ == '__main__':
     import pytest
     pytest.main([__file__])
 
+
+class _Request:
+    def __init__(self, connected_polls):
+        self.polls = 0
+        self.connected_polls = connected_polls
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.polls > self.connected_polls
+
+
+def test_query_cancelled_when_the_client_disconnects(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(api_main.config, "QUERY_DISCONNECT_POLL_S", 0.001)
+    cancelled = []
+
+    async def slow_query():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fast_query():
+        return {"results": []}
+
+    async def run(request, coro):
+        try:
+            return await api_main._cancel_on_disconnect(request, coro)
+        finally:
+            await asyncio.sleep(0)  # let the cancelled task unwind
+
+    request = _Request(connected_polls=3)
+    with pytest.raises(api_main.HTTPException) as e:
+        asyncio.run(run(request, slow_query()))
+    assert e.value.args[0] == 499
+    assert cancelled == [True] and request.polls == 4
+
+    assert asyncio.run(run(_Request(connected_polls=10**6), fast_query())) == {"results": []}
@@ -0,0 +1,69 @@
+import sys
+sys.path.insert(0, 'src')
+
+import pytest
+
+from pivot.embedding_store import content_hash
+from pivot.reingest import diff_chunks
+
+
+def _stored(texts):
+    # (chunk_id, idx, start, end, content_hash)
+    out, pos = [], 0
+    for i, t in enumerate(texts):
+        out.append((f"c{i}", i, pos, pos + len(t), content_hash(t)))
+        pos += len(t)
+    return out
+
+
+def _new(texts):
+    out, pos = [], 0
+    for i, t in enumerate(texts):
+        out.append((i, t, len(t.split()), pos, pos + len(t), None))
+        pos += len(t)
+    return out
+
+
+def test_diff_keeps_unchanged_chunks_and_embeds_only_changes():
+    stored = _stored(["intro", "setup steps", "usage", "usage", "faq"])
+    diff = diff_chunks(stored, _new(["intro", "new section", "setup steps", "usage", "faq v2"]))
+
+    assert diff.kept == [("c0", 0), ("c1", 2), ("c2", 3)]
+    assert [c[1] for c in diff.added] == ["new section", "faq v2"]
+    assert sorted(diff.stale) == ["c3", "c4"]  # the repeated "usage" pairs up once
+    assert diff.moved == [("c1", 2), ("c2", 3)]
+    assert [r[0] for r in diff.repositioned] == ["c1", "c2"]
+
+
+def test_diff_of_identical_content_is_empty():
+    texts = ["alpha", "beta", "gamma"]
+    diff = diff_chunks(_stored(texts), _new(texts))
+    assert len(diff.kept) == 3
+    assert not (diff.added or diff.stale or diff.moved or diff.repositioned)
+
+
+def test_update_enqueues_new_chunks_before_storing_the_fingerprint(monkeypatch):
+    from pivot.workers import tasks
+
+    enqueued = []
+
+    def update_document(doc_id, doc):
+        raise ConnectionError("postgres went away")
+
+    fake_db = type("DB", (), {
+        "find_document": staticmethod(lambda project_id, url: ("d1", "old-fp")),
+        "document_with_fingerprint": staticmethod(lambda project_id, fp: None),
+        "get_document_chunks": staticmethod(lambda doc_id: _stored(["intro"])),
+        "apply_chunk_diff": staticmethod(lambda doc_id, repositioned, stale: []),
+        "copy_chunks": staticmethod(lambda rows: [f"c-new-{i}" for i, _ in enumerate(rows)]),
+        "update_document": staticmethod(update_document),
+    })
+    monkeypatch.setattr(tasks, "db", fake_db)
+    monkeypatch.setattr(tasks.config, "DEDUPE_CHUNKS", False)
+    monkeypatch.setattr(tasks, "iter_chunks", lambda text, **kw: iter(_new(["intro", "appended"])))
+    monkeypatch.setattr(tasks.embed_job, "apply_async", lambda args, queue: enqueued.append(args))
+
+    with pytest.raises(ConnectionError):
+        tasks._update_in_place("p1", {"source_type": "web"}, {"source_url": "u"}, "intro appended", "en", "new-fp")
+    # The committed chunk is already queued for embedding; the retry will diff it as kept
+    assert enqueued == [["p1", "d1", ["c-new-0"]]]
@@ -12,6 +12,80 @@ def test_reranker_basic():
     assert out[0]["chunk_id"] == "1"
 
 
+class _FakeCross:
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append([t for _q, t in pairs])
+        return [float(len(t)) for _q, t in pairs]
+
+
+def test_cross_rerank_buckets_by_length_and_caches_scores(monkeypatch):
+    r = reranker_service.Reranker()
+    r._cross = _FakeCross()
+    r.batch_size = 2
+    reranker_service._score_cache.clear()
+
+    cands = [
+        {"chunk_id": "a", "snippet": "x" * 40},
+        {"chunk_id": "b", "snippet": "x" * 5},
+        {"chunk_id": "c", "snippet": "x" * 30},
+        {"chunk_id": "d", "snippet": "x" * 6},
+    ]
+    out = r.rerank("q", [dict(c) for c in cands])
+    assert [c["chunk_id"] for c in out] == ["a", "c", "d", "b"]
+    # shortest pairs batched together, longest together
+    assert [sorted(len(t) for t in b) for b in r._cross.batches] == [[5, 6], [30, 40]]
+
+    r._cross.batches.clear()
+    again = r.rerank("q", [dict(c) for c in cands])
+    assert r._cross.batches == []
+    assert [c["chunk_id"] for c in again] == ["a", "c", "d", "b"]
+
+
+def test_rerank_top_m_keeps_tail_order():
+    r = reranker_service.Reranker()
+    r._cross = _FakeCross()
+    reranker_service._score_cache.clear()
+
+    cands = [{"chunk_id": str(i), "snippet": "x" * (i + 1)} for i in range(4)]
+    out = r.rerank("q", cands, top_m=2)
+    assert [c["chunk_id"] for c in out] == ["1", "0", "2", "3"]
+    assert out[2]["rerank_score"] is None
+
+
+def test_rerank_many_shares_cross_batches():
+    r = reranker_service.Reranker()
+    r._cross = _FakeCross()
+    r.batch_size = 8
+    reranker_service._score_cache.clear()
+
+    lists = [
+        [{"chunk_id": "a", "snippet": "xx"}, {"chunk_id": "b", "snippet": "xxxx"}],
+        [{"chunk_id": "a", "snippet": "xx"}, {"chunk_id": "c", "snippet": "xxx"}],
+    ]
+    out = r.rerank_many(["q1", "q2"], lists)
+    assert len(r._cross.batches) == 1 and len(r._cross.batches[0]) == 4
+    assert [[c["chunk_id"] for c in res] for res in out] == [["b", "a"], ["c", "a"]]
+
+
+def test_fallback_uses_stored_vectors(monkeypatch):
+    from pivot.adapters import milvus_adapter
+
+    vectors = {"near": [1.0, 0.0], "far": [0.0, 1.0]}
+    monkeypatch.setattr(milvus_adapter, 'get_vectors', lambda ids: {i: vectors[i] for i in ids if i in vectors})
+    r = reranker_service.Reranker()
+    r._cross = None
+
+    cands = [
+        {"chunk_id": "far", "snippet": "unrelated words"},
+        {"chunk_id": "near", "snippet": "also unrelated"},
+    ]
+    out = r.rerank("question", cands, query_vector=[0.9, 0.1])
+    assert [c["chunk_id"] for c in out] == ["near", "far"]
+
+
 if __name__ == '__main__':
     test_reranker_basic()
     print('test_reranker_basic passed')
@@ -0,0 +1,87 @@
+import sys
+sys.path.insert(0, 'src')
+
+from pivot.response_cache import ResponseCache
+
+
+class _Generations:
+    """Stand-in for the shared redis generation counters."""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+
+
+def test_threshold_top_k_and_project_scoping():
+    cache = ResponseCache(threshold=0.9, ttl=60, max_per_project=2)
+    q = "What is PIVOT?"
+    cache.store("p1", 5, q, [1.0, 0.0], {"results": [{"chunk_id": "c1"}], "answer": "A"}, 0)
+
+    hit = cache.lookup("p1", 5, "what is pivot", [0.99, 0.05], 0)
+    assert hit["answer"] == "A" and hit["cache_similarity"] > 0.9
+    assert cache.lookup("p1", 5, q, [0.6, 0.8], 0) is None  # cosine 0.6
+    assert cache.lookup("p1", 3, q, [1.0, 0.0], 0) is None
+    assert cache.lookup("p2", 5, q, [1.0, 0.0], 0) is None
+    assert cache.lookup("p1", 5, q, [1.0, 0.0], 1) is None  # invalidated since
+
+    cache.store("p1", 5, q, [0.0, 1.0], {"results": [], "answer": "B"}, 0)
+    cache.store("p1", 5, q, [-1.0, 0.0], {"results": [], "answer": "C"}, 0)
+    # oldest entry evicted at max_per_project
+    assert cache.lookup("p1", 5, q, [1.0, 0.0], 0) is None
+
+
+def test_similar_queries_about_different_things_do_not_share_answers():
+    cache = ResponseCache(threshold=0.9, ttl=60, max_per_project=10)
+    cache.store("p1", 5, "How do I reset my password on Android?", [1.0, 0.0], {"results": [], "answer": "Android"}, 0)
+
+    assert cache.lookup("p1", 5, "How do I reset my password on iOS?", [0.99, 0.05], 0) is None
+    assert cache.lookup("p1", 5, "reset password on android", [0.99, 0.05], 0)["answer"] == "Android"
+
+
+def test_cache_is_a_no_op_without_shared_generations(monkeypatch):
+    from pivot import response_cache
+
+    monkeypatch.setattr(response_cache.config, "RESPONSE_CACHE", True)
+    monkeypatch.setattr(response_cache._redis, "get", lambda: None)
+    generation = response_cache.generation("p1")
+    assert generation is None
+    response_cache.store("p1", 5, "q", [1.0, 0.0], {"results": [], "answer": "A"}, generation)
+    assert response_cache.stats()["size"] == 0
+    assert response_cache.lookup("p1", 5, "q", [1.0, 0.0], generation) is None
+
+
+def test_answer_computed_across_an_invalidation_is_not_served(monkeypatch):
+    from pivot import adapters, db, llm_runtime, response_cache
+    from pivot.api import main as api_main
+
+    generations = _Generations()
+    monkeypatch.setattr(response_cache, "enabled", lambda: True)
+    monkeypatch.setattr(response_cache._redis, "get", lambda: generations)
+    monkeypatch.setattr(adapters.milvus_adapter, "search", lambda project_id, qv, top_k=25: [("c1", 0.8, "d1", 0)])
+    monkeypatch.setattr(
+        db, "get_chunk_snippets",
+        lambda ids, max_chars=5000: {cid: {"snippet": "text", "doc_id": "d1", "idx": 0, "source_url": None} for cid in ids},
+    )
+
+    def generate_during_ingest(prompt, **kw):
+        # An ingest finishes between the cache lookup and the store
+        response_cache.invalidate_project("race-project")
+        return "stale answer"
+
+    monkeypatch.setattr(llm_runtime, "generate", generate_during_ingest)
+    api_main._snippet_cache.clear()
+    api_main._project_ids.clear()
+    response_cache.clear()
+    req = api_main.QueryReq(project="race-project", query="What changed?", top_k=1)
+    assert api_main.query(req)["cached"] is False
+
+    monkeypatch.setattr(llm_runtime, "generate", lambda prompt, **kw: "fresh answer")
+    second = api_main.query(req)
+    assert second["cached"] is False and second["answer"] == "fresh answer"
+    assert api_main.query(req)["cached"] is True
+    response_cache.clear()